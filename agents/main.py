@@ -18,6 +18,7 @@ if project_root not in sys.path:
 from config.config import LLM_CONFIG, PROJECT_CONFIG
 llm = LLM_CONFIG
 from agents.recommendation_manager import RecommendationManager
+from utils.data_loader import load_expert_candidates, project_digest, expert_store_fingerprint, candidate_table_is_current
 
 if __name__ == "__main__":
     # 从PROJECT_CONFIG加载项目数据
@@ -41,15 +42,52 @@ if __name__ == "__main__":
     # 并行度配置
     parallel_degree = PROJECT_CONFIG.get('parallel_projects', 5)
     print(f"并行度设置为：{parallel_degree}")
+
+    # 优先使用离线预计算的候选专家（内容未变化的项目），不再在线向量化与检索
+    candidates_by_project = [None] * len(projects_data)
+    candidates_path = os.path.join(project_root, PROJECT_CONFIG['data_path'].get('expert_candidates', './data/expert_candidates.npz'))
+    # 开启级联粗排时多取 cascade_candidates 个，由 retrieve_expert_candidates 重排后截取前 K 个
+    pool_size = max(PROJECT_CONFIG['candidate_experts_per_project'], PROJECT_CONFIG.get('cascade_candidates') or 0)
+    # 专家库在预计算之后重建或更新过时，表中的行号与姓名已不可信，整表作废，全部在线召回
+    store_fingerprint = expert_store_fingerprint("expert")
+    if os.path.exists(candidates_path) and not candidate_table_is_current(candidates_path, store_fingerprint):
+        print("预计算候选表已过期（专家向量库在预计算之后有变化），请重新运行 python -m rag.precompute_candidates")
+    for idx, project_data in enumerate(projects_data):
+        precomputed = load_expert_candidates(project_data.get('标题'), candidates_path, pool_size,
+                                             digest=project_digest(project_data),
+                                             store_fingerprint=store_fingerprint)
+        if precomputed:
+            candidates_by_project[idx] = precomputed
+    missing = [idx for idx, candidates in enumerate(candidates_by_project) if candidates is None]
+    print(f"预计算候选命中 {len(projects_data) - len(missing)} 个项目，在线召回 {len(missing)} 个")
+
+    # 批量召回：其余项目一次批量向量化、一次矩阵检索，各项目线程直接使用结果
+    if missing:
+        retriever = RecommendationManager(llm=llm)
+        try:
+            batch = retriever.retrieve_expert_candidates_batch([projects_data[idx] for idx in missing])
+            for idx, candidates in zip(missing, batch):
+                candidates_by_project[idx] = candidates
+            failed = sum(candidates is None for candidates in batch)
+            if failed:
+                # 保持为 None：各项目线程中单独重试，仍失败则记为该项目失败，不用空候选集推荐
+                print(f"{failed} 个项目批量向量化失败，将逐个重试")
+        except Exception as e:
+            print(f"批量召回失败，改为逐个项目召回：{e}")
+        finally:
+            retriever.close()
     
     def process_project(index, project_data, total_projects):
         """处理单个项目的推荐任务"""
+        recommendation_manager = None
         try:
             project_title = project_data.get('标题', f'项目{index+1}')
             print(f"\n[{index+1}/{total_projects}] 开始处理项目：{project_title}")
             
             recommendation_manager = RecommendationManager(llm=llm)
-            expert_candidates = recommendation_manager.retrieve_expert_candidates(project_data)
+            expert_candidates = recommendation_manager.retrieve_expert_candidates(
+                project_data, candidates_by_project[index]
+            )
             agent_pairs = recommendation_manager.create_agent_pairs(expert_candidates, project_data)
             discussion_results = recommendation_manager.collect_discussion_results(agent_pairs)
             ranked_experts = recommendation_manager.evaluate_and_rerank(
@@ -62,6 +100,9 @@ if __name__ == "__main__":
             error_msg = f"项目 {project_data.get('标题', f'项目{index+1}')} 处理失败：{str(e)}"
             print(f"[{index+1}/{total_projects}] {error_msg}")
             return index, project_data.get('标题', f'项目{index+1}'), None, error_msg
+        finally:
+            if recommendation_manager is not None:
+                recommendation_manager.close()
     
     # 并行处理
     total_projects = len(projects_data)
@@ -33,13 +33,14 @@ from agents.project_agent import ProjectAgent
 from agents.expert_agent import ExpertAgent
 from agents.moderator import Moderator
 from config.config import LLM_CONFIG
+from utils.data_loader import project_text, expert_candidate_filter
+from utils.candidate_ranker import shared_ranker
 # from utils.prompt_logger import get_logger  # [PROMPT_LOGGER] 取消注释以启用prompt记录
 
 llm = LLM_CONFIG
 
 import dashscope
 
-from rag.core.vectordb import VectorDB
 
 class RecommendationManager(Assistant):
     """推荐管理智能体"""
@@ -48,9 +49,11 @@ class RecommendationManager(Assistant):
         super().__init__(llm=llm, **kwargs)
         self.config = PROJECT_CONFIG
         self.top_k = PROJECT_CONFIG['candidate_experts_per_project']
+        # 级联粗排：多召回 cascade_candidates 个候选，CPU 信号重排后只取前 top_k 个进入讨论
+        self.pool_size = max(self.top_k, PROJECT_CONFIG.get('cascade_candidates') or 0)
         self.results = []
+        # 候选召回经由 RAGTool：专家库由进程内注册表共享（多个项目并行时只加载一次），注册表重新加载后自动换用新库
         self.rag_tool = RAGTool()
-        self.expert_db = VectorDB(db_name="expert")
         # 保存system_message用于日志记录（如果有的话）
         if 'system_message' in kwargs:
             self.system_message = kwargs['system_message']
@@ -63,59 +66,80 @@ class RecommendationManager(Assistant):
         #     if api_key:
         #         dashscope.api_key = api_key
         
-    def retrieve_expert_candidates(self, project_data):
+    @property
+    def expert_db(self):
+        """RAGTool 持有的共享专家库（级联粗排读取元数据与倒排索引）"""
+        return self.rag_tool.vector_db("expert")
+
+    def close(self):
+        """共享的专家库由 RAGTool 持有并在注册表重新加载时归还，这里无需释放"""
+
+    def retrieve_expert_candidates_batch(self, projects_data, filters=None):
         """
-        利用项目向量在专家数据库中召回候选专家
+        批量召回：所有项目按批次一次性向量化，再对整个查询矩阵执行一次检索。
+        过滤条件在检索内部生效（位图 IDSelector），合格专家足够时每个项目都拿满 top_k 个候选
+
+        Args:
+            filters: 额外的属性过滤表达式，如 {'industry': ['新能源']}
+
+        Returns:
+            与 projects_data 一一对应的候选专家列表；向量化失败的项目为 None（与"没有合格专家"的 [] 区分）
         """
-        # 1. 将项目数据转换为字符串用于 Embedding
-        if not isinstance(project_data, str):
-            project_text = json5.dumps(project_data, ensure_ascii=False)
-        else:
-            project_text = project_data
-        
-        # 2. 获取项目向量
-        project_vector = None
+        if not projects_data:
+            return []
+        # 1. 批量获取项目向量（按 EMBEDDING_BATCH_SIZE 分批请求，失败的条目为空列表）
         try:
-            # response = Embedding.call(
-            #     model='text-embedding-v2',
-            #     input=project_text
-            # )
-            # if response.status_code == 200:
-            #     project_vector = response.output['embeddings'][0]['embedding']
-            from rag.core.llm_client import get_embedding
-            project_vector = get_embedding(project_text)
-            #print(project_vector)
+            from rag.core.llm_client import get_embeddings
+            project_vectors = get_embeddings([project_text(p) for p in projects_data])
         except Exception as e:
             print(f"项目向量化失败: {e}")
-            return []
+            return [None for _ in projects_data]
 
-        if project_vector is None:
-            return []
+        valid = [i for i, vector in enumerate(project_vectors) if vector]
+        candidates = [None for _ in projects_data]
+        if not valid:
+            return candidates
 
-        # 3. 准备检索参数
-        top_k = self.top_k
-        query_np = np.array(project_vector, dtype="float32").reshape(1, -1)
-        faiss.normalize_L2(query_np)
-        
-        # 4. 执行向量检索
-        scores, indices = self.expert_db.index.search(query_np, top_k)
-        
-        # 5. 反向查找专家姓名和 ID
-        expert_candidates = []
-        for idx in indices[0]:
-            if idx == -1: continue # 未匹配到结果
-            
-            # 从 metadata 中提取昨晚存入的原始信息
-            meta = self.expert_db.metadata[idx]
-            orig_data = meta.get("original_data", {})
-            
-            # 根据数据结构尝试获取姓名
-            expert_name = orig_data.get("title") or orig_data.get("data", {}).get("title") or "未知专家"
-            
-            expert_candidates.append({
-                'id': str(idx), 
-                'name': expert_name
-            })
+        # 2. 经由 RAGTool 执行向量检索（索引类型与 nprobe/efSearch 由 RAG_CONFIG 决定），一次检索整个查询矩阵
+        hits = self.rag_tool.retrieve_by_vectors(np.array([project_vectors[i] for i in valid]), self.pool_size,
+                                                 filters=expert_candidate_filter(self.config, project_root, filters))
+
+        # 3. 候选的 id 为专家库行号（级联粗排、专家画像按行号读取元数据），姓名取自元数据的标题列
+        for i, expert_hits in zip(valid, hits):
+            candidates[i] = [{'id': str(hit['row']), 'name': hit['name'] or "未知专家", 'score': hit['score']}
+                             for hit in expert_hits]
+        return candidates
+
+    def cascade_rerank(self, project_data, expert_candidates):
+        """
+        级联粗排：候选多于 top_k 时用关键词重合、地区匹配、专利数量等 CPU 信号重排，只保留前 top_k 个
+        """
+        if len(expert_candidates) <= self.top_k:
+            return expert_candidates
+        if self.pool_size <= self.top_k:
+            return expert_candidates[:self.top_k]
+        ranker = shared_ranker(self.expert_db, self.config.get('cascade_weights'),
+                               self.config.get('cascade_project_fields'))
+        ranked = ranker.rank(project_data, expert_candidates)
+        print(f"级联粗排：{len(expert_candidates)} 个候选 -> 前 {self.top_k} 个进入讨论")
+        return ranked[:self.top_k]
+
+    def retrieve_expert_candidates(self, project_data, expert_candidates=None):
+        """
+        利用项目向量在专家数据库中召回候选专家
+
+        Args:
+            expert_candidates: 批量召回（retrieve_expert_candidates_batch）已得到的候选，传入时不再单独检索；
+                为 None（未召回或批量向量化失败）时单独重试一次
+
+        Raises:
+            RuntimeError: 重试后项目仍无法向量化（不在空候选集上继续推荐）
+        """
+        if expert_candidates is None:
+            expert_candidates = self.retrieve_expert_candidates_batch([project_data])[0]
+        if expert_candidates is None:
+            raise RuntimeError("项目向量化失败，已跳过该项目")
+        expert_candidates = self.cascade_rerank(project_data, expert_candidates)
         print(f"召回候选专家: {[exp['name'] for exp in expert_candidates]}")
         timestamp = time.time()
         local_time = time.localtime(timestamp)
@@ -169,7 +193,8 @@ class RecommendationManager(Assistant):
         
         agent_pairs = []
         for expert in expert_profiles:
-            expert_agent = ExpertAgent(expert, llm=llm, name=expert['data']['title'])
+            expert_agent = ExpertAgent(expert, llm=llm, name=expert['data']['title'],
+                                       function_list=list(self.config.get('expert_tools') or []) or None)
             project_agent = ProjectAgent(project_data, llm=llm, name=project_data['标题'])
             moderator = Moderator(llm=llm)
             agent_pairs.append((moderator, project_agent, expert_agent))
@@ -31,10 +31,25 @@ LLM_CONFIG = LLM_CONFIG_GPT  # 默认使用 Qwen 模型
 # 项目配置
 PROJECT_CONFIG = {
     'candidate_experts_per_project': 5,  # 每个项目加载的候选专家数量
+    # 召回时只在 data/experts 下有画像文件的专家中检索，保证召回的 K 个候选都能参与讨论
+    'require_expert_profile': True,
+    # 召回的属性过滤条件（见 rag/core/attribute_index.py），如 {'industry': ['新能源'], 'org': '清华大学'}
+    'candidate_filter': None,
+    # 级联粗排：先召回 cascade_candidates 个候选，按关键词重合（技术难题/技术目标 vs 专家技术关键词）、
+    # 组织地区匹配、专利数量等 CPU 信号重排，只把前 candidate_experts_per_project 个送进智能体讨论；0 表示关闭
+    'cascade_candidates': 50,
+    'cascade_weights': {'similarity': 1.0, 'keywords': 1.0, 'region': 0.3, 'patents': 0.2},
+    'cascade_project_fields': ['需解决的主要技术难题', '期望实现的主要技术目标'],
+    # 专家智能体在讨论中可调用的工具（需显式开启）：默认 [] 时 ExpertAgent 不挂载任何工具，
+    # 只凭画像发言；设为 ['rag_retrieval'] 后专家可在讨论中按需检索专利/组织事实
+    # （查询向量与结果均有进程内缓存，但每次工具调用仍会多一轮模型交互）。候选召回始终经由 RAGTool，与此项无关
+    'expert_tools': [],
     'parallel_projects': 10,  # 并行处理的项目数量
     'data_path': {
         'projects': './data/projects',
         'experts': './data/experts',
+        # 离线预计算的项目候选专家表（python -m rag.precompute_candidates 生成），存在时跳过在线召回
+        'expert_candidates': './data/expert_candidates.npz',
     }
 }
 
@@ -55,6 +70,83 @@ RAG_CONFIG = {
     'EMBEDDING_URL': "https://api.siliconflow.cn/v1/embeddings",
     'EMBEDDING_MODEL': "Qwen/Qwen3-Embedding-8B", # 保持和你之前一致
     'EMBEDDING_DIMENSION': 4096,
+    # 批量 embedding：单次请求最多打包的条数与总字符数
+    'EMBEDDING_BATCH_SIZE': 32,
+    'EMBEDDING_BATCH_MAX_CHARS': 120000,
+    # 接口限流：每秒请求数与突发上限（0 表示不限流），失败后指数退避的基数/上限（秒）
+    'EMBEDDING_RATE_LIMIT': 5,
+    'EMBEDDING_RATE_BURST': 10,
+    'EMBEDDING_BACKOFF_BASE': 1.0,
+    'EMBEDDING_BACKOFF_MAX': 30.0,
+    # embedding 持久化缓存（SQLite），按 (模型, 文本哈希) 复用向量，超过上限按 LRU 淘汰
+    'EMBEDDING_CACHE_ENABLED': True,
+    'EMBEDDING_CACHE_PATH': "rag/data/embedding_cache.sqlite",
+    'EMBEDDING_CACHE_MAX_BYTES': 2 * 1024 ** 3,
+    # embedding 文本：按实体类型抽取的字段路径（"." 分隔，"[]" 遍历列表），不配置时用 rag/core/text_builder.py 中的默认字段
+    # 'EMBEDDING_TEXT_FIELDS': {"expert": ["data.title", "data.summary", "data.tags"]},
+    # 长文本按段落/句子切块，每块一个向量（块长字符数、超长句切分时的重叠字符数、每个实体最多块数）；
+    # 调整字段或分块参数后，下次增量构建会自动重新 embedding
+    'EMBEDDING_CHUNK_CHARS': 2000,
+    'EMBEDDING_CHUNK_OVERLAP': 100,
+    'EMBEDDING_MAX_CHUNKS': 16,
+    # 切块实体检索时先取 top_k * CHUNK_SEARCH_FACTOR 个块，再按实体取最大得分
+    'CHUNK_SEARCH_FACTOR': 4,
+
+    # ================= 混合检索配置 =================
+    # BM25 倒排索引的字段路径（写法同 EMBEDDING_TEXT_FIELDS），不配置时用 rag/core/lexical_index.py 中的默认字段
+    # （专家：technical_keywords、标签、专利标题）；构建向量库时一并生成 <db>_bm25.npz
+    # 'LEXICAL_FIELDS': {"expert": ["data.ai_fields.专家简介.综合分析.technical_keywords", "data.tags"]},
+    'BM25_K1': 1.2,
+    'BM25_B': 0.75,
+    # 倒数排名融合常数，以及每个通道参与融合的候选数
+    'RRF_K': 60,
+    'HYBRID_CANDIDATES': 50,
+
+    # ================= 属性过滤配置 =================
+    # 属性名 -> 字段路径列表，构建向量库时生成各属性取值的行号表（<db>_attrs.npz），检索时按过滤表达式生成位图；
+    # 不配置时用 rag/core/attribute_index.py 中的默认属性（专家：org / industry / tag），
+    # 数据中有地区等字段时可在此加入，如 {"expert": {"region": ["data.region"], ...}}
+    # 'ATTRIBUTE_FIELDS': {"expert": {"org": ["data.orgs"], "industry": ["data.ai_fields.专家简介.综合分析.industry_sector"]}},
+    # 过滤检索按选择率（合格行 / 有效行）选路径：
+    # 合格行数不超过 FILTER_EXACT_MAX 且选择率不超过 FILTER_EXACT_RATIO 时直接对这些行精确打分；
+    # 选择率不低于 FILTER_POSTFILTER_RATIO 时照常检索、按比例多取后筛选；其余交给索引的 IDSelector 过滤检索
+    'FILTER_EXACT_MAX': 20000,
+    'FILTER_EXACT_RATIO': 0.1,
+    'FILTER_POSTFILTER_RATIO': 0.5,
+
+    # ================= 检索工具配置 =================
+    # RAGTool 的进程内 LRU 缓存条数：查询文本 -> 向量、(库, 查询, top_k) -> 结果列表（0 表示不缓存）
+    'QUERY_EMBEDDING_CACHE_SIZE': 1024,
+    'QUERY_RESULT_CACHE_SIZE': 1024,
+    # RAGTool 语义检索相关专利/组织时每类返回的条数
+    'RAG_TOOL_TOP_K': 5,
+
+    # ================= 索引配置 =================
+    # faiss.index_factory 描述串："Flat"（精确）、"HNSW32,Flat"、"IVF256,Flat"、"IVF256,PQ64"
+    # 压缩存储："SQfp16"（1/2）、"SQ8"（1/4）、"PQ256"（1/64），可与 IVF/HNSW 组合，如 "HNSW32,SQ8"
+    # 切换类型后运行 `python build_kb.py --reindex` 重建；用 `python -m rag.index_tools recall` 评估召回率
+    # 降维：在描述串前加 "TRUNC1024,"（截断前 1024 维）或 "PCA512,"（构建时拟合 PCA），如 "TRUNC1024,Flat"；
+    # 全精度向量仍保存在磁盘，配合 RERANK_EXACT 精确重排，先用 `python -m rag.index_tools dims` 选维度
+    'INDEX_FACTORY': "Flat",
+    # 检索参数：IVF 的 nprobe、HNSW 的 efSearch（对不适用的索引类型自动忽略）
+    'INDEX_SEARCH_PARAMS': {'nprobe': 16, 'efSearch': 128},
+    # 构建参数：HNSW 的 efConstruction
+    'INDEX_BUILD_PARAMS': {'efConstruction': 200},
+    # 全精度向量另存为 <db>_vectors.npy（内存映射，不常驻内存），用于重建索引与精确重排
+    'STORE_FULL_VECTORS': True,
+    # 近似/压缩索引先取 top_k * RERANK_FACTOR 个候选，再用全精度向量精确重排
+    'RERANK_EXACT': True,
+    'RERANK_FACTOR': 4,
+    # 检索侧以内存映射只读方式加载索引，多进程共享页缓存而非各持一份；
+    # INDEX_WARMUP 在加载后预读文件，避免首批查询承担缺页延迟（用 `python -m rag.index_tools latency` 对比）
+    'INDEX_MMAP': False,
+    'INDEX_WARMUP': False,
+    # 进程内共享的 VectorDB 实例在引用计数归零后是否保留（批量处理项目时避免反复加载）
+    'VECTOR_DB_KEEP_IDLE': True,
+    # 构建时每条新向量先写入预写日志（<db>.journal），每 JOURNAL_FSYNC_EVERY 条 fsync 一次；
+    # 崩溃后重新打开向量库时重放日志，检查点（save）成功后清空
+    'JOURNAL_ENABLED': True,
+    'JOURNAL_FSYNC_EVERY': 32,
 
     # ================= 业务配置 =================
     # 实体类型对应文件夹名称
@@ -1,86 +1,369 @@
+"""
+知识图谱构建（增量同步）
+
+按清单（MANIFEST_PATH）比对 expert/organization/patent 文件夹与上次同步的结果，只解析新增/变更的文件，
+只更新受影响的节点与关系，同步期间图谱始终可供 KGRetrieval 查询：
+- 删除的文件：删除对应节点（DETACH DELETE）
+- 新增/变更的文件：MERGE 节点；专家的 BELONGS_TO / INVENTED 关系先删后建
+- 组织增删改名、专利被删除时，引用它们的专家也视为受影响，关系按清单中记录的组织名/专利重建
+- 派生关系 COLLABORATED_WITH / IS_COLLEAGUE_OF 在内存中按组织/专利分组统计共同组织数、共同专利数作为边的 weight，
+  超级节点（成员过多的组织）不展开，每位专家按 (weight 降序, 对方 ID) 选出至多 DERIVED_DEGREE_CAP 个邻居，
+  任一端选中即有边；再分批写入，不再执行全图 (e1)-[:BELONGS_TO]->(o)<-[:BELONGS_TO]-(e2) 的平方级 MERGE。
+  增量同步时重新计算与受影响专家同组（新旧分组均算）的全部专家，以及这些专家的同组邻居指向它们的边，
+  结果与在同一份语料上全量构建一致（见 derived_updates）
+
+没有清单（首次运行）或指定 --full 时清空图谱后全量导入。
+"""
+
+import argparse
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 from neo4j import GraphDatabase
-from knowledge_graph.kg_build.config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, EXPERT_DIR, ORG_DIR, PATENT_DIR
+from knowledge_graph.kg_build.config import (NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, EXPERT_DIR, ORG_DIR, PATENT_DIR,
+                                             BATCH_SIZE, WRITE_WORKERS, MANIFEST_PATH,
+                                             DERIVED_MAX_GROUP, DERIVED_DEGREE_CAP)
 from kg_utils import DataExtractor
 
+# 每条语句一次写入一批行（UNWIND $rows），在显式事务中执行
+ORG_NODES = "UNWIND $rows AS row MERGE (o:Organization {id: row.id}) SET o.name = row.name"
+PATENT_NODES = "UNWIND $rows AS row MERGE (p:Patent {id: row.id}) SET p.name = row.name"
+EXPERT_NODES = "UNWIND $rows AS row MERGE (e:Expert {id: row.id}) SET e.name = row.name"
+BELONGS_TO_EDGES = """
+    UNWIND $rows AS row
+    MATCH (e:Expert {id: row.eid}), (o:Organization {id: row.oid})
+    MERGE (e)-[:BELONGS_TO]->(o)
+"""
+INVENTED_EDGES = """
+    UNWIND $rows AS row
+    MATCH (e:Expert {id: row.eid})
+    MERGE (p:Patent {id: row.pid})
+    ON CREATE SET p.name = row.pname
+    MERGE (e)-[:INVENTED]->(p)
+"""
+DELETE_NODES = "UNWIND $rows AS id MATCH (n:{label} {{id: id}}) DETACH DELETE n"
+DELETE_EXPERT_EDGES = """
+    UNWIND $rows AS id
+    MATCH (e:Expert {id: id})-[r:BELONGS_TO|INVENTED]->()
+    DELETE r
+"""
+DELETE_DERIVED_EDGES = """
+    UNWIND $rows AS id
+    MATCH (e:Expert {{id: id}})-[r:{rel}]-()
+    WITH DISTINCT r
+    DELETE r
+"""
+# 只由专家关系引用、已没有任何发明人的专利节点（全量重建时不会出现）
+DELETE_ORPHAN_PATENTS = """
+    UNWIND $rows AS id
+    MATCH (p:Patent {id: id})
+    WHERE NOT (p)<-[:INVENTED]-()
+    DELETE p
+"""
+# 同一专利即为合作者，同一组织即为同事；两端都受影响时同一条边会写两次，MERGE 保证不重复
+DERIVED_EDGES = """
+    UNWIND $rows AS row
+    MATCH (e1:Expert {{id: row.a}}), (e2:Expert {{id: row.b}})
+    MERGE (e1)-[r:{rel}]-(e2)
+    SET r.weight = row.weight
+"""
+
+
+def batched(rows, size):
+    """把可迭代对象切成长度不超过 size 的列表"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def group_members(memberships):
+    """专家 -> 所属分组（组织/专利）反转为 分组 -> 成员列表"""
+    groups = {}
+    for eid, group_ids in memberships.items():
+        for gid in group_ids:
+            groups.setdefault(gid, []).append(eid)
+    return groups
+
+
+def expert_memberships(expert_entries, org_entries):
+    """
+    清单条目 -> (专家 ID -> 所属组织 ID 集合, 专家 ID -> 专利 ID 集合)
+
+    组织按名称对应到 ID（与 BELONGS_TO 一致），名称不在组织清单中的忽略
+    """
+    org_map = {e['title']: e['id'] for e in org_entries.values() if e.get('id') and e.get('title')}
+    live = [e for e in expert_entries.values() if e.get('id')]
+    orgs = {e['id']: {org_map[o] for o in e.get('orgs', []) if o in org_map} for e in live}
+    patents = {e['id']: {pid for pid, _ in e.get('patents', [])} for e in live}
+    return orgs, patents
+
+
+def _expanded(groups, gid, max_group):
+    members = groups.get(gid)
+    return members is not None and (not max_group or len(members) <= max_group)
+
+
+def derived_rows(expert_ids, memberships, groups, max_group=DERIVED_MAX_GROUP, degree_cap=DERIVED_DEGREE_CAP,
+                 targets=None):
+    """
+    逐个专家统计与其他专家的共同分组数，产出派生边的行（生成器，内存只占一位专家的邻居表）
+
+    Args:
+        memberships: 专家 ID -> 所属分组 ID 集合
+        groups: 分组 ID -> 成员专家 ID 列表
+        max_group: 成员数超过该值的分组不展开（0 表示不限）
+        degree_cap: 每位专家最多选出的邻居数，按 (共同分组数降序, 对方 ID) 排序，与处理顺序无关（0 表示不限）
+        targets: 只产出另一端在该集合中的边（选邻居仍按全部邻居排序）
+    """
+    for eid in expert_ids:
+        weights = Counter()
+        for gid in memberships.get(eid, ()):
+            if _expanded(groups, gid, max_group):
+                weights.update(groups[gid])
+        weights.pop(eid, None)
+        ranked = sorted(weights.items(), key=lambda item: (-item[1], item[0]))
+        for other, weight in ranked[:degree_cap or None]:
+            if targets is None or other in targets:
+                yield {'a': eid, 'b': other, 'weight': weight}
+
+
+def _co_members(expert_ids, memberships, groups, max_group):
+    """与给定专家同在某个展开分组中的全部专家（含自身）"""
+    found = set()
+    for eid in expert_ids:
+        for gid in memberships.get(eid, ()):
+            if _expanded(groups, gid, max_group):
+                found.update(groups[gid])
+    return found
+
+
+def derived_updates(seeds, memberships, old_memberships=None, max_group=DERIVED_MAX_GROUP,
+                    degree_cap=DERIVED_DEGREE_CAP):
+    """
+    增量同步一种派生关系：需要先删除其全部派生边的专家，以及重新写入的边
+
+    专家的邻居表只在某个所属分组的成员或展开状态变化时改变，而分组变化必然有某个 seed 进出：
+    - recompute：seed，以及 seed 进出过的分组在新旧任一状态下展开时的全部成员（分组缩小到阈值以下、
+      seed 已不在其中时，留下的成员同样要重算），邻居表可能变化，删除其边后按新语料重选
+    - 其余与 recompute 同组的专家邻居表不变，但它们选中、指向 recompute 的边随删除一起丢失，需补写
+    任一端选中即有边，且选邻居与处理顺序无关，因此结果与在同一份语料上全量构建一致
+
+    Args:
+        seeds: 成员关系变化（新增/变更/删除）的专家 ID
+        memberships: 同步后的 专家 ID -> 分组 ID 集合
+        old_memberships: 上次同步时的成员关系；None 表示全量构建（全部专家重新计算）
+
+    Returns:
+        (recompute, rows)：recompute 为需删除派生边的专家 ID 集合（已不存在的专家不含在内），rows 为边的生成器
+    """
+    groups = group_members(memberships)
+    if old_memberships is None:
+        return set(memberships), derived_rows(sorted(memberships), memberships, groups, max_group, degree_cap)
+    old_groups = group_members(old_memberships)
+    seeds = set(seeds)
+    recompute = set(seeds)
+    for gid in {gid for eid in seeds for m in (memberships, old_memberships) for gid in m.get(eid, ())}:
+        for state in (groups, old_groups):
+            if _expanded(state, gid, max_group):
+                recompute.update(groups.get(gid, ()))
+                recompute.update(old_groups.get(gid, ()))
+    recompute &= set(memberships)
+    neighbours = _co_members(recompute, memberships, groups, max_group) - recompute
+
+    def rows():
+        yield from derived_rows(sorted(recompute), memberships, groups, max_group, degree_cap)
+        yield from derived_rows(sorted(neighbours), memberships, groups, max_group, degree_cap, targets=recompute)
+    return recompute, rows()
+
+
+class SyncDiff:
+    """
+    某类实体的比对结果
+
+    Attributes:
+        entries: 同步后的清单（来源 id -> 条目）
+        changed: 新增或内容变化的来源 id
+        affected: 受影响的旧条目（已删除或已变更的文件在上次同步时的条目）
+        stale_ids: 需要删除的节点 ID（旧条目的 ID 已不再被任何文件使用）
+    """
+
+    def __init__(self, entries, changed, affected, stale_ids):
+        self.entries = entries
+        self.changed = changed
+        self.affected = affected
+        self.stale_ids = stale_ids
+
+    def changed_entries(self):
+        return [self.entries[name] for name in sorted(self.changed) if self.entries[name].get('id')]
+
+
 class KnowledgeGraphBuilder:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, batch_size=BATCH_SIZE, workers=WRITE_WORKERS,
+                 manifest_path=MANIFEST_PATH):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
         self.extractor = DataExtractor(EXPERT_DIR, ORG_DIR, PATENT_DIR)
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.manifest_path = str(manifest_path)
 
     def close(self):
         self.driver.close()
 
-    def build(self):
-        org_map = self.extractor.build_org_map()
-        
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        """先写临时文件再原子替换；同步中途失败时保留旧清单，下次重新比对（各步写入均可重复执行）"""
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def write_rows(self, query, rows, label=""):
+        """
+        分批写入：每批一个显式写事务（瞬时错误如死锁由驱动自动重试）。
+        会话不是线程安全的，每次调用单独开一个会话，可在多个线程中并行调用
+
+        Returns:
+            写入的行数
+        """
+        total = 0
         with self.driver.session() as session:
-            # 1. 自动清空旧数据（实现一键重构）
-            print("正在清空旧数据...")
-            session.run("MATCH (n) DETACH DELETE n")
+            for batch in batched(rows, self.batch_size):
+                session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+                total += len(batch)
+        if label:
+            print(f"  {label}：{total} 条")
+        return total
 
-            # 2. 创建唯一性约束
+    def _parallel_writes(self, jobs):
+        """jobs: [(query, rows, label)]，互不依赖的写入并行执行"""
+        if self.workers == 1 or len(jobs) == 1:
+            for job in jobs:
+                self.write_rows(*job)
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+            for future in [executor.submit(self.write_rows, *job) for job in jobs]:
+                future.result()
+
+    def _diff(self, entity_type, old):
+        """比对文件夹与旧清单，只解析新增/变更的文件（清单条目即 kg_utils.compact_record 的紧凑记录）"""
+        digests = self.extractor.scan(self.extractor.folders[entity_type])
+        changed = {name for name, digest in digests.items() if old.get(name, {}).get('digest') != digest}
+        entries = {name: old[name] for name in digests if name not in changed}
+        for name, record in self.extractor.iter_compact(entity_type, changed):
+            entries[name] = record
+        for name in changed:
+            # 解析失败或空文件只记录哈希，内容不变时不再重复解析
+            entries.setdefault(name, {})['digest'] = digests[name]
+        affected = [entry for name, entry in old.items() if name not in digests or name in changed]
+        live_ids = {entry['id'] for entry in entries.values() if entry.get('id')}
+        stale_ids = {entry['id'] for entry in affected if entry.get('id') and entry['id'] not in live_ids}
+        return SyncDiff(entries, changed, affected, stale_ids)
+
+    def build(self, full=False):
+        manifest = None if full else self.load_manifest()
+
+        with self.driver.session() as session:
+            # 1. 首次运行或指定全量时清空旧数据（分批提交，避免一个巨大事务）
+            if manifest is None:
+                print("正在清空旧数据（全量重建）...")
+                session.run(f"MATCH (n) CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF {self.batch_size} ROWS")
+
+            # 2. 创建唯一性约束（MERGE 按 id 走索引查找）
             session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (e:Expert) REQUIRE e.id IS UNIQUE")
             session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (o:Organization) REQUIRE o.id IS UNIQUE")
             session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (p:Patent) REQUIRE p.id IS UNIQUE")
+        rebuild = manifest is None
+        manifest = manifest or {}
+
+        # 3. 比对三个文件夹
+        print("正在比对数据文件...")
+        orgs = self._diff("organization", manifest.get('organization', {}))
+        patents = self._diff("patent", manifest.get('patent', {}))
+        experts = self._diff("expert", manifest.get('expert', {}))
+        for label, diff in (("组织", orgs), ("专利", patents), ("专家", experts)):
+            print(f"  {label}：共 {len(diff.entries)} 个文件，新增/变更 {len(diff.changed)}，删除节点 {len(diff.stale_ids)}")
 
-            # 3. 注入组织节点 (仅 ID 和 Name)
-            print("正在注入组织节点...")
-            for org in self.extractor.get_organizations():
-                session.run("MERGE (o:Organization {id: $id}) SET o.name = $name", 
-                            id=org['id'], name=org['title'])
-
-            # 4. 注入专利节点 (仅 ID 和 Name)
-            print("正在注入专利节点...")
-            for patent in self.extractor.get_patents():
-                session.run("MERGE (p:Patent {id: $id}) SET p.name = $name", 
-                            id=patent['id'], name=patent['title'])
-
-            # 5. 注入专家节点及所有关系
-            print("正在注入专家及关系...")
-            for exp in self.extractor.get_experts():
-                # 创建专家
-                session.run("MERGE (e:Expert {id: $id}) SET e.name = $name", 
-                            id=exp['id'], name=exp['title'])
-
-                # 建立 [BELONGS_TO] (专家-组织)
-                for org_name in exp.get('orgs', []):
-                    org_id = org_map.get(org_name)
-                    if org_id:
-                        session.run("""
-                            MATCH (e:Expert {id: $eid}), (o:Organization {id: $oid})
-                            MERGE (e)-[:BELONGS_TO]->(o)
-                        """, eid=exp['id'], oid=org_id)
-
-                # 建立 [INVENTED] (专家-专利)
-                patent_info = exp.get('invent_patents', {})
-                for p_item in patent_info.get('patent_list', []):
-                    session.run("""
-                        MATCH (e:Expert {id: $eid})
-                        MERGE (p:Patent {id: $pid})
-                        ON CREATE SET p.name = $pname
-                        MERGE (e)-[:INVENTED]->(p)
-                    """, eid=exp['id'], pid=p_item['id'], pname=p_item.get('title'))
-
-            # 6. 计算生成的社交关系
-            print("正在计算合作者与同事关系...")
-            # 同一专利即为合作者
-            session.run("""
-                MATCH (e1:Expert)-[:INVENTED]->(p:Patent)<-[:INVENTED]-(e2:Expert)
-                WHERE e1.id < e2.id
-                MERGE (e1)-[:COLLABORATED_WITH]-(e2)
-            """)
-            # 同一组织即为同事
-            session.run("""
-                MATCH (e1:Expert)-[:BELONGS_TO]->(o:Organization)<-[:BELONGS_TO]-(e2:Expert)
-                WHERE e1.id < e2.id
-                MERGE (e1)-[:IS_COLLEAGUE_OF]-(e2)
-            """)
+        # 4. 删除不再存在的节点（连同其全部关系）
+        for label, diff in (("Organization", orgs), ("Patent", patents), ("Expert", experts)):
+            self.write_rows(DELETE_NODES.format(label=label), sorted(diff.stale_ids))
 
+        # 5. 注入新增/变更的组织、专利、专家节点（仅 ID 和 Name）：三种标签互不依赖，并行写入
+        print(f"正在注入节点（每批 {self.batch_size} 条，{self.workers} 个写入线程）...")
+        self._parallel_writes([
+            (ORG_NODES, [{'id': e['id'], 'name': e['title']} for e in orgs.changed_entries()], "组织节点"),
+            (PATENT_NODES, [{'id': e['id'], 'name': e['title']} for e in patents.changed_entries()], "专利节点"),
+            (EXPERT_NODES, [{'id': e['id'], 'name': e['title']} for e in experts.changed_entries()], "专家节点"),
+        ])
+
+        # 6. 受影响的专家：文件变化，或引用了增删改名的组织、被删除的专利
+        org_titles = {e.get('title') for e in orgs.affected + [orgs.entries[n] for n in orgs.changed]}
+        org_titles.discard(None)
+        touched = {}
+        for name in sorted(experts.entries):
+            entry = experts.entries[name]
+            if entry.get('id') and (name in experts.changed or org_titles.intersection(entry['orgs'])
+                                    or patents.stale_ids.intersection(p for p, _ in entry['patents'])):
+                touched[entry['id']] = entry
+        touched_ids = list(touched)
+        print(f"正在更新 {len(touched_ids)} 位专家的关系...")
+
+        # 7. 建立 [BELONGS_TO] (专家-组织)、[INVENTED] (专家-专利)：先删后建；
+        # 两类关系都要锁专家节点，串行写入以免事务间互相等待
+        if not rebuild:
+            self.write_rows(DELETE_EXPERT_EDGES, touched_ids)
+        org_map = {}
+        for name in sorted(orgs.entries):
+            entry = orgs.entries[name]
+            if entry.get('id') and entry.get('title'):
+                org_map[entry['title']] = entry['id']
+        self.write_rows(BELONGS_TO_EDGES, [{'eid': eid, 'oid': org_map[o]} for eid, e in touched.items()
+                                           for o in e['orgs'] if o in org_map], "BELONGS_TO")
+        self.write_rows(INVENTED_EDGES, [{'eid': eid, 'pid': pid, 'pname': pname} for eid, e in touched.items()
+                                         for pid, pname in e['patents']], "INVENTED")
+        orphans = {pid for e in experts.affected for pid, _ in e.get('patents', [])}
+        self.write_rows(DELETE_ORPHAN_PATENTS, sorted(orphans - {e['id'] for e in patents.entries.values()
+                                                                 if e.get('id')}))
+
+        # 8. 重新计算邻居表可能变化的专家的社交关系（被删除专家的关系已随节点删除）
+        print("正在计算合作者与同事关系...")
+        org_groups, patent_groups = expert_memberships(experts.entries, orgs.entries)
+        old_org_groups, old_patent_groups = expert_memberships(manifest.get('expert', {}),
+                                                               manifest.get('organization', {}))
+        seeds = set(touched_ids) | experts.stale_ids
+        for rel, memberships, old_memberships in (("COLLABORATED_WITH", patent_groups, old_patent_groups),
+                                                  ("IS_COLLEAGUE_OF", org_groups, old_org_groups)):
+            groups = group_members(memberships)
+            supernodes = [gid for gid, members in groups.items() if DERIVED_MAX_GROUP and len(members) > DERIVED_MAX_GROUP]
+            if supernodes:
+                print(f"  {rel}：{len(supernodes)} 个分组成员超过 {DERIVED_MAX_GROUP}，不展开两两关系")
+            recompute, rows = derived_updates(seeds, memberships, None if rebuild else old_memberships,
+                                              DERIVED_MAX_GROUP, DERIVED_DEGREE_CAP)
+            if not rebuild:
+                print(f"  {rel}：重新计算 {len(recompute)} 位专家")
+                self.write_rows(DELETE_DERIVED_EDGES.format(rel=rel), sorted(recompute))
+            self.write_rows(DERIVED_EDGES.format(rel=rel), rows, rel)
+
+        self.save_manifest({'organization': orgs.entries, 'patent': patents.entries, 'expert': experts.entries})
         print("知识图谱构建完成！")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建/增量同步知识图谱")
+    parser.add_argument("--full", action="store_true", help="清空图谱后全量重建（忽略同步清单）")
+    args = parser.parse_args()
+
     builder = KnowledgeGraphBuilder(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
     try:
-        builder.build()
+        builder.build(full=args.full)
     finally:
-        builder.close()
\ No newline at end of file
+        builder.close()
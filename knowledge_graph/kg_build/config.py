@@ -12,4 +12,26 @@ NEO4J_PASSWORD = "your_password"  # 请替换为你的密码
 BASE_DIR = Path(__file__).parent / "processed_downloaded_pages_json"
 EXPERT_DIR = BASE_DIR / "expert"
 ORG_DIR = BASE_DIR / "organization"
-PATENT_DIR = BASE_DIR / "patent"
\ No newline at end of file
+PATENT_DIR = BASE_DIR / "patent"
+
+# --- 写入配置 ---
+# 每个事务写入的行数（UNWIND $rows 一批）
+BATCH_SIZE = 1000
+# 互不依赖的节点标签（组织/专利/专家）并行写入的线程数，1 表示串行
+WRITE_WORKERS = 3
+
+# --- 增量同步 ---
+# 上次同步时各文件的内容哈希与抽取结果（ID、名称、所属组织、专利），build_graph.py 据此只更新变化的部分
+MANIFEST_PATH = Path(__file__).parent / "kg_manifest.json"
+
+# --- 派生关系（合作者 COLLABORATED_WITH / 同事 IS_COLLEAGUE_OF）---
+# 边上记录 weight：两位专家共同的专利数 / 组织数
+# 成员数超过该值的组织（或专利）视为超级节点，不展开为两两之间的边（成员关系仍由 BELONGS_TO / INVENTED 表达），0 表示不限
+DERIVED_MAX_GROUP = 2000
+# 每位专家最多保留的合作者/同事边数（按 weight 降序），0 表示不限
+DERIVED_DEGREE_CAP = 200
+
+# --- 已解析语料缓存（见 rag/etl/parsed_cache.py）---
+# 与 rag/config.py 中的 PARSED_CACHE_PATH 指向同一文件（相对于项目根目录）时，图谱与向量库构建共用解析结果
+PARSED_CACHE_ENABLED = False
+PARSED_CACHE_PATH = "rag/data/parsed_cache.sqlite"
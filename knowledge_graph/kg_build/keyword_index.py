@@ -0,0 +1,129 @@
+"""
+专家技术关键词内存索引
+
+相似专家推荐需要比较目标专家与其社交圈内每位专家的 technical_keywords。
+原先每次都打开、解析邻居的完整 JSON 文件，这里改为一次性预加载：
+- 关键词驻留为整数编号（词表 + 编号反查表），每位专家的关键词存为 int32 数组（保持文件中的顺序，去重）
+- 共同关键词即两个小数组求交（np.isin），按目标专家关键词的原有顺序返回，不再读盘
+- 按文件 mtime 增量刷新：新增/修改的文件重新解析，删除的文件移出索引；两次检查至少间隔 refresh_interval 秒
+
+本模块不导入任何 config（kg_build/config.py 与项目根目录的 config 包同名），目录由调用方传入。
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from rag.etl.loader import iter_records, source_id
+
+_EMPTY = np.zeros(0, dtype="int32")
+
+
+def technical_keywords(record, entity_type=None):
+    """在解析进程中只取出 data -> ai_fields -> 专家简介 -> 综合分析 -> technical_keywords（任一层为 null 或非字典时为空）"""
+    node = record
+    for key in ('data', 'ai_fields', '专家简介', '综合分析'):
+        node = (node.get(key) or {}) if isinstance(node, dict) else {}
+    keywords = node.get('technical_keywords') if isinstance(node, dict) else None
+    if not isinstance(keywords, list):
+        return []
+    return [k for k in keywords if isinstance(k, str)]
+
+
+class ExpertKeywordIndex:
+    """
+    Args:
+        expert_dir: 专家 JSON 文件夹（文件名即专家姓名）
+        refresh_interval: 两次 mtime 检查的最小间隔（秒），0 表示每次访问都检查
+    """
+
+    def __init__(self, expert_dir, refresh_interval: float = 5.0):
+        self.expert_dir = str(expert_dir)
+        self.refresh_interval = refresh_interval
+        self.term_ids = {}   # 关键词 -> 编号
+        self.terms = []      # 编号 -> 关键词
+        self.keyword_ids = {}  # 专家姓名 -> 关键词编号数组（文件中的顺序，去重）
+        self.mtimes = {}     # 专家姓名 -> 文件 mtime_ns
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _intern(self, keywords) -> np.ndarray:
+        ids = []
+        for keyword in keywords:
+            term_id = self.term_ids.get(keyword)
+            if term_id is None:
+                term_id = self.term_ids[keyword] = len(self.terms)
+                self.terms.append(keyword)
+            ids.append(term_id)
+        # 按首次出现去重，保持专家文件中关键词的顺序
+        return np.array(list(dict.fromkeys(ids)), dtype="int32") if ids else _EMPTY
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        按 mtime 同步索引与文件夹
+
+        Returns:
+            重新解析或移除的专家数
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at and now - self._checked_at < self.refresh_interval:
+                return 0
+            if not os.path.isdir(self.expert_dir):
+                self._checked_at = now
+                return 0
+
+            current = {}
+            with os.scandir(self.expert_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        current[source_id(entry.name)] = (entry.name, entry.stat().st_mtime_ns)
+            stale = [name for name, (_, mtime) in current.items() if self.mtimes.get(name) != mtime]
+            gone = [name for name in self.mtimes if name not in current]
+            for name in gone:
+                self.keyword_ids.pop(name, None)
+                self.mtimes.pop(name, None)
+            if stale:
+                # 首次加载（或大批文件变化）时由 loader 的进程池并行解析，只回传关键词列表
+                file_names = sorted(current[name][0] for name in stale)
+                parsed = dict((name, keywords) for name, _, keywords in
+                              iter_records(self.expert_dir, file_names, record_fn=technical_keywords,
+                                           workers=None if len(file_names) > 256 else 1))
+                for name in stale:
+                    self.keyword_ids[name] = self._intern(parsed.get(name, []))
+                    self.mtimes[name] = current[name][1]
+            # 刷新成功后才记录检查时间，失败时下次访问立即重试
+            self._checked_at = now
+            # 词表只增不减：被删除专家独有的关键词保留编号，不影响求交结果
+            return len(stale) + len(gone)
+
+    def ids(self, name: str) -> np.ndarray:
+        """专家的关键词编号数组（未知专家为空数组）"""
+        self.refresh()
+        return self.keyword_ids.get(name, _EMPTY)
+
+    def keywords(self, name: str) -> set:
+        return {self.terms[i] for i in self.ids(name)}
+
+    def common(self, my_ids: np.ndarray, name: str) -> list:
+        """给定关键词编号数组与另一位专家的共同关键词，按 my_ids 中的顺序（即目标专家文件中关键词的顺序）"""
+        other = self.keyword_ids.get(name, _EMPTY)
+        if not len(my_ids) or not len(other):
+            return []
+        return [self.terms[i] for i in my_ids[np.isin(my_ids, other)]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def shared_keyword_index(expert_dir) -> ExpertKeywordIndex:
+    """同一专家目录在进程内共享一个索引（各工具实例、各次调用复用）"""
+    key = os.path.abspath(str(expert_dir))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ExpertKeywordIndex(key)
+        return index
@@ -16,6 +16,7 @@ if project_root not in sys.path:
 
 # 请确保 config.py 中定义了 EXPERT_DIR, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
 from config.config import KG_CONFIG
+from knowledge_graph.kg_build.keyword_index import shared_keyword_index
 NEO4J_URI = KG_CONFIG['NEO4J_URI']
 NEO4J_USER = KG_CONFIG['NEO4J_USER']
 NEO4J_PASSWORD = KG_CONFIG['NEO4J_PASSWORD']
@@ -36,31 +37,10 @@ class KGTool:
 
     def _get_keywords_from_json(self, name):
         """
-        修正后的关键词提取函数
-        精准路径：data -> ai_fields -> 专家简介 -> 综合分析 -> technical_keywords
+        专家的技术关键词：data -> ai_fields -> 专家简介 -> 综合分析 -> technical_keywords
+        取自预加载的关键词索引（见 keyword_index.py），文件变化时按 mtime 自动刷新
         """
-        file_path = Path(EXPERT_DIR) / f"{name}.json"
-        
-        if not file_path.exists():
-            return set()
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                raw_data = json.load(f)
-            
-            # 严格按照数据实际层级进行链式安全提取
-            keywords = raw_data.get('data', {}) \
-                              .get('ai_fields', {}) \
-                              .get('专家简介', {}) \
-                              .get('综合分析', {}) \
-                              .get('technical_keywords', [])
-            
-            # 确保返回的是集合(set)类型，以便后续进行 intersection (交集) 运算
-            return set(keywords) if isinstance(keywords, list) else set()
-        except Exception as e:
-            # 如需调试，可以取消下面这一行的注释
-            # print(f"解析 {name}.json 时出错: {e}")
-            return set()
+        return shared_keyword_index(EXPERT_DIR).keywords(name)
 
     def show_info(self, name):
         """查询专家的基础关联信息"""
@@ -101,9 +81,10 @@ class KGTool:
         """混合检索：基于本地JSON技术栈在社交圈内推荐"""
         print(f"\n>>> 正在检索与 [{name}] 技术能力最相似的专家...")
 
-        # 1. 获取自己的技术栈
-        my_stack = self._get_keywords_from_json(name)
-        if not my_stack:
+        # 1. 获取自己的技术栈（关键词编号数组）
+        keyword_index = shared_keyword_index(EXPERT_DIR)
+        my_stack = keyword_index.ids(name)
+        if not len(my_stack):
             print(f"警告：无法从本地提取专家 [{name}] 的技术关键词，请确认 JSON 文件层级。")
             return
 
@@ -122,15 +103,14 @@ class KGTool:
         results = []
         for f in friends:
             f_name = f['name']
-            f_stack = self._get_keywords_from_json(f_name)
-            common = my_stack.intersection(f_stack)
+            common = keyword_index.common(my_stack, f_name)
             
             if common:
                 results.append({
                     "name": f_name,
                     "id": f['id'],
                     "rel_types": f['rel_types'],
-                    "common": list(common),
+                    "common": common,
                     "score": len(common)
                 })
 
@@ -1,34 +1,86 @@
-import json
-from pathlib import Path
+import hashlib
+import os
+
+from rag.etl.loader import iter_records, list_files, source_id
+from rag.etl.parsed_cache import parsed_cache_path
+from knowledge_graph.kg_build.config import PARSED_CACHE_ENABLED, PARSED_CACHE_PATH
+
+
+def compact_record(record, entity_type=None):
+    """
+    完整记录 -> 图谱构建只需要的紧凑记录（在解析进程中执行，只回传少量字段）
+
+    组织/专利：{'id', 'title'}；专家另有 'orgs'（组织名称列表）与 'patents'（[专利ID, 专利名称] 列表）
+    """
+    data = record.get("data") or {}
+    compact = {'id': data.get('id'), 'title': data.get('title')}
+    if entity_type == "expert":
+        patent_info = data.get('invent_patents') or {}
+        compact['orgs'] = [o for o in data.get('orgs') or [] if isinstance(o, str)]
+        compact['patents'] = [[p['id'], p.get('title')] for p in patent_info.get('patent_list') or []
+                              if isinstance(p, dict) and p.get('id')]
+    return compact
+
 
 class DataExtractor:
-    def __init__(self, expert_dir, org_dir, patent_dir):
+    """
+    每个文件只解析一次：进程池并行解析（与向量库构建共用 rag.etl.loader），工作进程中即裁剪为紧凑记录；
+    开启 PARSED_CACHE_ENABLED 时与向量库构建共用已解析语料缓存
+    """
+
+    def __init__(self, expert_dir, org_dir, patent_dir, workers=None):
         self.expert_dir = expert_dir
         self.org_dir = org_dir
         self.patent_dir = patent_dir
+        self.folders = {"expert": expert_dir, "organization": org_dir, "patent": patent_dir}
+        self.workers = workers
+        self.cache_path = parsed_cache_path(PARSED_CACHE_ENABLED, PARSED_CACHE_PATH)
         self.org_name_to_id = {} # 建立组织名到ID的映射
+        self._corpus = {}
+
+    @staticmethod
+    def scan(folder):
+        """文件夹下各 JSON 文件的内容哈希：来源 id（文件名去掉 .json）-> sha1，增量同步据此判断新增/变更/删除"""
+        digests = {}
+        for file_name in list_files(str(folder)):
+            with open(os.path.join(folder, file_name), 'rb') as f:
+                digests[source_id(file_name)] = hashlib.sha1(f.read()).hexdigest()
+        return digests
+
+    def iter_compact(self, entity_type, names=None):
+        """
+        解析某类实体的文件，yield (来源 id, 紧凑记录)
+
+        Args:
+            names: 只解析这些来源 id（默认文件夹下全部文件）
+        """
+        file_names = None if names is None else [f"{n}.json" for n in sorted(names)]
+        if file_names == []:
+            return
+        for name, _, record in iter_records(str(self.folders[entity_type]), file_names, entity_type=entity_type,
+                                            workers=self.workers, record_fn=compact_record,
+                                            cache_path=self.cache_path):
+            yield name, record
+
+    def corpus(self, entity_type):
+        """整个文件夹的紧凑记录（来源 id -> 记录），首次调用时解析，之后复用"""
+        if entity_type not in self._corpus:
+            self._corpus[entity_type] = dict(self.iter_compact(entity_type))
+        return self._corpus[entity_type]
 
     def build_org_map(self):
         """建立 组织名称 -> ID 的映射表"""
         print("正在建立组织映射表...")
-        for file in self.org_dir.glob("*.json"):
-            with open(file, 'r', encoding='utf-8') as f:
-                data = json.load(f).get("data", {})
-                if data.get("id") and data.get("title"):
-                    self.org_name_to_id[data["title"]] = data["id"]
+        for data in self.get_organizations():
+            if data.get("id") and data.get("title"):
+                self.org_name_to_id[data["title"]] = data["id"]
         return self.org_name_to_id
 
     def get_experts(self):
-        for file in self.expert_dir.glob("*.json"):
-            with open(file, 'r', encoding='utf-8') as f:
-                yield json.load(f).get("data", {})
+        yield from self.corpus("expert").values()
 
     def get_organizations(self):
-        for file in self.org_dir.glob("*.json"):
-            with open(file, 'r', encoding='utf-8') as f:
-                yield json.load(f).get("data", {})
+        yield from self.corpus("organization").values()
 
     def get_patents(self):
-        for file in self.patent_dir.glob("*.json"):
-            with open(file, 'r', encoding='utf-8') as f:
-                yield json.load(f).get("data", {})
\ No newline at end of file
+        yield from self.corpus("patent").values()
@@ -1,83 +1,129 @@
 import argparse
 import os
-import json
-import numpy as np
 import copy
+import hashlib
 from config import config
-from core.llm_client import get_embedding
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core.pipeline import EmbeddingPipeline
+from core.text_builder import build_chunks, builder_signature
 from core.vectordb import VectorDB
+from core.lexical_index import build_lexical_index, lexical_index_path
+from core.attribute_index import build_attribute_index
+from etl.loader import iter_records, list_files, source_id
+from etl.parsed_cache import parsed_cache_path
 
-def build_database():
-    print("=== 正在启动 RAG 数据库物理隔离式构建 ===")
-    
-    for entity_type in config.ENTITY_TYPES:
-        db_key = config.ENTITY_MAP.get(entity_type, entity_type)
-        print(f"\n检查实体类型: {entity_type} ...")
-        db = VectorDB(db_name=db_key)
-        
-        # 1. 物理回滚保护：如果数据量异常，回滚到 6702 条安全点
-        if entity_type == "expert" and len(db.metadata) > 6702:
-            print(f"  [Safety] 正在物理回滚至 6702 条安全点...")
-            import faiss
-            safe_vectors = [db.index.reconstruct(i) for i in range(6702)]
-            new_index = faiss.IndexFlatIP(config.EMBEDDING_DIMENSION)
-            new_index.add(np.array(safe_vectors).astype('float32'))
-            db.index = new_index
-            db.metadata = db.metadata[:6702]
-            db.save()
-
-        # 2. 构建查重集合
-        existing_titles = set()
-        for meta in db.metadata:
-            orig = meta.get("original_data", {})
-            t = orig.get("title") or orig.get("data", {}).get("title")
-            if t: existing_titles.add(str(t).strip())
-
-        # 3. 物理扫描文件夹进行补录
-        folder_path = os.path.join(config.RAW_DATA_ROOT, entity_type)
-        if not os.path.exists(folder_path): continue
-        
-        files = [f for f in os.listdir(folder_path) if f.endswith('.json')]
-        success_count = 0
+def _file_digest(file_path, signature=""):
+    """文件内容 + 文本构建配置指纹的哈希：任一变化都会触发重新 embedding"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read() + signature.encode('utf-8')).hexdigest()
+
+
+def build_entity(entity_type):
+    """增量构建单个实体类型的向量库：按内容哈希清单新增/更新/删除，返回写入（新增+更新）条数"""
+    db_key = config.ENTITY_MAP.get(entity_type, entity_type)
+    print(f"\n检查实体类型: {entity_type} ...")
+    db = VectorDB(db_name=db_key)
+
+    # 1. 物理扫描文件夹，与清单（来源文件 -> 行号、内容哈希）比对
+    folder_path = os.path.join(config.RAW_DATA_ROOT, entity_type)
+    if not os.path.exists(folder_path): return 0
+
+    files = list_files(folder_path)
+    # 目录为空多半是路径/挂载问题，不据此清空向量库
+    if not files: return 0
+    signature = builder_signature(entity_type)
+    digests = {source_id(f): _file_digest(os.path.join(folder_path, f), signature) for f in files}
+    manifest = db.manifest()
 
-        for file_name in files:
-            file_path = os.path.join(folder_path, file_name)
-            expert_name = file_name.replace(".json", "").strip()
+    # 旧库的记录没有哈希：其向量由旧版文本构建（未按字段抽取/切块），不能直接补记哈希，
+    # 与内容变化的记录一样重新 embedding；写入成功前旧记录保持可用，成功后才带上新哈希
+    adopted = {name for name, (_, digest) in manifest.items() if digest is None and name in digests}
+    added = {name for name in digests if name not in manifest}
+    changed = {name for name, (_, digest) in manifest.items()
+               if name in digests and digest != digests[name]}
+    gone = [row for name, (row, _) in manifest.items() if name not in digests]
+    db.remove_rows(gone)
+    removed = len(gone)
 
-            if expert_name in existing_titles:
-                continue
+    todo = [f for f in files if source_id(f) in added or source_id(f) in changed]
+    print(f"  [{entity_type}] 共 {len(files)} 个文件：新增 {len(added)}，变更 {len(changed)}"
+          f"（其中旧版无哈希记录 {len(adopted)}），删除 {removed}")
 
+    # 3. 写入阶段：只在当前线程中修改 db；每条先进预写日志，每 CHECKPOINT_EVERY 条落盘一次
+    written = [0]
+
+    def write(expert_name, chunks, raw_data, vectors):
+        # 强行校准内部标题
+        if "data" in raw_data: raw_data["data"]["title"] = expert_name
+        raw_data["title"] = expert_name
+        # 同来源的旧记录（含全部块）由 add_chunks 标记删除，embedding 失败时旧版本保持可用
+        ok = db.add_chunks(
+            texts=chunks,
+            vectors=vectors,
+            original_data=copy.deepcopy(raw_data),
+            source=expert_name,
+            digest=digests[expert_name]
+        )
+        if ok:
+            written[0] += 1
+            if written[0] % config.CHECKPOINT_EVERY == 0:
+                db.save()
+        return ok
+
+    # 4. 读取 -> 并发 embedding -> 写入 流水线
+    pipeline = EmbeddingPipeline(
+        entity_type,
+        workers=config.EMBEDDING_WORKERS,
+        batch_size=config.EMBEDDING_BATCH_SIZE,
+        queue_size=config.PIPELINE_QUEUE_SIZE,
+        report_interval=config.PROGRESS_INTERVAL
+    )
+    # 读取阶段在进程池中解析 JSON 并切块，多核并行
+    records = iter_records(folder_path, todo, text_fn=build_chunks, entity_type=entity_type,
+                           batch_size=config.LOADER_BATCH_SIZE, workers=config.LOADER_WORKERS,
+                           cache_path=parsed_cache_path(config.PARSED_CACHE_ENABLED, config.PARSED_CACHE_PATH))
+    success_count = pipeline.run(records, len(todo), write) if todo else 0
+
+    if success_count % config.CHECKPOINT_EVERY or (success_count == 0 and removed):
+        db.save()
+    # 倒排索引（混合检索的词法通道）与属性过滤索引随向量库一起重建
+    if success_count > 0 or removed or not os.path.exists(lexical_index_path(db_key)):
+        build_lexical_index(db)
+        build_attribute_index(db)
+    if success_count > 0 or removed:
+        print(f"  ✅ {entity_type} 处理完成，写入 {success_count} 条，删除 {removed} 条。")
+    if db.stale_count():
+        print(f"  [{entity_type}] 索引中残留 {db.stale_count()} 条已删除向量（检索时过滤），可执行 --reindex 清理")
+    return success_count
+
+
+def build_database(parallel=True):
+    print("=== 正在启动 RAG 数据库物理隔离式构建 ===")
+
+    if not parallel:
+        for entity_type in config.ENTITY_TYPES:
+            build_entity(entity_type)
+        return
+
+    # 各实体类型写入不同的 VectorDB，互不干扰，可同时构建；接口配额由全局令牌桶统一约束
+    with ThreadPoolExecutor(max_workers=len(config.ENTITY_TYPES)) as executor:
+        futures = {executor.submit(build_entity, t): t for t in config.ENTITY_TYPES}
+        for future in as_completed(futures):
             try:
-                # 4. 强制物理重读：确保读取的内容与文件名完全匹配
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    raw_data = json.load(f)
-                    # 重新转换为字符串用于 Embedding
-                    text_for_embedding = json.dumps(raw_data, ensure_ascii=False)
-
-                # 5. 长度截断
-                if len(text_for_embedding) > 30000:
-                    text_for_embedding = text_for_embedding[:30000]
-
-                print(f"  [新入库] {expert_name}...")
-                vector = get_embedding(text_for_embedding)
-                
-                if vector:
-                    # 强行校准内部标题
-                    if "data" in raw_data: raw_data["data"]["title"] = expert_name
-                    raw_data["title"] = expert_name
-                    
-                    db.add_item(
-                        text=text_for_embedding,
-                        vector=vector,
-                        original_data=copy.deepcopy(raw_data)
-                    )
-                    success_count += 1
+                future.result()
             except Exception as e:
-                print(f"  ❌ 处理 {file_name} 失败: {e}")
+                print(f"  ❌ {futures[future]} 构建失败: {e}")
 
-        if success_count > 0:
-            db.save()
-            print(f"  ✅ {entity_type} 处理完成，新增 {success_count} 条。")
+def reindex_database():
+    """按 RAG_CONFIG['INDEX_FACTORY'] 重建所有实体的索引（切换 Flat/HNSW/IVF 后执行）"""
+    for entity_type in config.ENTITY_TYPES:
+        db = VectorDB(db_name=config.ENTITY_MAP.get(entity_type, entity_type))
+        if len(db.metadata) == 0:
+            continue
+        db.rebuild_index()
+        db.save()
+        build_lexical_index(db)
+        build_attribute_index(db)
 
 def inspect_expert(name):
     """
@@ -121,9 +167,13 @@ def inspect_expert(name):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--inspect', type=str)
+    parser.add_argument('--serial', action='store_true', help='按实体类型依次构建（默认同时构建）')
+    parser.add_argument('--reindex', action='store_true', help='按配置的索引类型重建已有索引')
     args = parser.parse_args()
 
     if args.inspect:
         inspect_expert(args.inspect)
+    elif args.reindex:
+        reindex_database()
     else:
-        build_database()
+        build_database(parallel=not args.serial)
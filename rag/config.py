@@ -16,6 +16,21 @@ class Config:
     EMBEDDING_URL = "https://api.siliconflow.cn/v1/embeddings"
     EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-8B" # 保持和你之前一致
     EMBEDDING_DIMENSION = 4096
+    # 构建时每攒够多少条文本发起一次批量 embedding 请求
+    EMBEDDING_BATCH_SIZE = 32
+    # 并发 embedding 线程数、流水线队列长度（批次数）、进度打印间隔（秒）
+    EMBEDDING_WORKERS = 4
+    PIPELINE_QUEUE_SIZE = 8
+    PROGRESS_INTERVAL = 5.0
+    # JSON 解析进程数（None 为 CPU 核数）与每个解析任务的文件数
+    LOADER_WORKERS = None
+    LOADER_BATCH_SIZE = 64
+    # 已解析语料缓存：解析后的 JSON 以二进制存入 SQLite，未变化的文件不再重复解析（按路径 + mtime/大小校验）；
+    # 路径相对于项目根目录，与 knowledge_graph/kg_build/config.py 指向同一文件时两边构建共用；删除缓存文件即可重置
+    PARSED_CACHE_ENABLED = False
+    PARSED_CACHE_PATH = "rag/data/parsed_cache.sqlite"
+    # 每新增多少条做一次检查点（落盘并清空预写日志）
+    CHECKPOINT_EVERY = 500
 
     # ================= 业务配置 =================
     # 实体类型对应文件夹名称
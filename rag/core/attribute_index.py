@@ -0,0 +1,148 @@
+"""
+属性过滤索引（检索前按属性筛选行）
+
+构建向量库时按 RAG_CONFIG['ATTRIBUTE_FIELDS'] 抽取各实体的属性值（组织、行业领域、标签等），
+为每个 (属性, 取值) 预先记录命中的行号（含切块实体的全部块行），保存为 <db>_attrs.npz。
+检索时把过滤表达式求值为行号位图，交给 faiss 的 IDSelector 在索引内部跳过不满足条件的行，
+一次检索即可拿满 top_k 个合格结果，无需多取再筛、不足再查。
+
+过滤表达式为字典，不同键之间取交集，同一键的多个取值取并集：
+    {"industry": ["新能源", "储能"], "org": "清华大学"}
+    {"title": 专家姓名集合}      # 按标题（入库名）限定，如 "在 data/experts 下有画像文件"
+    {"rows": 行号列表}           # 直接给出候选行号
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config.config import RAG_CONFIG as config
+from .text_builder import select_values
+
+DEFAULT_ATTRIBUTE_FIELDS = {
+    "expert": {
+        "org": ["data.orgs"],
+        "industry": ["data.ai_fields.专家简介.综合分析.industry_sector"],
+        "tag": ["data.tags"],
+    },
+    "organization": {
+        "field": ["data.fields"],
+        "industry": ["data.industry"],
+        "tag": ["data.tags"],
+    },
+    "patent": {
+        "tag": ["data.tags"],
+    },
+}
+
+
+def attribute_fields(entity_type: str) -> dict:
+    return config.get('ATTRIBUTE_FIELDS', DEFAULT_ATTRIBUTE_FIELDS).get(entity_type, {})
+
+
+def attribute_index_path(db) -> str:
+    return os.path.join(os.path.dirname(db.index_path), f"{db.db_name}_attrs.npz")
+
+
+class AttributeIndex:
+    """
+    Args:
+        postings: 属性名 -> {取值: 行号数组}
+        n_rows: 构建时的元数据行数
+    """
+
+    CACHE_SIZE = 256  # 已展开的单值位图缓存条数
+
+    def __init__(self, postings: dict, n_rows: int):
+        self.postings = postings
+        self.n_rows = n_rows
+        self._bitmaps = OrderedDict()
+        self._lock = threading.Lock()  # 位图缓存在检索线程间共享
+
+    @classmethod
+    def from_db(cls, db):
+        fields = attribute_fields(db.db_name)
+        meta = db.metadata
+        postings = {name: {} for name in fields}
+        for row in meta.live_rows():
+            if meta.is_chunk(row):
+                continue
+            data = meta[row].get("original_data", {})
+            rows = meta.chunk_rows(row) if meta.chunked else [row]
+            for name, paths in fields.items():
+                values = {v for path in paths for v in select_values(data, path)}
+                for value in values:
+                    postings[name].setdefault(value, []).extend(rows)
+        postings = {name: {v: np.array(r, dtype="int64") for v, r in values.items()}
+                    for name, values in postings.items()}
+        return cls(postings, len(meta))
+
+    def values(self, name: str) -> list:
+        """某属性的全部取值，按命中行数降序"""
+        values = self.postings.get(name, {})
+        return sorted(values, key=lambda v: -len(values[v]))
+
+    def bitmap(self, name: str, value: str, n_rows: int) -> np.ndarray:
+        """单个 (属性, 取值) 的行号位图（布尔数组）"""
+        key = (name, value, n_rows)
+        with self._lock:
+            mask = self._bitmaps.get(key)
+            if mask is not None:
+                self._bitmaps.move_to_end(key)
+                return mask
+        mask = np.zeros(n_rows, dtype=bool)
+        rows = self.postings.get(name, {}).get(value)
+        if rows is not None:
+            mask[rows[rows < n_rows]] = True
+        with self._lock:
+            self._bitmaps[key] = mask
+            self._bitmaps.move_to_end(key)
+            if len(self._bitmaps) > self.CACHE_SIZE:
+                self._bitmaps.popitem(last=False)
+        return mask
+
+    def save(self, path: str):
+        arrays = {"n_rows": np.array(self.n_rows)}
+        for i, (name, values) in enumerate(self.postings.items()):
+            keys = list(values)
+            lengths = [len(values[v]) for v in keys]
+            arrays[f"name_{i}"] = np.array(name)
+            arrays[f"values_{i}"] = np.array(keys, dtype=str)
+            arrays[f"indptr_{i}"] = np.concatenate([[0], np.cumsum(lengths)]).astype("int64")
+            arrays[f"rows_{i}"] = np.concatenate([values[v] for v in keys]) if keys else np.zeros(0, dtype="int64")
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        postings = {}
+        with np.load(path) as data:
+            i = 0
+            while f"name_{i}" in data:
+                values = data[f"values_{i}"].tolist()
+                indptr = data[f"indptr_{i}"]
+                rows = data[f"rows_{i}"]
+                postings[str(data[f"name_{i}"])] = {v: rows[indptr[j]:indptr[j + 1]] for j, v in enumerate(values)}
+                i += 1
+            return cls(postings, int(data["n_rows"]))
+
+
+def build_attribute_index(db) -> AttributeIndex:
+    """构建并保存向量库对应的属性索引（向量库保存之后调用）"""
+    index = AttributeIndex.from_db(db)
+    index.save(attribute_index_path(db))
+    summary = "，".join(f"{name} {len(values)} 个取值" for name, values in index.postings.items())
+    print(f"[{db.db_name}] 属性索引已更新：{summary or '未配置属性'}")
+    return index
+
+
+def load_attribute_index(db) -> AttributeIndex:
+    """载入属性索引；尚未构建时从元数据现场构建（不落盘）"""
+    path = attribute_index_path(db)
+    if os.path.exists(path):
+        return AttributeIndex.load(path)
+    print(f"[{db.db_name}] 未找到属性索引 {path}，从元数据现场构建（重新运行 build_kb.py 后会自动生成）")
+    return AttributeIndex.from_db(db)
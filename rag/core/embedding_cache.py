@@ -0,0 +1,172 @@
+"""
+Embedding 持久化缓存
+
+以 (EMBEDDING_MODEL, sha256(规范化文本)) 为键，把向量以 float32 二进制存入 SQLite：
+- WAL 模式，多读者/多进程可并发访问；每个线程使用独立连接
+- 记录最近访问时间，总大小超过上限时按 LRU 淘汰
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from config.config import RAG_CONFIG as config
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode NFC、去首尾空白、合并连续空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    # 每写入多少条检查一次总大小
+    EVICT_CHECK_INTERVAL = 256
+
+    def __init__(self, path: str, max_bytes: int = 2 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts_since_check = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, digest)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: list) -> list:
+        """批量查询，返回与 texts 等长的列表，未命中位置为 None"""
+        digests = [text_digest(t) for t in texts]
+        found = {}
+        conn = self._conn()
+        unique = list(set(digests))
+        # SQLite 单条语句的参数个数有限，分段查询
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({placeholders})",
+                [model] + chunk
+            ).fetchall()
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype="float32").tolist()
+
+        if found:
+            now = time.time()
+            try:
+                conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND digest = ?",
+                    [(now, model, d) for d in found]
+                )
+                conn.commit()
+            except sqlite3.OperationalError:
+                # 访问时间只影响淘汰顺序，写锁繁忙时放弃更新即可
+                conn.rollback()
+        return [found.get(d) for d in digests]
+
+    def put_many(self, model: str, texts: list, vectors: list):
+        """批量写入，空向量（请求失败）不缓存；缓存写入尽力而为，数据库被锁/繁忙时放弃本批并打印警告，不影响调用方"""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            if not vector:
+                continue
+            blob = np.asarray(vector, dtype="float32").tobytes()
+            rows.append((model, text_digest(text), blob, len(blob), now))
+        if not rows:
+            return
+        conn = self._conn()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, vector, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            print(f"[EmbeddingCache] 写入失败，跳过缓存 {len(rows)} 条: {e}")
+            return
+
+        with self._lock:
+            self._puts_since_check += len(rows)
+            if self._puts_since_check < self.EVICT_CHECK_INTERVAL:
+                return
+            self._puts_since_check = 0
+        try:
+            self.evict()
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            print(f"[EmbeddingCache] 淘汰失败，下次检查时重试: {e}")
+            with self._lock:
+                self._puts_since_check = self.EVICT_CHECK_INTERVAL
+
+    def total_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def evict(self):
+        """总大小超过上限时，按最近访问时间淘汰到上限的 90%"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        conn = self._conn()
+        freed = 0
+        doomed = []
+        for model, digest, size in conn.execute(
+                "SELECT model, digest, size FROM embeddings ORDER BY last_access ASC"):
+            if total - freed <= target:
+                break
+            doomed.append((model, digest))
+            freed += size
+        conn.executemany("DELETE FROM embeddings WHERE model = ? AND digest = ?", doomed)
+        conn.commit()
+        print(f"[EmbeddingCache] 淘汰 {len(doomed)} 条，释放 {freed / 1024 ** 2:.1f} MB")
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """按 RAG_CONFIG 创建进程内共享的缓存实例，未启用时返回 None"""
+    global _default_cache
+    if not config.get('EMBEDDING_CACHE_ENABLED', False):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            path = config.get('EMBEDDING_CACHE_PATH', 'rag/data/embedding_cache.sqlite')
+            if not os.path.isabs(path):
+                project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+                path = os.path.join(project_root, path)
+            _default_cache = EmbeddingCache(path, config.get('EMBEDDING_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+    return _default_cache
@@ -0,0 +1,87 @@
+"""
+混合检索：BM25 词法通道 + FAISS 向量通道，倒数排名融合（RRF）
+
+两个通道在线程池中同时执行（FAISS 检索与 numpy 计算均释放 GIL，embedding 请求等待网络），
+一次混合检索的耗时约等于较慢的一个通道
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import RAG_CONFIG as config
+from .lexical_index import load_lexical_index
+from .llm_client import get_embeddings
+
+
+def rrf_fuse(ranked_lists, k: int = 60, top_k: int = None):
+    """
+    倒数排名融合：score(d) = Σ 1 / (k + rank_i(d))，rank 从 1 开始
+
+    Args:
+        ranked_lists: 若干按相关度降序的行号序列
+        k: 平滑常数，越大越弱化头部名次的优势
+
+    Returns:
+        [(行号, 融合得分, [各通道名次或 None])]，按融合得分降序
+    """
+    fused = {}
+    for channel, rows in enumerate(ranked_lists):
+        for rank, row in enumerate(rows, 1):
+            entry = fused.setdefault(row, [0.0, [None] * len(ranked_lists)])
+            entry[0] += 1.0 / (k + rank)
+            entry[1][channel] = rank
+    results = sorted(((row, score, ranks) for row, (score, ranks) in fused.items()),
+                     key=lambda item: -item[1])
+    return results[:top_k] if top_k else results
+
+
+class HybridSearcher:
+    """
+    Args:
+        db: 已打开的 VectorDB（通常来自注册表，只读共享）
+        lexical: 对应的 LexicalIndex，默认载入构建时保存的倒排索引
+    """
+
+    def __init__(self, db, lexical=None):
+        self.db = db
+        self.lexical = lexical if lexical is not None else load_lexical_index(db)
+        self.rrf_k = config.get('RRF_K', 60)
+        self.depth = config.get('HYBRID_CANDIDATES', 50)
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"hybrid-{db.db_name}")
+
+    def close(self):
+        """停止两个通道的线程池（进行中的检索照常完成）"""
+        self._executor.shutdown(wait=False)
+
+    def dense_rows(self, query: str, depth: int) -> list:
+        vectors = get_embeddings([query])
+        if not vectors or not vectors[0]:
+            print(f"[{self.db.db_name}] 查询向量化失败，仅使用词法检索")
+            return []
+        _, rows = self.db.search(vectors[0], depth)
+        return [int(r) for r in rows[0] if r != -1]
+
+    def lexical_rows(self, query: str, depth: int) -> list:
+        # 倒排索引构建之后删除的实体在此过滤
+        _, rows = self.lexical.search(query, depth)
+        return [int(r) for r in rows if not self.db.metadata.is_deleted(int(r))]
+
+    def search(self, query: str, top_k: int = 20):
+        """
+        Returns:
+            [{'row', 'name', 'id', 'score', 'dense_rank', 'lexical_rank'}]，按融合得分降序
+        """
+        depth = max(self.depth, top_k)
+        dense = self._executor.submit(self.dense_rows, query, depth)
+        lexical = self._executor.submit(self.lexical_rows, query, depth)
+        fused = rrf_fuse([dense.result(), lexical.result()], k=self.rrf_k, top_k=top_k)
+        return [{
+            'row': row,
+            'name': self.db.metadata.title(row),
+            'id': self.db.metadata.entity_id(row),
+            'score': round(score, 6),
+            'dense_rank': ranks[0],
+            'lexical_rank': ranks[1],
+        } for row, score, ranks in fused]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,223 @@
+"""
+FAISS 索引工厂
+
+索引类型用 faiss.index_factory 描述串配置（RAG_CONFIG['INDEX_FACTORY']），常用取值：
+- "Flat"            精确内积检索（IndexFlatIP），默认
+- "HNSW32,Flat"     IndexHNSWFlat，M=32，无需训练，调 efSearch 平衡召回与延迟
+- "IVF256,Flat"     IndexIVFFlat，256 个倒排桶，需训练，调 nprobe
+- "IVF256,PQ64"     IndexIVFPQ，向量压缩为 64 字节，需训练，调 nprobe
+- "SQfp16" / "SQ8"  标量量化，单向量内存降为 1/2、1/4
+- "PQ256"           乘积量化，4096 维向量压缩为 256 字节（1/64），需训练
+- "TRUNC1024,Flat"  降维：取前 1024 维后重新归一化（Matryoshka 截断），无需训练
+- "PCA512,Flat"     降维：构建时用 faiss.PCAMatrix 拟合投影到 512 维再归一化，需训练
+  降维前缀可与其他类型组合（如 "PCA512,HNSW32,Flat"）；索引与检索的计算量、内存按维度比例下降，
+  用 `python -m rag.index_tools dims` 对比各维度的召回率
+压缩索引配合全精度向量文件做精确重排（见 rerank_exact）。
+向量统一做 L2 归一化后按内积检索，等价于余弦相似度。
+索引外层统一包一层 IndexIDMap2，以元数据行号作为 64 位 ID：行号从不复用，删除/更新后其余记录的 ID 不变。
+"""
+
+import re
+
+import faiss
+import numpy as np
+
+# 可通过 ParameterSpace 设置的检索参数
+SEARCH_PARAM_NAMES = ("nprobe", "efSearch")
+
+
+def create_index(dimension: int, description: str = "Flat"):
+    """按描述串创建空索引（内积度量），外层为 IndexIDMap2，向量须用 add_with_ids 写入"""
+    description = description or "Flat"
+    truncate = re.match(r"TRUNC(\d+),(.+)$", description)
+    if truncate:
+        reduced = int(truncate.group(1))
+        if reduced > dimension:
+            raise ValueError(f"截断维度 {reduced} 大于向量维度 {dimension}")
+        # 变换链：取前 reduced 维 -> L2 归一化
+        base = faiss.index_factory(reduced, truncate.group(2), faiss.METRIC_INNER_PRODUCT)
+        base = faiss.IndexPreTransform(faiss.NormalizationTransform(reduced), base)
+        base.prepend_transform(faiss.RemapDimensionsTransform(dimension, reduced, False))
+    else:
+        # PCA 投影后的向量不再是单位长度，补一步归一化，保持内积即余弦相似度
+        description = re.sub(r"^(PCA[RW]*\d+),(?!L2norm)", r"\1,L2norm,", description)
+        base = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIDMap2(base)
+
+
+def has_ids(index) -> bool:
+    """是否为带自定义 ID 的索引；旧版索引的 ID 即写入顺序（等于行号）"""
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def base_index(index):
+    """去掉 IndexIDMap 外壳后的实际索引"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_ids(index) -> np.ndarray:
+    """索引中全部向量的 ID"""
+    if has_ids(index):
+        return faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    return np.arange(index.ntotal, dtype="int64")
+
+
+def supports_remove(index) -> bool:
+    """
+    能否按 ID 原地删除：Flat / SQ / PQ 等顺序存储的索引可以（含降维变换）；
+    IVF 放在 IndexIDMap2 内删除会打乱 ID 映射、HNSW 不支持删除，这两类只能等重建时剔除
+    """
+    storage = base_index(index)
+    while isinstance(storage, faiss.IndexPreTransform):
+        storage = faiss.downcast_index(storage.index)
+    return has_ids(index) and isinstance(storage, faiss.IndexFlatCodes)
+
+
+def remove_ids(index, ids) -> int:
+    """按 ID 删除向量，返回实际删除条数；不支持删除的索引返回 0"""
+    ids = np.asarray(ids, dtype="int64")
+    if not len(ids) or not supports_remove(index):
+        return 0
+    return index.remove_ids(faiss.IDSelectorBatch(ids))
+
+
+def apply_search_params(index, params: dict):
+    """设置 nprobe / efSearch 等检索参数，对当前索引类型不适用的参数直接忽略"""
+    if not params:
+        return
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        if name not in SEARCH_PARAM_NAMES or value is None:
+            continue
+        try:
+            space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+
+
+def bitmap_selector(mask: np.ndarray):
+    """
+    布尔行号掩码 -> faiss.IDSelectorBitmap（ID 即行号）。
+    返回 (selector, bits)：selector 只引用 bits 的内存，检索结束前须保持 bits 存活
+    """
+    bits = np.packbits(mask.astype(bool), bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits)), bits
+
+
+def selector_search_params(index, selector):
+    """
+    带 IDSelector 的检索参数。按实际检索的内层索引类型构造，并沿用索引上已设置的 nprobe / efSearch
+    （传入参数对象时 faiss 不再读取索引自身的设置）
+    """
+    inner = base_index(index)
+    while isinstance(inner, faiss.IndexPreTransform):
+        inner = faiss.downcast_index(inner.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = inner.hnsw.efSearch
+    elif isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = inner.nprobe
+    else:
+        params = faiss.SearchParameters()
+    params.sel = selector
+    return params
+
+
+def apply_build_params(index, params: dict):
+    """设置构建期参数（目前只有 HNSW 的 efConstruction），须在 add 之前调用"""
+    ef_construction = (params or {}).get("efConstruction")
+    if not ef_construction:
+        return
+    hnsw_index = index
+    while hnsw_index is not None and not hasattr(hnsw_index, "hnsw"):
+        inner = getattr(hnsw_index, "index", None)
+        hnsw_index = faiss.downcast_index(inner) if inner is not None else None
+    if hnsw_index is not None:
+        hnsw_index.hnsw.efConstruction = ef_construction
+
+
+def train_index(index, vectors: np.ndarray):
+    """
+    需要训练的索引（IVF / PQ / PCA）用给定向量训练；向量数过少时给出提示。
+    样本数少于聚类中心数或 PCA 输出维度时 faiss 抛出 RuntimeError
+    """
+    if index.is_trained:
+        return
+    ivf = None
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        pass
+    if ivf is not None and len(vectors) < ivf.nlist * 39:
+        print(f"  [Warning] 训练样本 {len(vectors)} 条少于建议值 {ivf.nlist * 39}（39 x nlist），聚类质量可能下降")
+    index.train(vectors)
+
+
+def build_index(vectors: np.ndarray, dimension: int, description: str = "Flat",
+                search_params: dict = None, build_params: dict = None, ids=None):
+    """
+    从已归一化的向量矩阵构建完整索引：创建 -> 训练 -> 添加 -> 设置检索参数
+    ids 为各向量的行号，缺省为 0..n-1
+    """
+    index = create_index(dimension, description)
+    apply_build_params(index, build_params)
+    train_index(index, vectors)
+    if len(vectors):
+        ids = np.arange(len(vectors), dtype="int64") if ids is None else np.asarray(ids, dtype="int64")
+        index.add_with_ids(vectors, ids)
+    apply_search_params(index, search_params)
+    return index
+
+
+def ensure_reconstructable(index):
+    """IVF 类索引默认不支持按 ID 取回向量，需先建立 direct map"""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    if ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+
+def reconstruct_ids(index, ids) -> np.ndarray:
+    """按 ID 从索引取回向量（PQ 等压缩索引为近似值）"""
+    if len(ids) == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    ensure_reconstructable(index)
+    return np.vstack([index.reconstruct(int(i)) for i in ids])
+
+
+def rerank_exact(queries: np.ndarray, candidate_rows: np.ndarray, get_vectors, top_k: int):
+    """
+    用全精度向量对近似检索的候选精确重排
+
+    Args:
+        queries: 已归一化的查询矩阵 (Q, D)
+        candidate_rows: 近似检索得到的候选行号 (Q, K')，-1 表示空位
+        get_vectors: get_vectors(rows) -> (len(rows), D) 的全精度向量
+        top_k: 重排后保留的结果数
+
+    Returns:
+        (scores, rows)，与 index.search 的返回格式一致
+    """
+    n_queries = len(queries)
+    scores = np.full((n_queries, top_k), -np.inf, dtype="float32")
+    rows = np.full((n_queries, top_k), -1, dtype="int64")
+    for i in range(n_queries):
+        cand = candidate_rows[i][candidate_rows[i] != -1]
+        if len(cand) == 0:
+            continue
+        exact = get_vectors(cand) @ queries[i]
+        order = np.argsort(-exact)[:top_k]
+        scores[i, :len(order)] = exact[order]
+        rows[i, :len(order)] = cand[order]
+    return scores, rows
+
+
+def is_exact(index) -> bool:
+    """未降维的 Flat 索引可无损重建原始向量"""
+    return isinstance(base_index(index), faiss.IndexFlat)
@@ -0,0 +1,81 @@
+"""
+向量库预写日志（write-ahead journal）
+
+每条新向量在写入内存索引前先追加到 <db>.journal：
+- 记录格式：4 字节长度 + 4 字节 CRC32 + pickle 负载，逐条 flush，按间隔 fsync
+- 检查点（VectorDB.save）把内存状态原子落盘后清空日志
+- 进程崩溃后重新打开向量库时重放日志，恢复到最后一条完整写入的记录；
+  末尾写了一半的记录通过长度/CRC 校验识别并丢弃
+"""
+
+import os
+import pickle
+import struct
+import zlib
+
+_HEADER = struct.Struct("<II")
+
+
+class Journal:
+
+    def __init__(self, path: str, fsync_every: int = 32):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._unsynced = 0
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def append(self, record: dict):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        f = self._open()
+        f.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        f.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def replay(self):
+        """
+        按写入顺序 yield 完整记录；遇到损坏或不完整的尾部即停止，
+        并把文件截断到最后一条完整记录，保证之后追加的记录可被重放
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            valid_end = 0
+            while True:
+                header = f.read(_HEADER.size)
+                if not header:
+                    return
+                length, crc = _HEADER.unpack(header) if len(header) == _HEADER.size else (0, None)
+                payload = f.read(length)
+                if crc is None or len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                valid_end = f.tell()
+                yield pickle.loads(payload)
+        print(f"  [Journal] {os.path.basename(self.path)} 末尾存在不完整记录，已丢弃")
+        self.close()
+        with open(self.path, "r+b") as f:
+            f.truncate(valid_end)
+
+    def reset(self):
+        """检查点完成后清空日志"""
+        self.close()
+        with open(self.path, "wb") as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,196 @@
+"""
+BM25 倒排索引（词法检索通道）
+
+与向量库配套，在构建向量库时从元数据生成并保存为 <db>_bm25.npz，检索侧整体载入内存：
+- 文本取自 RAG_CONFIG['LEXICAL_FIELDS'] 中的字段（默认：专家技术关键词、标签、专利标题）
+- 分词：英文/数字按词（转小写），中文按相邻二字切分（bigram），不依赖分词词典
+- 倒排表以 CSR 数组存储（词项 -> 文档下标、词频），查询时只遍历命中词项的倒排链
+- 文档对应向量库中实体的首行行号，检索结果可与向量检索直接融合
+"""
+
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from config.config import RAG_CONFIG as config
+from .text_builder import select_lines
+from .vectordb import resolve_store_path
+
+DEFAULT_LEXICAL_FIELDS = {
+    "expert": [
+        "data.ai_fields.专家简介.综合分析.technical_keywords",
+        "data.tags",
+        "data.invent_patents.patent_list[].title",
+    ],
+    "organization": [
+        "data.title",
+        "data.tags",
+        "data.fields",
+        "data.industry",
+    ],
+    "patent": [
+        "data.title",
+        "data.tags",
+    ],
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+
+
+def tokenize(text: str) -> list:
+    """英文/数字整词，中文连续片段切为 bigram（单字片段保留单字）"""
+    tokens = []
+    for piece in _TOKEN.findall(text.lower()):
+        if piece[0] < "一" or len(piece) == 1:
+            tokens.append(piece)
+        else:
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+
+def lexical_fields(entity_type: str) -> list:
+    return config.get('LEXICAL_FIELDS', DEFAULT_LEXICAL_FIELDS).get(entity_type, [])
+
+
+def lexical_index_path(db_name: str) -> str:
+    return os.path.join(resolve_store_path(), f"{db_name}_bm25.npz")
+
+
+class LexicalIndex:
+
+    def __init__(self, terms: dict, indptr: np.ndarray, postings: np.ndarray, tfs: np.ndarray,
+                 doc_lens: np.ndarray, rows: np.ndarray):
+        """
+        Args:
+            terms: 词项 -> 词项编号
+            indptr / postings / tfs: CSR 倒排表，词项 t 的倒排链为 postings[indptr[t]:indptr[t+1]]
+            doc_lens: 各文档的词项数
+            rows: 文档下标 -> 向量库行号
+        """
+        self.terms = terms
+        self.indptr = indptr
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.rows = rows
+        self.k1 = config.get('BM25_K1', 1.2)
+        self.b = config.get('BM25_B', 0.75)
+        n_docs = len(rows)
+        df = np.diff(indptr)
+        self.idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        avg_len = float(doc_lens.mean()) if n_docs else 1.0
+        # 文档长度归一化项与查询无关，预先算好
+        self.norm = (self.k1 * (1 - self.b + self.b * doc_lens / max(avg_len, 1e-6))).astype("float32")
+        self._doc_of_row = None  # 行号 -> 文档下标，score_rows 首次调用时建立
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, docs):
+        """
+        Args:
+            docs: 可迭代的 (行号, 文本)
+        """
+        terms = {}
+        postings = []
+        rows = []
+        doc_lens = []
+        for row, text in docs:
+            counts = Counter(tokenize(text))
+            doc = len(rows)
+            for term, tf in counts.items():
+                term_id = terms.setdefault(term, len(terms))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc, tf))
+            rows.append(row)
+            doc_lens.append(sum(counts.values()))
+
+        indptr = np.zeros(len(terms) + 1, dtype="int64")
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        flat = [pair for plist in postings for pair in plist]
+        return cls(
+            terms,
+            indptr,
+            np.array([d for d, _ in flat], dtype="int32"),
+            np.array([tf for _, tf in flat], dtype="float32"),
+            np.array(doc_lens, dtype="float32"),
+            np.array(rows, dtype="int64"),
+        )
+
+    @classmethod
+    def from_db(cls, db):
+        """从向量库元数据构建：每个未删除实体（切块实体只取首行）一个文档"""
+        paths = lexical_fields(db.db_name)
+        meta = db.metadata
+        docs = ((row, "\n".join(select_lines(meta[row].get("original_data", {}), paths)))
+                for row in meta.live_rows() if not meta.is_chunk(row))
+        return cls.build(docs)
+
+    def _score_all(self, query: str) -> np.ndarray:
+        """查询对全部文档的 BM25 得分（只遍历命中词项的倒排链）"""
+        scores = np.zeros(len(self.rows), dtype="float32")
+        for t in {self.terms[t] for t in tokenize(query) if t in self.terms}:
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs = self.postings[start:end]
+            tf = self.tfs[start:end]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        return scores
+
+    def search(self, query: str, top_k: int):
+        """
+        Returns:
+            (scores, rows)：按 BM25 得分降序，最多 top_k 个，只含至少命中一个词项的文档
+        """
+        if top_k <= 0:
+            return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+        scores = self._score_all(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return scores[hits], self.rows[hits]
+
+    def score_rows(self, query: str, rows) -> np.ndarray:
+        """查询对指定向量库行的 BM25 得分，不在索引中的行记 0"""
+        if self._doc_of_row is None:
+            self._doc_of_row = {int(r): i for i, r in enumerate(self.rows)}
+        docs = np.array([self._doc_of_row.get(int(r), -1) for r in rows], dtype="int64")
+        out = np.zeros(len(docs), dtype="float32")
+        hit = docs >= 0
+        out[hit] = self._score_all(query)[docs[hit]]
+        return out
+
+    def save(self, path: str):
+        """先写临时文件再原子替换，检索进程不会读到半截文件"""
+        tmp_path = path + ".tmp.npz"
+        terms = np.array(sorted(self.terms, key=self.terms.get), dtype=str)
+        np.savez(tmp_path, terms=terms, indptr=self.indptr, postings=self.postings, tfs=self.tfs,
+                 doc_lens=self.doc_lens, rows=self.rows)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            terms = {term: i for i, term in enumerate(data["terms"].tolist())}
+            return cls(terms, data["indptr"], data["postings"], data["tfs"], data["doc_lens"], data["rows"])
+
+
+def build_lexical_index(db) -> LexicalIndex:
+    """构建并保存向量库对应的倒排索引（向量库保存之后调用）"""
+    index = LexicalIndex.from_db(db)
+    index.save(lexical_index_path(db.db_name))
+    print(f"[{db.db_name}] 倒排索引已更新：文档 {len(index)}，词项 {len(index.terms)}")
+    return index
+
+
+def load_lexical_index(db) -> LexicalIndex:
+    """载入向量库对应的倒排索引；尚未构建时从元数据现场构建（不落盘）"""
+    path = lexical_index_path(db.db_name)
+    if os.path.exists(path):
+        return LexicalIndex.load(path)
+    print(f"[{db.db_name}] 未找到倒排索引 {path}，从元数据现场构建（重新运行 build_kb.py 后会自动生成）")
+    return LexicalIndex.from_db(db)
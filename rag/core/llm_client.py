@@ -1,6 +1,9 @@
 import requests
+import random
+import threading
 import time
 from config.config import RAG_CONFIG as config
+from .embedding_cache import get_default_cache
 import sys
 import os
 
@@ -12,47 +15,182 @@ if project_root not in sys.path:
 
 # from utils.prompt_logger import get_logger  # [PROMPT_LOGGER] 取消注释以启用prompt记录
 
-def get_embedding(text: str, retry_count=3) -> list:
+MAX_CHAR_LENGTH = 12000
+
+
+class TokenBucket:
     """
-    获取文本的向量表示，带有简单的重试机制
+    令牌桶限流器：每秒补充 rate 个令牌，最多积攒 burst 个。
+    线程安全，多个构建线程共享同一个桶即可共享接口配额
     """
-    MAX_CHAR_LENGTH = 12000
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: float = 1):
+        """阻塞直到取得 n 个令牌"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# 进程内所有 embedding 请求共享的限流器，EMBEDDING_RATE_LIMIT 为 0 时不限流
+_rate_limiter = None
+if config.get('EMBEDDING_RATE_LIMIT'):
+    _rate_limiter = TokenBucket(config['EMBEDDING_RATE_LIMIT'], config.get('EMBEDDING_RATE_BURST'))
+
+
+def _backoff(attempt: int, retry_after=None):
+    """指数退避（带抖动），服务端给出 Retry-After 时优先遵循"""
+    if retry_after:
+        try:
+            time.sleep(float(retry_after))
+            return
+        except ValueError:
+            pass
+    base = config.get('EMBEDDING_BACKOFF_BASE', 1.0)
+    cap = config.get('EMBEDDING_BACKOFF_MAX', 30.0)
+    delay = min(cap, base * (2 ** attempt))
+    time.sleep(delay * (0.5 + random.random() / 2))
+
+
+def _truncate(text: str) -> str:
+    """超长文本截断，避免接口拒绝"""
     if len(text) > MAX_CHAR_LENGTH:
         print(f"  [Warning] 文本过长 ({len(text)} 字)，已截断。")
         text = text[:MAX_CHAR_LENGTH]
+    return text
+
+
+def _post_embeddings(inputs: list, retry_count=3):
+    """
+    发送一次 embedding 请求（input 为列表），按 index 对齐返回向量列表。
+    重试后仍失败返回 None，由调用方决定是否拆分重试
+    """
     headers = {
         "Authorization": f"Bearer {config['API_KEY']}",
         "Content-Type": "application/json"
     }
     payload = {
         "model": config['EMBEDDING_MODEL'],
-        "input": text
+        "input": inputs
     }
 
     # [PROMPT_LOGGER] 记录embedding调用 - 取消注释以启用
     # logger = get_logger()
-    # logger.log_embedding_call(
-    #     text=text,
-    #     model=config['EMBEDDING_MODEL'],
-    #     additional_info={
-    #         "url": config['EMBEDDING_URL'],
-    #         "text_length": len(text)
-    #     }
-    # )
-    
+    # for text in inputs:
+    #     logger.log_embedding_call(
+    #         text=text,
+    #         model=config['EMBEDDING_MODEL'],
+    #         additional_info={
+    #             "url": config['EMBEDDING_URL'],
+    #             "text_length": len(text)
+    #         }
+    #     )
+
     for i in range(retry_count):
+        if _rate_limiter:
+            _rate_limiter.acquire()
         try:
             response = requests.post(config['EMBEDDING_URL'], json=payload, headers=headers, timeout=60)
-            if response.status_code == 200: 
-                return response.json()['data'][0]['embedding']
+            if response.status_code == 200:
+                data = response.json()['data']
+                vectors = [None] * len(inputs)
+                for pos, item in enumerate(data):
+                    vectors[item.get('index', pos)] = item['embedding']
+                if any(v is None for v in vectors):
+                    print(f"Warning: API 返回条数不完整 ({len(data)}/{len(inputs)})")
+                    return None
+                return vectors
             else:
                 error_detail = response.text
-                
+
                 print(f"Warning: API returned {response.status_code}, Detail: {error_detail}")
-                time.sleep(1)
+                # 4xx 通常是批内某条输入非法，重试无意义，交给上层拆分
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    return None
+                if i < retry_count - 1:
+                    _backoff(i, response.headers.get('Retry-After'))
         except Exception as e:
             print(f"Error requesting embedding: {e}")
-            time.sleep(1)
-            
-    # 如果重试多次失败，返回None或抛出异常，这里返回空列表由上层处理
-    return []
\ No newline at end of file
+            if i < retry_count - 1:
+                _backoff(i)
+
+    return None
+
+
+def _embed_batch(inputs: list, retry_count=3) -> list:
+    """
+    批量请求失败时二分拆分，直到定位出单条失败的输入；
+    失败条目返回空列表，其余条目不受影响
+    """
+    vectors = _post_embeddings(inputs, retry_count)
+    if vectors is not None:
+        return vectors
+    if len(inputs) == 1:
+        return [[]]
+    mid = len(inputs) // 2
+    return _embed_batch(inputs[:mid], retry_count) + _embed_batch(inputs[mid:], retry_count)
+
+
+def _iter_micro_batches(texts: list, batch_size: int, max_chars: int):
+    """按条数和总字符数两个上限切分 micro-batch，yield (起始下标, 文本列表)"""
+    start = 0
+    batch = []
+    batch_chars = 0
+    for i, text in enumerate(texts):
+        if batch and (len(batch) >= batch_size or batch_chars + len(text) > max_chars):
+            yield start, batch
+            start, batch, batch_chars = i, [], 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        yield start, batch
+
+
+def get_embeddings(texts: list, batch_size: int = None, retry_count=3, use_cache=True) -> list:
+    """
+    批量获取文本向量：多条文本打包进一次请求，减少网络往返。
+    启用 embedding 缓存时先查缓存，只请求未命中的文本。
+    返回与 texts 等长的列表，单条失败的位置为空列表
+    """
+    if not texts:
+        return []
+    batch_size = batch_size or config.get('EMBEDDING_BATCH_SIZE', 32)
+    max_chars = config.get('EMBEDDING_BATCH_MAX_CHARS', 120000)
+
+    texts = [_truncate(t) for t in texts]
+    cache = get_default_cache() if use_cache else None
+    if cache:
+        results = [v or [] for v in cache.get_many(config['EMBEDDING_MODEL'], texts)]
+    else:
+        results = [[] for _ in texts]
+
+    missing = [i for i, v in enumerate(results) if not v]
+    miss_texts = [texts[i] for i in missing]
+    for start, batch in _iter_micro_batches(miss_texts, batch_size, max_chars):
+        vectors = _embed_batch(batch, retry_count)
+        if cache:
+            cache.put_many(config['EMBEDDING_MODEL'], batch, vectors)
+        for offset, vector in enumerate(vectors):
+            results[missing[start + offset]] = vector
+    return results
+
+
+def get_embedding(text: str, retry_count=3) -> list:
+    """
+    获取文本的向量表示，带有简单的重试机制
+    """
+    # 如果重试多次失败，返回空列表由上层处理
+    return get_embeddings([text], retry_count=retry_count)[0]
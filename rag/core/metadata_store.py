@@ -0,0 +1,319 @@
+"""
+向量库元数据存储
+
+元数据按列存入 SQLite（<db>_meta.sqlite）：
+- title / entity_id 两列在打开时一次性加载，用于查找表与检索结果展示
+- text / original_data（单条可达数万字）只在访问某一行时按需读取，带少量 LRU 缓存
+- source / digest 记录每行来源文件及其内容哈希（增量构建的清单），deleted 标记已删除或被新版本替换的行
+- 长文本切块后一个实体占连续多行：首行保存完整记录，其余块行的 parent 指向首行，只保存块文本
+对外表现为按行号索引的只读序列，启动时间与内存不再随语料文本总量增长。
+行号从不复用：删除只打标记，更新为“标记旧行 + 追加新行”。
+每次保存在同一事务中递增 store_info 表中的版本号（generation），库内容的变化以此为准（见 store_generation）。
+只读打开（read_only=True，检索侧）时以 URI mode=ro 连接，不建表、不补列、不迁移，不需要写权限也不与构建进程争写锁；
+表结构过旧或旧版元数据尚未迁移时直接报错，需先以读写方式打开一次（如运行 build_kb.py）。
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+def record_title(meta: dict):
+    """从 original_data 的不同可能层级获取 title"""
+    orig = meta.get("original_data", {})
+    title = orig.get("title") or orig.get("data", {}).get("title")
+    return str(title).strip() if title else None
+
+
+def record_source(meta: dict):
+    """记录的来源文件名（不含扩展名）；旧数据没有该字段时即标题"""
+    return meta.get("source") or record_title(meta)
+
+
+def record_entity_id(meta: dict):
+    """原始数据中的实体ID（如专家ID），统一转为字符串"""
+    orig = meta.get("original_data", {})
+    entity_id = orig.get("data", {}).get("id") or orig.get("id")
+    return str(entity_id) if entity_id is not None else None
+
+
+def record_data(meta: dict) -> dict:
+    """元数据行 -> 原始记录的 data 字典（任一层缺失、为 null 或非字典时为空字典）"""
+    original = meta.get("original_data") if isinstance(meta, dict) else None
+    data = original.get("data") if isinstance(original, dict) else None
+    return data if isinstance(data, dict) else {}
+
+
+def connect_readonly(path: str, timeout: float = 30):
+    """以只读方式（URI mode=ro）打开元数据库，不会创建文件，也不持有写锁"""
+    return sqlite3.connect(Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True, timeout=timeout)
+
+
+def store_generation(path: str) -> tuple:
+    """
+    已提交的库状态：(版本号, 总行数, 已删除行数)，库不存在时返回 None。
+    只读取已提交的事务，与 WAL 等附属文件的 mtime 无关；保存前的旧库没有版本号，记为 0
+    """
+    if not os.path.exists(path):
+        return None
+    conn = connect_readonly(path)
+    try:
+        n_rows, n_deleted = conn.execute("SELECT COUNT(*), COALESCE(SUM(deleted), 0) FROM records").fetchone()
+        try:
+            row = conn.execute("SELECT value FROM store_info WHERE key = 'generation'").fetchone()
+        except sqlite3.OperationalError:
+            row = None  # 旧库没有 store_info 表
+        return (int(row[0]) if row else 0), n_rows, n_deleted
+    finally:
+        conn.close()
+
+
+# 当前表结构的全部列；旧版表缺少的列在读写打开时补齐
+_RECORD_COLUMNS = ("row", "entity_id", "title", "text", "original_data", "source", "digest", "deleted", "parent")
+
+
+class MetadataStore:
+    CACHE_SIZE = 256
+
+    def __init__(self, path: str, legacy_pickle_path: str = None, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.titles = []      # 行号 -> 标题
+        self.entity_ids = []  # 行号 -> 实体ID
+        self.sources = []     # 行号 -> 来源文件名
+        self.digests = []     # 行号 -> 来源内容哈希
+        self.deleted = set()  # 已删除的行号
+        self.parents = []     # 行号 -> 所属实体首行（块行），实体首行为 None
+        self.chunked = False  # 是否存在切块的实体
+        self._pending = []    # 尚未落盘的完整记录
+        self._dirty = set()   # 已落盘、但 digest / deleted 有改动的行
+        self._truncate_to = None
+
+        exists = os.path.exists(path)
+        if read_only:
+            self._check_readonly(exists, legacy_pickle_path)
+            return
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                row INTEGER PRIMARY KEY,
+                entity_id TEXT,
+                title TEXT,
+                text TEXT,
+                original_data TEXT,
+                source TEXT,
+                digest TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                parent INTEGER
+            )
+        """)
+        # 旧版表结构补齐清单列
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(records)")}
+        for name, decl in (("source", "TEXT"), ("digest", "TEXT"), ("deleted", "INTEGER NOT NULL DEFAULT 0"),
+                           ("parent", "INTEGER")):
+            if name not in columns:
+                conn.execute(f"ALTER TABLE records ADD COLUMN {name} {decl}")
+        conn.commit()
+        if not exists and legacy_pickle_path and os.path.exists(legacy_pickle_path):
+            self._import_pickle(legacy_pickle_path)
+        self._load_columns()
+
+    def _check_readonly(self, exists: bool, legacy_pickle_path: str):
+        """只读打开：校验表结构后加载；库文件不存在时为空库（不创建文件）"""
+        if not exists:
+            if legacy_pickle_path and os.path.exists(legacy_pickle_path):
+                raise RuntimeError(f"旧版元数据 {legacy_pickle_path} 尚未迁移，只读模式无法打开；"
+                                   f"请先以读写方式打开一次（如运行 build_kb.py）")
+            return
+        columns = {r[1] for r in self._conn().execute("PRAGMA table_info(records)")}
+        missing = [name for name in _RECORD_COLUMNS if name not in columns]
+        if missing:
+            raise RuntimeError(f"元数据 {self.path} 的表结构过旧（缺少 {', '.join(missing)} 列），只读模式无法升级；"
+                               f"请先以读写方式打开一次（如运行 build_kb.py）")
+        self._load_columns()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                conn = connect_readonly(self.path)
+            else:
+                conn = sqlite3.connect(self.path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _import_pickle(self, pickle_path: str):
+        """一次性迁移旧版 <db>_meta.pkl"""
+        print(f"  [MetadataStore] 迁移旧版元数据: {pickle_path}")
+        with open(pickle_path, "rb") as f:
+            records = pickle.load(f)
+        conn = self._conn()
+        conn.executemany(
+            "INSERT INTO records (row, entity_id, title, text, original_data, source) VALUES (?, ?, ?, ?, ?, ?)",
+            [(row, record_entity_id(meta), record_title(meta), meta.get("text", ""),
+              json.dumps(meta.get("original_data", {}), ensure_ascii=False), record_title(meta))
+             for row, meta in enumerate(records)]
+        )
+        conn.commit()
+
+    def _load_columns(self):
+        rows = self._conn().execute(
+            "SELECT title, entity_id, source, digest, deleted, parent FROM records ORDER BY row"
+        ).fetchall()
+        self.titles = [r[0] for r in rows]
+        self.entity_ids = [r[1] for r in rows]
+        self.sources = [r[2] or r[0] for r in rows]
+        self.digests = [r[3] for r in rows]
+        self.deleted = {row for row, r in enumerate(rows) if r[4]}
+        self.parents = [r[5] for r in rows]
+        self.chunked = any(p is not None for p in self.parents)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+
+        stored = len(self) - len(self._pending)
+        if row >= stored:
+            return self._pending[row - stored]
+        with self._cache_lock:
+            if row in self._cache:
+                self._cache.move_to_end(row)
+                return self._cache[row]
+        hit = self._conn().execute(
+            "SELECT text, original_data FROM records WHERE row = ?", (row,)
+        ).fetchone()
+        record = {
+            "id": row,
+            "text": hit[0] if hit else "",
+            "original_data": json.loads(hit[1]) if hit and hit[1] else {}
+        }
+        with self._cache_lock:
+            self._cache[row] = record
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return record
+
+    def title(self, row: int):
+        return self.titles[row]
+
+    def entity_id(self, row: int):
+        return self.entity_ids[row]
+
+    def source(self, row: int):
+        return self.sources[row]
+
+    def digest(self, row: int):
+        return self.digests[row]
+
+    def parent(self, row: int) -> int:
+        """块行所属实体的首行；实体首行返回自身"""
+        parent = self.parents[row]
+        return row if parent is None else parent
+
+    def is_chunk(self, row: int) -> bool:
+        return self.parents[row] is not None
+
+    def chunk_rows(self, row: int) -> list:
+        """实体首行 -> 该实体的全部行（首行 + 紧随其后的块行）"""
+        rows = [row]
+        while rows[-1] + 1 < len(self) and self.parents[rows[-1] + 1] == row:
+            rows.append(rows[-1] + 1)
+        return rows
+
+    def is_deleted(self, row: int) -> bool:
+        return row in self.deleted
+
+    def live_rows(self) -> list:
+        """未删除的行号（升序）"""
+        return [row for row in range(len(self)) if row not in self.deleted]
+
+    def append(self, record: dict):
+        self._pending.append(record)
+        self.titles.append(record_title(record))
+        self.entity_ids.append(record_entity_id(record))
+        self.sources.append(record_source(record))
+        self.digests.append(record.get("digest"))
+        self.parents.append(record.get("parent"))
+        self.chunked = self.chunked or record.get("parent") is not None
+
+    def _touch(self, row: int):
+        if row < len(self) - len(self._pending):
+            self._dirty.add(row)
+
+    def mark_deleted(self, rows):
+        for row in rows:
+            self.deleted.add(row)
+            self._touch(row)
+
+    def set_digest(self, row: int, digest: str):
+        self.digests[row] = digest
+        self._touch(row)
+
+    def truncate(self, n: int):
+        """只保留前 n 行（下次 save 生效）"""
+        stored = len(self) - len(self._pending)
+        if n < stored:
+            self._truncate_to = n
+            self._pending = []
+        else:
+            self._pending = self._pending[:n - stored]
+        del self.titles[n:]
+        del self.entity_ids[n:]
+        del self.sources[n:]
+        del self.digests[n:]
+        del self.parents[n:]
+        self.chunked = any(p is not None for p in self.parents)
+        self.deleted = {row for row in self.deleted if row < n}
+        self._dirty = {row for row in self._dirty if row < n}
+        with self._cache_lock:
+            self._cache.clear()
+
+    def save(self):
+        """在一个事务中写入新增记录与已有行的哈希/删除标记改动"""
+        if self.read_only:
+            raise RuntimeError(f"元数据 {self.path} 以只读方式打开，无法保存")
+        if not self._pending and not self._dirty and self._truncate_to is None:
+            return
+        conn = self._conn()
+        stored = len(self) - len(self._pending)
+        with conn:
+            if self._truncate_to is not None:
+                conn.execute("DELETE FROM records WHERE row >= ?", (self._truncate_to,))
+            conn.executemany(
+                "UPDATE records SET digest = ?, deleted = ? WHERE row = ?",
+                [(self.digests[row], int(row in self.deleted), row) for row in sorted(self._dirty)]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (row, entity_id, title, text, original_data, source, digest, deleted, parent) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(row, self.entity_ids[row], self.titles[row], rec.get("text", ""),
+                  json.dumps(rec.get("original_data", {}), ensure_ascii=False),
+                  self.sources[row], self.digests[row], int(row in self.deleted), self.parents[row])
+                 for row, rec in enumerate(self._pending, start=stored)]
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT INTO store_info (key, value) VALUES ('generation', 1) "
+                         "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        self._pending = []
+        self._dirty = set()
+        self._truncate_to = None
@@ -0,0 +1,164 @@
+"""
+向量库构建流水线
+
+读取 -> 并发 embedding -> 单线程写入，三个阶段之间用有界队列衔接：
+- 读取线程负责磁盘 IO 与 JSON 解析，按批放入队列
+- 若干 embedding 工作线程并发请求接口（共享 llm_client 中的令牌桶限流）
+- 写入只在调用线程中进行，VectorDB 始终只被一个线程修改
+"""
+
+import queue
+import threading
+import time
+
+from .llm_client import get_embeddings
+
+_DONE = object()  # 队列结束标记
+
+
+class ProgressMeter:
+    """吞吐量与剩余时间统计，按固定间隔打印"""
+
+    def __init__(self, name: str, total: int, interval: float = 5.0):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self.last_report = self.start
+
+    def update(self, done: int = 0, failed: int = 0):
+        self.done += done
+        self.failed += failed
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        finished = self.done + self.failed
+        rate = finished / elapsed
+        if rate > 0:
+            eta = time.strftime("%H:%M:%S", time.gmtime((self.total - finished) / rate))
+        else:
+            eta = "--:--:--"
+        percent = finished / self.total * 100 if self.total else 100.0
+        print(f"  [{self.name}] {finished}/{self.total} ({percent:.1f}%) "
+              f"失败 {self.failed}，{rate:.2f} 条/秒，预计剩余 {eta}")
+
+
+class EmbeddingPipeline:
+    """
+    Args:
+        name: 日志前缀（通常为实体类型）
+        workers: 并发 embedding 线程数
+        batch_size: 每次 embedding 请求打包的条数
+        queue_size: 各阶段之间队列的最大批次数，限制内存占用
+    """
+
+    def __init__(self, name: str, workers: int = 4, batch_size: int = 32,
+                 queue_size: int = 8, report_interval: float = 5.0):
+        self.name = name
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+
+    def _embed(self, batch):
+        """一批条目的全部文本（含各条的文本块）合并为一次 embedding 调用，再按条目拆回"""
+        texts = []
+        for _, text, _ in batch:
+            texts.extend(text if isinstance(text, list) else [text])
+        try:
+            flat = get_embeddings(texts, batch_size=self.batch_size)
+        except Exception as e:
+            print(f"  [{self.name}] 批量 embedding 异常: {e}")
+            return [[] for _ in batch]
+
+        vectors = []
+        pos = 0
+        for _, text, _ in batch:
+            if not isinstance(text, list):
+                vectors.append(flat[pos])
+                pos += 1
+                continue
+            chunk_vectors = flat[pos:pos + len(text)]
+            pos += len(text)
+            vectors.append(chunk_vectors if all(chunk_vectors) else [])
+        return vectors
+
+    def run(self, items, total: int, write_fn) -> int:
+        """
+        执行流水线
+
+        Args:
+            items: 可迭代对象，产出 (key, text, payload)；在读取线程中被消费。
+                text 为文本块列表时逐块 embedding，write_fn 收到对应的向量列表（任一块失败则整条失败）
+            total: 预计条数，用于计算进度与剩余时间
+            write_fn: write_fn(key, text, payload, vector) -> bool，在调用线程中执行
+
+        Returns:
+            成功写入的条数
+        """
+        read_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+        errors = []
+
+        def reader():
+            batch = []
+            try:
+                for item in items:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        read_q.put(batch)
+                        batch = []
+                if batch:
+                    read_q.put(batch)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                for _ in range(self.workers):
+                    read_q.put(_DONE)
+
+        def embedder():
+            try:
+                while True:
+                    batch = read_q.get()
+                    if batch is _DONE:
+                        break
+                    write_q.put((batch, self._embed(batch)))
+            finally:
+                write_q.put(_DONE)
+
+        threads = [threading.Thread(target=reader, name=f"{self.name}-reader", daemon=True)]
+        threads += [threading.Thread(target=embedder, name=f"{self.name}-embed-{i}", daemon=True)
+                    for i in range(self.workers)]
+        for t in threads:
+            t.start()
+
+        meter = ProgressMeter(self.name, total, self.report_interval)
+        written = 0
+        running = self.workers
+        while running:
+            result = write_q.get()
+            if result is _DONE:
+                running -= 1
+                continue
+            batch, vectors = result
+            ok = 0
+            for (key, text, payload), vector in zip(batch, vectors):
+                if vector and write_fn(key, text, payload, vector):
+                    ok += 1
+                else:
+                    print(f"  ❌ [{self.name}] {key} 向量化失败，跳过")
+            written += ok
+            meter.update(done=ok, failed=len(batch) - ok)
+
+        for t in threads:
+            t.join()
+        meter.report()
+        if errors:
+            raise errors[0]
+        return written
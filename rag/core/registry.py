@@ -0,0 +1,112 @@
+"""
+进程内 VectorDB 注册表
+
+同一进程中按 (库名, 只读, 内存映射) 共享已打开的 VectorDB 实例，避免每个 RecommendationManager
+各自从磁盘读取一次索引与元数据：
+- acquire / release 维护引用计数；引用归零后默认保留实例，供后续项目复用
+- reload 显式重新加载（例如重建向量库之后），已持有旧实例的调用方不受影响；
+  每次 reload / clear 递增库的版本号（generation），长期持有实例的调用方据此判断是否需要重新 acquire
+- 同名库的首次加载只发生一次，并发 acquire 会等待同一次加载完成
+"""
+
+import threading
+
+from config.config import RAG_CONFIG as config
+from .vectordb import VectorDB
+
+
+class _Entry:
+    def __init__(self):
+        self.db = None
+        self.refcount = 0
+        self.lock = threading.Lock()  # 串行化该库的加载/重载
+
+
+class VectorDBRegistry:
+
+    def __init__(self, keep_idle: bool = True):
+        """
+        Args:
+            keep_idle: 引用计数归零后是否保留实例；False 时归零即释放
+        """
+        self.keep_idle = keep_idle
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}  # 库名 -> 版本号
+
+    @staticmethod
+    def _key(db_name: str, read_only: bool, mmap: bool):
+        if mmap is None:
+            mmap = config.get('INDEX_MMAP', False)
+        return db_name, bool(read_only or mmap), bool(mmap)
+
+    def acquire(self, db_name: str, read_only: bool = True, mmap: bool = None) -> VectorDB:
+        """获取共享实例（引用计数 +1），首次调用时加载"""
+        key = self._key(db_name, read_only, mmap)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refcount += 1
+        try:
+            with entry.lock:
+                if entry.db is None:
+                    entry.db = VectorDB(db_name=db_name, read_only=key[1], mmap=key[2])
+                return entry.db
+        except Exception:
+            self._decref(key)
+            raise
+
+    def release(self, db: VectorDB):
+        """归还 acquire 得到的实例（引用计数 -1）；reload 前取得的旧实例同样按库名归还"""
+        self._decref(self._key(db.db_name, db.read_only, db.mmap))
+
+    def _decref(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount = max(0, entry.refcount - 1)
+            if entry.refcount == 0 and not self.keep_idle:
+                del self._entries[key]
+
+    def reload(self, db_name: str):
+        """重新加载指定库的所有已打开实例；之后 acquire 得到新实例，引用计数保持不变"""
+        with self._lock:
+            targets = [(key, entry) for key, entry in self._entries.items() if key[0] == db_name]
+        for key, entry in targets:
+            with entry.lock:
+                print(f"[VectorDBRegistry] 重新加载 {db_name}")
+                entry.db = VectorDB(db_name=db_name, read_only=key[1], mmap=key[2])
+        with self._lock:
+            self._generations[db_name] = self._generations.get(db_name, 0) + 1
+
+    def generation(self, db_name: str) -> int:
+        """库的版本号：reload / clear 之后递增，之前取得的实例即为旧实例"""
+        with self._lock:
+            return self._generations.get(db_name, 0)
+
+    def clear(self):
+        """丢弃所有缓存实例（已持有的调用方不受影响）"""
+        with self._lock:
+            for db_name in {key[0] for key in self._entries}:
+                self._generations[db_name] = self._generations.get(db_name, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {f"{k[0]}{'[ro]' if k[1] else ''}{'[mmap]' if k[2] else ''}": e.refcount
+                    for k, e in self._entries.items()}
+
+
+registry = VectorDBRegistry(keep_idle=config.get('VECTOR_DB_KEEP_IDLE', True))
+
+
+def acquire_vector_db(db_name: str, read_only: bool = True, mmap: bool = None) -> VectorDB:
+    return registry.acquire(db_name, read_only=read_only, mmap=mmap)
+
+
+def release_vector_db(db: VectorDB):
+    registry.release(db)
+
+
+def reload_vector_db(db_name: str):
+    registry.reload(db_name)
@@ -0,0 +1,158 @@
+"""
+Embedding 文本构建
+
+不再把整份 JSON（含键名、标点、无关字段）截断后送去 embedding，而是：
+- 按 RAG_CONFIG['EMBEDDING_TEXT_FIELDS'] 中各实体类型的字段路径抽取有语义的内容，
+  路径用 "." 分隔，"[]" 表示遍历列表，如 "data.invent_patents.patent_list[].title"
+- 长文本按段落/句子切分为不超过 EMBEDDING_CHUNK_CHARS 的若干块，每块一个向量，
+  检索时按实体取各块得分的最大值（见 VectorDB.search），长画像不再丢失尾部
+"""
+
+import hashlib
+import json
+import re
+
+from config.config import RAG_CONFIG as config
+
+DEFAULT_TEXT_FIELDS = {
+    "expert": [
+        "data.title",
+        "data.summary",
+        "data.tags",
+        "data.ai_fields.专家简介.综合分析",
+        "data.invent_patents.patent_list[].title",
+    ],
+    "organization": [
+        "data.title",
+        "data.summary",
+        "data.fields",
+        "data.industry",
+        "data.tags",
+        "data.introduction",
+    ],
+    "patent": [
+        "data.title",
+        "data.summary",
+        "data.tags",
+    ],
+}
+
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;])")
+
+
+def text_fields(entity_type: str) -> list:
+    return config.get('EMBEDDING_TEXT_FIELDS', DEFAULT_TEXT_FIELDS).get(entity_type, [])
+
+
+def _select(value, segments):
+    """按路径逐段取值，"[]" 段展开列表，返回命中的值列表"""
+    values = [value]
+    for segment in segments:
+        expand = segment.endswith("[]")
+        key = segment[:-2] if expand else segment
+        selected = []
+        for v in values:
+            if key:
+                v = v.get(key) if isinstance(v, dict) else None
+            if v is None:
+                continue
+            if expand:
+                selected.extend(v if isinstance(v, list) else [v])
+            else:
+                selected.append(v)
+        values = selected
+    return values
+
+
+def _flatten(value) -> list:
+    """把取到的值展开为文本行：字符串/数字原样，列表用顿号连接，字典只取值不取键"""
+    if value is None or value == "":
+        return []
+    if isinstance(value, dict):
+        parts = [line for v in value.values() for line in _flatten(v)]
+        return ["：".join(parts)] if all(isinstance(v, (str, int, float)) for v in value.values()) else parts
+    if isinstance(value, list):
+        if all(isinstance(v, (str, int, float)) for v in value):
+            return ["、".join(str(v) for v in value if v != "")] if value else []
+        return [line for v in value for line in _flatten(v)]
+    return [str(value).strip()]
+
+
+def select_values(raw_data: dict, path: str) -> list:
+    """按字段路径取出全部标量值（列表逐项展开），用于属性过滤"""
+    values = []
+    pending = _select(raw_data, path.split("."))
+    while pending:
+        value = pending.pop(0)
+        if isinstance(value, list):
+            pending[:0] = value
+        elif isinstance(value, (str, int, float)) and str(value).strip():
+            values.append(str(value).strip())
+    return values
+
+
+def select_lines(raw_data: dict, paths: list) -> list:
+    """按字段路径列表抽取文本行"""
+    lines = []
+    for path in paths:
+        for value in _select(raw_data, path.split(".")):
+            lines.extend(line for line in _flatten(value) if line)
+    return lines
+
+
+def build_text(raw_data: dict, entity_type: str) -> str:
+    """按配置字段抽取 embedding 文本；没有配置或抽取为空时退回整份 JSON"""
+    lines = select_lines(raw_data, text_fields(entity_type))
+    if not lines:
+        return json.dumps(raw_data, ensure_ascii=False)
+    return "\n".join(lines)
+
+
+def _split_long(piece: str, max_chars: int, overlap: int) -> list:
+    """超长段落先按句切分，单句仍超长时按固定窗口切分（相邻窗口重叠 overlap 字）"""
+    if len(piece) <= max_chars:
+        return [piece]
+    parts = []
+    for sentence in _SENTENCE_END.split(piece):
+        if len(sentence) <= max_chars:
+            parts.append(sentence)
+            continue
+        step = max(1, max_chars - overlap)
+        parts.extend(sentence[i:i + max_chars] for i in range(0, len(sentence) - overlap, step))
+    return [p for p in parts if p]
+
+
+def chunk_text(text: str, max_chars: int = None, overlap: int = None, max_chunks: int = None) -> list:
+    """
+    按段落打包为不超过 max_chars 的块；块数超过 max_chunks 时丢弃其余部分
+
+    Returns:
+        文本块列表（至少一块）
+    """
+    max_chars = max_chars or config.get('EMBEDDING_CHUNK_CHARS', 2000)
+    overlap = config.get('EMBEDDING_CHUNK_OVERLAP', 100) if overlap is None else overlap
+    max_chunks = max_chunks or config.get('EMBEDDING_MAX_CHUNKS', 16)
+
+    chunks = []
+    current = ""
+    for line in text.split("\n"):
+        for piece in _split_long(line.strip(), max_chars, overlap):
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks[:max_chunks] or [text[:max_chars]]
+
+
+def build_chunks(raw_data: dict, entity_type: str) -> list:
+    return chunk_text(build_text(raw_data, entity_type))
+
+
+def builder_signature(entity_type: str) -> str:
+    """文本构建配置的指纹，计入内容哈希：调整字段或分块参数后，下次增量构建会重新 embedding"""
+    settings = [text_fields(entity_type), config.get('EMBEDDING_CHUNK_CHARS', 2000),
+                config.get('EMBEDDING_CHUNK_OVERLAP', 100), config.get('EMBEDDING_MAX_CHUNKS', 16)]
+    return hashlib.sha1(json.dumps(settings, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
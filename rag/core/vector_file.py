@@ -0,0 +1,145 @@
+"""
+全精度向量文件
+
+索引可以是 SQ8 / fp16 / PQ 等压缩格式，常驻内存；全精度 float32 向量保存在 <db>_vectors.npy 中，
+以内存映射方式打开，只在精确重排、重建索引时按需读取对应行，不占用常驻内存。
+
+保存（检查点）时只把新增行追加到文件末尾，再原地改写文件头中的行数，不重写已有数据：
+- 先写数据并 fsync，再写文件头：中途崩溃时文件头仍是旧行数，末尾多出的字节不会被读到，下次追加直接覆盖
+- 已打开的内存映射（包括其他进程的只读映射）只覆盖旧的行，不受追加影响
+- 只有 truncate 之后（回滚/清空，很少发生）或文件头放不下新的形状时，才写临时文件整体替换
+"""
+
+import io
+import os
+
+import numpy as np
+
+
+class FullVectorStore:
+    # 保存时分块拷贝的行数，避免一次性把整个文件读入内存
+    COPY_CHUNK = 4096
+
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self._mmap = None
+        self._pending = []  # 尚未落盘的新向量 (k, D)
+        self._keep = None   # truncate 后保留的已落盘行数
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            self._mmap = np.load(self.path, mmap_mode="r")
+        else:
+            self._mmap = None
+        self._pending = []
+        self._keep = None
+
+    @property
+    def exists(self) -> bool:
+        return self._mmap is not None or bool(self._pending)
+
+    def _stored(self) -> int:
+        if self._mmap is None:
+            return 0
+        return len(self._mmap) if self._keep is None else self._keep
+
+    def __len__(self):
+        return self._stored() + sum(len(p) for p in self._pending)
+
+    def append(self, vectors: np.ndarray):
+        self._pending.append(np.asarray(vectors, dtype="float32").reshape(-1, self.dimension))
+
+    def get(self, rows) -> np.ndarray:
+        """按行号取向量（行号须小于 len(self)）"""
+        rows = np.asarray(rows, dtype="int64")
+        stored = self._stored()
+        result = np.empty((len(rows), self.dimension), dtype="float32")
+        on_disk = rows < stored
+        if on_disk.any():
+            result[on_disk] = self._mmap[rows[on_disk]]
+        if (~on_disk).any():
+            pending = np.vstack(self._pending)
+            result[~on_disk] = pending[rows[~on_disk] - stored]
+        return result
+
+    def all(self) -> np.ndarray:
+        parts = []
+        if self._mmap is not None:
+            parts.append(np.asarray(self._mmap[:self._stored()]))
+        parts.extend(self._pending)
+        if not parts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        return np.vstack(parts)
+
+    def truncate(self, n: int):
+        """只保留前 n 行（下次 save 生效）"""
+        stored = self._stored()
+        if n <= stored:
+            self._pending = []
+            self._keep = n
+        else:
+            pending = np.vstack(self._pending)[:n - stored]
+            self._pending = [pending]
+
+    def save(self):
+        """把新增行追加到文件（见模块说明），truncate 过则整体重写"""
+        n_keep = self._stored()
+        if not self._pending and self._keep is None and os.path.exists(self.path):
+            return
+        pending = np.vstack(self._pending) if self._pending else np.zeros((0, self.dimension), dtype="float32")
+        if self._keep is None and self._mmap is not None and self._append(n_keep, pending):
+            self.load()
+            return
+        self._rewrite(n_keep, pending)
+        self.load()
+
+    def _header(self, rows: int, version) -> bytes:
+        buf = io.BytesIO()
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype("float32")), "fortran_order": False,
+                  "shape": (rows, self.dimension)}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(buf, header)
+        else:
+            np.lib.format.write_array_header_2_0(buf, header)
+        return buf.getvalue()
+
+    def _append(self, n_keep: int, pending: np.ndarray) -> bool:
+        """原地追加；文件格式不符合预期（Fortran 序、非 float32、文件头长度会变）时返回 False"""
+        with open(self.path, "r+b") as f:
+            version = np.lib.format.read_magic(f)
+            if version not in ((1, 0), (2, 0)):
+                return False
+            reader = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                      else np.lib.format.read_array_header_2_0)
+            shape, fortran_order, dtype = reader(f)
+            offset = f.tell()
+            if fortran_order or dtype != np.dtype("float32") or shape != (n_keep, self.dimension):
+                return False
+            header = self._header(n_keep + len(pending), version)
+            if len(header) != offset:
+                return False
+            f.seek(offset + n_keep * self.dimension * 4)
+            f.write(np.ascontiguousarray(pending).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            # 数据落盘后再提交行数
+            f.seek(0)
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    def _rewrite(self, n_keep: int, pending: np.ndarray):
+        """先写临时文件再原子替换，已打开的内存映射不受影响"""
+        total = n_keep + len(pending)
+        tmp_path = self.path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype="float32", shape=(total, self.dimension))
+        for start in range(0, n_keep, self.COPY_CHUNK):
+            end = min(start + self.COPY_CHUNK, n_keep)
+            out[start:end] = self._mmap[start:end]
+        out[n_keep:] = pending
+        out.flush()
+        del out
+        os.replace(tmp_path, self.path)
@@ -1,103 +1,620 @@
 import os
 import faiss
-import pickle
 import numpy as np
 from config.config import RAG_CONFIG as config
+from .index_factory import (create_index, apply_search_params, apply_build_params, train_index, build_index,
+                            reconstruct_ids, is_exact, rerank_exact, has_ids, index_ids, remove_ids,
+                            bitmap_selector, selector_search_params)
+from .vector_file import FullVectorStore
+from .metadata_store import MetadataStore, record_title, record_entity_id
+from .journal import Journal
+from .attribute_index import load_attribute_index
 
-class VectorDB:
-    def __init__(self, db_name: str):
-        self.db_name = db_name
-        # 解析并规范化向量库存储路径：支持相对路径（相对于项目根目录）或绝对路径
-        base_path = config.get('VECTOR_DB_PATH', 'data/vector_store')
-        if not os.path.isabs(base_path):
-            # 项目根目录：当前文件的上两级目录（rag/core -> rag -> project_root）
-            project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-            candidate = os.path.join(project_root, base_path)
-            if os.path.exists(candidate):
-                base_path = candidate
-            else:
-                # 如果 candidate 不存在，也尝试以当前工作目录解析（保持向后兼容）
-                base_path = os.path.abspath(base_path)
+def _mmap_flags():
+    """内存映射只读打开索引的 IO 标志；新版 faiss 的 IO_FLAG_MMAP_IFC 可映射 Flat 等索引的向量数据"""
+    flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+    return flags | faiss.IO_FLAG_READ_ONLY
 
-        # 确保目录存在
-        try:
-            os.makedirs(base_path, exist_ok=True)
-        except Exception:
-            pass
 
+def _prefault_file(path: str, chunk_size: int = 16 * 1024 * 1024):
+    """顺序读一遍文件，把内容载入页缓存，后续缺页只需建立映射"""
+    if not os.path.exists(path):
+        return 0
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            total += len(chunk)
+    return total
+
+
+def _fsync_file(path: str):
+    """确保文件内容落盘后再做原子替换"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def resolve_store_path() -> str:
+    """解析并规范化向量库存储路径：支持相对路径（相对于项目根目录）或绝对路径"""
+    base_path = config.get('VECTOR_DB_PATH', 'data/vector_store')
+    if not os.path.isabs(base_path):
+        # 项目根目录：当前文件的上两级目录（rag/core -> rag -> project_root）
+        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+        candidate = os.path.join(project_root, base_path)
+        if os.path.exists(candidate):
+            base_path = candidate
+        else:
+            # 如果 candidate 不存在，也尝试以当前工作目录解析（保持向后兼容）
+            base_path = os.path.abspath(base_path)
+
+    # 确保目录存在
+    try:
+        os.makedirs(base_path, exist_ok=True)
+    except Exception:
+        pass
+    return base_path
+
+
+class VectorDB:
+    def __init__(self, db_name: str, read_only: bool = False, mmap: bool = None, warmup: bool = None):
+        """
+        Args:
+            db_name: 向量库名称（expert / organization / patent）
+            read_only: 只读打开，add_item / save 不可用；检索侧应以只读方式打开
+            mmap: 以内存映射方式加载索引（隐含只读），多进程共享同一份页缓存；默认取 RAG_CONFIG['INDEX_MMAP']
+            warmup: 加载后预读索引与向量文件，消除首次查询的缺页延迟；默认取 RAG_CONFIG['INDEX_WARMUP']
+        """
+        self.db_name = db_name
+        self.mmap = config.get('INDEX_MMAP', False) if mmap is None else mmap
+        self.read_only = read_only or self.mmap
+        base_path = resolve_store_path()
         self.index_path = os.path.join(base_path, f"{db_name}.index")
-        self.metadata_path = os.path.join(base_path, f"{db_name}_meta.pkl")
+        self.metadata_path = os.path.join(base_path, f"{db_name}_meta.sqlite")
+        # 旧版整表 pickle 元数据，首次打开时自动迁移到 SQLite
+        self.legacy_metadata_path = os.path.join(base_path, f"{db_name}_meta.pkl")
+        self.vectors_path = os.path.join(base_path, f"{db_name}_vectors.npy")
+        self.journal_path = os.path.join(base_path, f"{db_name}.journal")
         self.dimension = config['EMBEDDING_DIMENSION']
+        self.index_factory = config.get('INDEX_FACTORY', 'Flat')
+        self.search_params = config.get('INDEX_SEARCH_PARAMS', {})
         self.index = None
-        self.metadata = []
+        self.metadata = None
+        # 需要训练的索引（IVF/PQ）在训练前暂存的 (行号, 向量)，save() 时统一训练并写入
+        self._untrained = []
+        # 全精度向量（磁盘内存映射），用于压缩索引的精确重排与重建索引
+        self.full_vectors = None
+        self.rerank_factor = config.get('RERANK_FACTOR', 4) if config.get('RERANK_EXACT', True) else 1
+        # 查找表：标题 -> 行号、实体ID -> 行号（同名保留最先入库的一条）、来源文件 -> 行号，
+        # 由元数据的标题/ID/来源列构建，已删除的行不计入
+        self.title_to_row = {}
+        self.id_to_row = {}
+        self.source_to_row = {}
+        # 预写日志：上次检查点之后新增的记录，崩溃后据此恢复
+        self.journal = None
+        # 属性过滤索引，首次带过滤条件检索时加载
+        self._attributes = None
         
         self._load_or_create()
+        if not self.read_only:
+            self._recover()
+        if config.get('INDEX_WARMUP', False) if warmup is None else warmup:
+            self.warmup()
 
     def _load_or_create(self):
         """加载已有索引或创建新索引"""
-        if os.path.exists(self.index_path) and os.path.exists(self.metadata_path):
-            print(f"[{self.db_name}] 加载已有索引...")
-            self.index = faiss.read_index(self.index_path)
-            with open(self.metadata_path, "rb") as f:
-                self.metadata = pickle.load(f)
+        has_metadata = os.path.exists(self.metadata_path) or os.path.exists(self.legacy_metadata_path)
+        if os.path.exists(self.index_path) and has_metadata:
+            print(f"[{self.db_name}] 加载已有索引{'（内存映射）' if self.mmap else ''}...")
+            if self.mmap:
+                self.index = faiss.read_index(self.index_path, _mmap_flags())
+            else:
+                self.index = faiss.read_index(self.index_path)
+            apply_search_params(self.index, self.search_params)
+            self.metadata = MetadataStore(self.metadata_path, self.legacy_metadata_path, read_only=self.read_only)
+            self.rebuild_lookup()
+            self._load_full_vectors()
+            if not self.read_only and not has_ids(self.index):
+                # 旧版索引按写入顺序编号，改为以行号为 ID 的 IndexIDMap2 后才能按行删除/更新
+                print(f"[{self.db_name}] 旧版索引迁移为带行号 ID 的索引...")
+                self.rebuild_index()
         else:
-            print(f"[{self.db_name}] 创建新索引...")
-            self.index = faiss.IndexFlatIP(self.dimension)
-            self.metadata = []
+            print(f"[{self.db_name}] 创建新索引 ({self.index_factory})...")
+            self.index = create_index(self.dimension, self.index_factory)
+            apply_build_params(self.index, config.get('INDEX_BUILD_PARAMS', {}))
+            apply_search_params(self.index, self.search_params)
+            # 残留的元数据/向量文件与新索引不对应，保存时一并清空
+            self.metadata = MetadataStore(self.metadata_path, read_only=self.read_only)
+            self.metadata.truncate(0)
+            if config.get('STORE_FULL_VECTORS', True):
+                self.full_vectors = FullVectorStore(self.vectors_path, self.dimension)
+                self.full_vectors.truncate(0)
+
+    def _load_full_vectors(self):
+        """加载全精度向量文件；旧库没有该文件时，若索引为 Flat 则从索引导出一份"""
+        if not config.get('STORE_FULL_VECTORS', True):
+            return
+        store = FullVectorStore(self.vectors_path, self.dimension)
+        if not store.exists and self.index.ntotal > 0:
+            if self.read_only:
+                return
+            if not is_exact(self.index):
+                print(f"[{self.db_name}] 缺少全精度向量文件，压缩索引将不做精确重排")
+                return
+            print(f"[{self.db_name}] 从 Flat 索引导出全精度向量...")
+            vectors = np.zeros((len(self.metadata), self.dimension), dtype="float32")
+            ids = index_ids(self.index)
+            ids = ids[ids < len(vectors)]
+            vectors[ids] = reconstruct_ids(self.index, ids)
+            store.append(vectors)
+            store.save()
+        if len(store) > len(self.metadata) and not self.read_only:
+            # 上次保存在写入元数据前中断：元数据是提交点，多出的行丢弃
+            store.truncate(len(self.metadata))
+        if len(store) != len(self.metadata):
+            print(f"[{self.db_name}] 全精度向量条数 ({len(store)}) 与元数据 ({len(self.metadata)}) 不一致，已停用")
+            return
+        self.full_vectors = store
+
+    def _recover(self):
+        """以元数据为提交点对齐索引，再重放预写日志中检查点之后的记录"""
+        n = len(self.metadata)
+        if not self.index.is_trained and self.full_vectors is not None and self.live_count():
+            # 上次保存时样本不足、索引尚未训练：从全精度向量恢复暂存区
+            rows = self.metadata.live_rows()
+            self._untrained = [(row, vector[None]) for row, vector in zip(rows, self.full_vectors.get(rows))]
+        ids = index_ids(self.index)
+        if len(ids) and ids.max() >= n:
+            print(f"[{self.db_name}] 索引中有行号 ≥ 元数据条数 ({n}) 的向量，回退到上次检查点")
+            self.truncate(n)
+        if not config.get('JOURNAL_ENABLED', True):
+            return
+        self.journal = Journal(self.journal_path, config.get('JOURNAL_FSYNC_EVERY', 32))
+        replayed = 0
+        for entry in self.journal.replay():
+            if entry["op"] == "truncate":
+                self.truncate(entry["n"], journal=False)
+                continue
+            if entry["op"] == "delete":
+                self.remove_rows(entry["rows"], journal=False)
+                continue
+            # 检查点已包含的记录跳过；出现断档说明日志与库不匹配，停止重放
+            if entry["row"] < len(self.metadata):
+                continue
+            if entry["row"] > len(self.metadata):
+                print(f"[{self.db_name}] 日志记录行号 {entry['row']} 与库 ({len(self.metadata)}) 不连续，停止重放")
+                break
+            self._append(entry["text"], entry["vector"], entry["original_data"],
+                         entry.get("source"), entry.get("digest"), entry.get("parent"), journal=False)
+            replayed += 1
+        if replayed:
+            print(f"[{self.db_name}] 从预写日志恢复 {replayed} 条记录，当前数据量: {len(self.metadata)}")
+
+    def warmup(self):
+        """预读索引与全精度向量文件并执行一次检索，使后续查询不再触发磁盘读"""
+        loaded = _prefault_file(self.index_path)
+        if self.full_vectors is not None:
+            loaded += _prefault_file(self.vectors_path)
+        if self.index.ntotal > 0:
+            self.index.search(np.zeros((1, self.index.d), dtype="float32"), 1)
+        print(f"[{self.db_name}] 预热完成，预读 {loaded / 1024 ** 2:.1f} MB")
+
+    def add_item(self, text: str, vector: list, original_data: dict = None, source: str = None, digest: str = None):
+        """
+        添加单条数据
 
-    def add_item(self, text: str, vector: list, original_data: dict = None):
-        """添加单条数据"""
+        Args:
+            source: 来源文件名；库中已有同来源的记录时，新记录替换旧记录（旧行标记删除）
+            digest: 来源文件内容哈希，供增量构建判断文件是否变更
+        """
         if not vector:
             return False
+        if self.read_only:
+            print(f"[{self.db_name}] 只读模式，无法写入")
+            return False
             
         vector_np = np.array(vector, dtype="float32").reshape(1, -1)
         faiss.normalize_L2(vector_np)
-        
-        self.index.add(vector_np)
+        self._append(text, vector_np, original_data or {}, source, digest)
+        return True
+
+    def add_chunks(self, texts: list, vectors: list, original_data: dict = None,
+                   source: str = None, digest: str = None):
+        """
+        添加一个切块的实体（每块一个向量，占连续多行）：首块行保存完整记录，
+        其余块行只保存块文本并指向首行；检索时按实体取各块得分的最大值
+        """
+        if not texts or len(texts) != len(vectors) or not all(vectors):
+            return False
+        if self.read_only:
+            print(f"[{self.db_name}] 只读模式，无法写入")
+            return False
+
+        matrix = np.array(vectors, dtype="float32").reshape(len(texts), -1)
+        faiss.normalize_L2(matrix)
+        first = len(self.metadata)
+        for i, text in enumerate(texts):
+            self._append(text, matrix[i:i + 1], (original_data or {}) if i == 0 else {},
+                         source, digest, parent=None if i == 0 else first)
+        return True
+
+    def _append(self, text: str, vector_np: np.ndarray, original_data: dict,
+                source: str = None, digest: str = None, parent: int = None, journal: bool = True):
+        """写入一条已归一化的向量；先追加预写日志，再修改内存中的索引与元数据"""
+        row = len(self.metadata)
+        if journal and self.journal is not None:
+            self.journal.append({"op": "add", "row": row, "text": text, "original_data": original_data,
+                                 "vector": vector_np, "source": source, "digest": digest, "parent": parent})
+        replaced = self.source_to_row.get(source, -1) if source and parent is None else -1
+        if replaced != -1:
+            self.remove_rows([replaced], journal=False)
+        if self.index.is_trained:
+            self.index.add_with_ids(vector_np, np.array([row], dtype="int64"))
+        else:
+            self._untrained.append((row, vector_np))
+        if self.full_vectors is not None:
+            self.full_vectors.append(vector_np)
         
         record = {
-            "id": len(self.metadata),
+            "id": row,
             "text": text,
-            "original_data": original_data or {}
+            "original_data": original_data,
+            "source": source,
+            "digest": digest,
+            "parent": parent
         }
         self.metadata.append(record)
+        self._index_row(row)
+
+    def remove_rows(self, rows, journal: bool = True) -> int:
+        """
+        删除若干行（实体首行连同其块行）：元数据打删除标记；Flat/SQ/PQ 索引同步按 ID 删除向量，
+        IVF/HNSW 中的残留向量在检索时过滤，重建索引时剔除。返回删除行数
+        """
+        if self.read_only:
+            print(f"[{self.db_name}] 只读模式，无法删除")
+            return 0
+        rows = {c for r in rows if 0 <= r < len(self.metadata) for c in self.metadata.chunk_rows(int(r))}
+        rows = sorted(r for r in rows if not self.metadata.is_deleted(r))
+        if not rows:
+            return 0
+        if journal and self.journal is not None:
+            self.journal.append({"op": "delete", "rows": rows})
+        self.metadata.mark_deleted(rows)
+        removed = set(rows)
+        self._untrained = [(r, v) for r, v in self._untrained if r not in removed]
+        remove_ids(self.index, rows)
+        for row in rows:
+            self._unindex_row(row)
+        return len(rows)
+
+    def set_digest(self, row: int, digest: str):
+        """补记来源内容哈希（只在向量确实由当前文本构建时使用；旧库无哈希的记录由 build_kb 重新 embedding）"""
+        self.metadata.set_digest(row, digest)
+
+    def manifest(self) -> dict:
+        """增量构建清单：来源文件名 -> (行号, 内容哈希)，只含未删除的记录"""
+        return {source: (row, self.metadata.digest(row)) for source, row in self.source_to_row.items()}
+
+    def live_count(self) -> int:
+        return len(self.metadata) - len(self.metadata.deleted)
+
+    def stale_count(self) -> int:
+        """索引中残留的已删除向量数（不支持原地删除的索引类型）"""
+        return max(0, self.index.ntotal + len(self._untrained) - self.live_count())
+
+    record_title = staticmethod(record_title)
+    record_entity_id = staticmethod(record_entity_id)
+
+    def _lookup_keys(self, row: int):
+        return ((self.title_to_row, self.metadata.title(row)),
+                (self.id_to_row, self.metadata.entity_id(row)),
+                (self.source_to_row, self.metadata.source(row)))
+
+    def _index_row(self, row: int):
+        # 块行不进入查找表，标题/ID/来源都指向实体首行
+        if self.metadata.is_deleted(row) or self.metadata.is_chunk(row):
+            return
+        for lookup, key in self._lookup_keys(row):
+            if key:
+                lookup.setdefault(key, row)
+
+    def _unindex_row(self, row: int):
+        for lookup, key in self._lookup_keys(row):
+            if key and lookup.get(key) == row:
+                del lookup[key]
+
+    def rebuild_lookup(self):
+        self.title_to_row = {}
+        self.id_to_row = {}
+        self.source_to_row = {}
+        for row in range(len(self.metadata)):
+            self._index_row(row)
+
+    def has_title(self, title: str) -> bool:
+        return str(title).strip() in self.title_to_row
+
+    def get_row_by_title(self, title: str) -> int:
+        """标题 -> 行号，不存在返回 -1"""
+        return self.title_to_row.get(str(title).strip(), -1)
+
+    def get_row_by_id(self, entity_id) -> int:
+        """实体ID -> 行号，不存在返回 -1"""
+        return self.id_to_row.get(str(entity_id), -1)
+
+    def _flush_untrained(self):
+        """用暂存向量训练索引并写入；样本不足以训练时继续暂存，返回是否已写入"""
+        if not self._untrained:
+            return True
+        rows = np.array([r for r, _ in self._untrained], dtype="int64")
+        vectors = np.vstack([v for _, v in self._untrained])
+        print(f"[{self.db_name}] 使用 {len(vectors)} 条向量训练索引...")
+        try:
+            train_index(self.index, vectors)
+        except RuntimeError as e:
+            print(f"[{self.db_name}] 训练样本不足，向量继续暂存（已随全精度向量文件保存）: {e}")
+            return False
+        self.index.add_with_ids(vectors, rows)
+        self._untrained = []
         return True
 
-    def save(self):
-        """持久化到磁盘"""
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = load_attribute_index(self)
+        return self._attributes
+
+    def filter_mask(self, expr) -> np.ndarray:
+        """
+        过滤表达式 -> 行号布尔掩码（长度为元数据行数，已删除的行恒为 False）。
+        表达式写法见 attribute_index 模块说明；也可直接传入布尔掩码
+        """
+        n_rows = len(self.metadata)
+        if isinstance(expr, np.ndarray):
+            mask = np.zeros(n_rows, dtype=bool)
+            mask[:min(n_rows, len(expr))] = expr[:n_rows]
+        else:
+            mask = np.ones(n_rows, dtype=bool)
+            for name, values in expr.items():
+                if isinstance(values, (str, int)):
+                    values = [values]
+                allowed = np.zeros(n_rows, dtype=bool)
+                if name in ("title", "rows"):
+                    lookup = (self.get_row_by_title if name == "title" else int)
+                    for row in (lookup(v) for v in values):
+                        if 0 <= row < n_rows:
+                            allowed[self.metadata.chunk_rows(row) if self.metadata.chunked else row] = True
+                else:
+                    for value in values:
+                        allowed |= self.attributes.bitmap(name, str(value), n_rows)
+                mask &= allowed
+        if self.metadata.deleted:
+            mask[list(self.metadata.deleted)] = False
+        return mask
+
+    def search(self, query_vectors, top_k: int, filters=None):
+        """
+        向量检索
+
+        Args:
+            query_vectors: 单条向量（列表/一维数组）或查询矩阵
+            top_k: 每条查询返回的结果数
+            filters: 过滤表达式（见 filter_mask），只在满足条件的行中检索
+
+        Returns:
+            (scores, rows)：形状均为 (查询数, top_k)，无结果的位置行号为 -1；
+            切块的实体只返回其首行，得分为各块得分的最大值
+        """
+        query_np = np.array(query_vectors, dtype="float32")
+        if query_np.ndim == 1:
+            query_np = query_np.reshape(1, -1)
+        faiss.normalize_L2(query_np)
+        mask = self.filter_mask(filters) if filters is not None else None
+
+        if not self.metadata.chunked:
+            return self._search_rows(query_np, top_k, mask)
+        # 同一实体的多个块可能同时命中，多取若干倍候选后按实体合并
+        scores, rows = self._search_rows(query_np, top_k * config.get('CHUNK_SEARCH_FACTOR', 4), mask)
+        return self._pool_chunks(scores, rows, top_k)
+
+    def _pool_chunks(self, scores: np.ndarray, rows: np.ndarray, top_k: int):
+        """块行映射到实体首行，按实体取最大得分（结果已按得分降序，首次出现即最大值）"""
+        out_scores = np.full((len(rows), top_k), -np.inf, dtype="float32")
+        out_rows = np.full((len(rows), top_k), -1, dtype="int64")
+        for i in range(len(rows)):
+            best = {}
+            for score, row in zip(scores[i], rows[i]):
+                if row == -1:
+                    continue
+                parent = self.metadata.parent(int(row))
+                if parent not in best:
+                    best[parent] = score
+                    if len(best) == top_k:
+                        break
+            out_rows[i, :len(best)] = list(best.keys())
+            out_scores[i, :len(best)] = list(best.values())
+        return out_scores, out_rows
+
+    def _search_rows(self, query_np: np.ndarray, top_k: int, mask: np.ndarray = None):
+        """按行检索（不合并块），query_np 须已归一化"""
+        if mask is not None:
+            return self._search_masked(query_np, top_k, mask)
+        # 索引中残留已删除向量时多取相应条数，过滤后仍能凑满 top_k
+        stale = self.stale_count()
+        # 压缩/近似索引：多取若干倍候选，再用磁盘上的全精度向量精确重排
+        if self.full_vectors is not None and self.rerank_factor > 1 and not is_exact(self.index):
+            _, rows = self.index.search(query_np, top_k * self.rerank_factor + stale)
+            if stale:
+                rows = np.where(self._deleted_mask(rows), -1, rows)
+            return rerank_exact(query_np, rows, self.full_vectors.get, top_k)
+        scores, rows = self.index.search(query_np, top_k + stale)
+        if stale:
+            return self._drop_deleted(scores, rows, top_k)
+        return scores, rows
+
+    def _search_masked(self, query_np: np.ndarray, top_k: int, mask: np.ndarray):
+        """
+        只在掩码为 True 的行中检索，按掩码的选择率（合格行占有效行的比例）选择路径：
+        - 选择率低且合格行不多：直接对这些行精确打分
+        - 选择率高（如默认的"有画像文件"过滤几乎选中全部专家）：照常检索并按比例多取，再按掩码筛掉；
+          个别查询筛后不足 top_k 时再对这些查询走下一条路径
+        - 其余：用位图 IDSelector 让索引在遍历时跳过其余行（已删除行不在掩码中，无需多取）
+        """
+        rows = np.flatnonzero(mask)
+        n_queries = len(query_np)
+        selectivity = len(rows) / max(1, self.live_count())
+        if len(rows) <= config.get('FILTER_EXACT_MAX', 20000) and selectivity <= config.get('FILTER_EXACT_RATIO', 0.1):
+            scores = np.full((n_queries, top_k), -np.inf, dtype="float32")
+            found = np.full((n_queries, top_k), -1, dtype="int64")
+            if len(rows) == 0:
+                return scores, found
+            sims = query_np @ self.get_vectors(rows).T
+            k = min(top_k, len(rows))
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+            scores[:, :k] = np.take_along_axis(sims, top, axis=1)
+            found[:, :k] = rows[top]
+            return scores, found
+
+        if len(rows) and selectivity >= config.get('FILTER_POSTFILTER_RATIO', 0.5):
+            fetch = min(len(mask), int(np.ceil(top_k / selectivity * 2)))
+            scores, found = self._search_rows(query_np, fetch)
+            keep = (found != -1) & (found < len(mask))
+            keep[keep] = mask[found[keep]]
+            out_scores = np.full((n_queries, top_k), -np.inf, dtype="float32")
+            out_rows = np.full((n_queries, top_k), -1, dtype="int64")
+            short = []
+            for i in range(n_queries):
+                hits = np.flatnonzero(keep[i])[:top_k]
+                out_scores[i, :len(hits)] = scores[i, hits]
+                out_rows[i, :len(hits)] = found[i, hits]
+                if len(hits) < min(top_k, len(rows)):
+                    short.append(i)
+            if short:
+                out_scores[short], out_rows[short] = self._search_selector(query_np[short], top_k, mask)
+            return out_scores, out_rows
+        return self._search_selector(query_np, top_k, mask)
+
+    def _search_selector(self, query_np: np.ndarray, top_k: int, mask: np.ndarray):
+        """位图 IDSelector 过滤检索"""
+        self._flush_untrained()
+        selector, bits = bitmap_selector(mask)
+        params = selector_search_params(self.index, selector)
+        if self.full_vectors is not None and self.rerank_factor > 1 and not is_exact(self.index):
+            _, found = self.index.search(query_np, top_k * self.rerank_factor, params=params)
+            return rerank_exact(query_np, found, self.full_vectors.get, top_k)
+        return self.index.search(query_np, top_k, params=params)
+
+    def _deleted_mask(self, rows: np.ndarray) -> np.ndarray:
+        deleted = self.metadata.deleted
+        return np.vectorize(lambda r: r in deleted, otypes=[bool])(rows)
+
+    def _drop_deleted(self, scores: np.ndarray, rows: np.ndarray, top_k: int):
+        """去掉结果中的已删除行，每条查询保留前 top_k 个"""
+        keep = (rows != -1) & ~self._deleted_mask(rows)
+        out_scores = np.full((len(rows), top_k), -np.inf, dtype="float32")
+        out_rows = np.full((len(rows), top_k), -1, dtype="int64")
+        for i in range(len(rows)):
+            hits = np.flatnonzero(keep[i])[:top_k]
+            out_scores[i, :len(hits)] = scores[i, hits]
+            out_rows[i, :len(hits)] = rows[i, hits]
+        return out_scores, out_rows
+
+    def all_vectors(self) -> np.ndarray:
+        """
+        取出库中全部（已归一化）向量，行号与元数据一致；优先使用全精度向量文件。
+        没有全精度向量文件时从索引重建，已删除的行为零向量
+        """
+        if self.full_vectors is not None:
+            return self.full_vectors.all()
+        vectors = np.zeros((len(self.metadata), self.dimension), dtype="float32")
+        rows = self.metadata.live_rows()
+        vectors[rows] = self.get_vectors(rows)
+        return vectors
+
+    def get_vectors(self, rows) -> np.ndarray:
+        """按行号取向量"""
+        if self.full_vectors is not None:
+            return self.full_vectors.get(rows)
+        self._flush_untrained()
+        return reconstruct_ids(self.index, rows)
+
+    def _rebuild(self, index_factory: str, limit: int = None):
+        """用未删除（且行号小于 limit）的记录重建索引，顺带剔除残留的已删除向量"""
+        rows = np.array([r for r in self.metadata.live_rows() if limit is None or r < limit], dtype="int64")
+        vectors = self.get_vectors(rows) if len(rows) else np.zeros((0, self.dimension), dtype="float32")
+        self.index = build_index(vectors, self.dimension, index_factory,
+                                 self.search_params, config.get('INDEX_BUILD_PARAMS', {}), ids=rows)
+        self._untrained = []
+        return len(rows)
+
+    def truncate(self, n: int, journal: bool = True):
+        """只保留前 n 条记录（索引按当前类型重建）"""
+        if journal and self.journal is not None:
+            self.journal.append({"op": "truncate", "n": n})
+        self._rebuild(self.index_factory, limit=n)
+        self.metadata.truncate(n)
+        if self.full_vectors is not None:
+            self.full_vectors.truncate(n)
+        self.rebuild_lookup()
+
+    def rebuild_index(self, index_factory: str = None):
+        """
+        按新的索引类型重建索引（例如 Flat -> HNSW / IVF），训练数据取自当前索引中的向量。
+        有全精度向量文件时训练数据无损；否则从 PQ 等有损索引重建时，向量已是近似值
+        """
+        index_factory = index_factory or self.index_factory
+        print(f"[{self.db_name}] 重建索引: {index_factory}，向量数 {self.live_count()}")
+        self._rebuild(index_factory)
+        self.index_factory = index_factory
+
+    def save(self) -> bool:
+        """
+        持久化到磁盘（检查点），返回是否成功。
+        每个文件先写临时文件再原子替换，写入顺序为 全精度向量 -> 索引 -> 元数据：
+        元数据最后提交，中途崩溃时多写的向量/索引行在下次打开时按元数据条数回退，
+        之后的记录由预写日志补回；全部写完才清空日志
+        """
+        if self.read_only:
+            print(f"[{self.db_name}] 只读模式，跳过保存")
+            return False
         try:
-            faiss.write_index(self.index, self.index_path)
-            with open(self.metadata_path, "wb") as f:
-                pickle.dump(self.metadata, f)
+            self._flush_untrained()
+            if self.full_vectors is not None:
+                self.full_vectors.save()
+            # 其他进程正以内存映射方式使用旧文件时不会读到半截数据
+            tmp_path = self.index_path + ".tmp"
+            faiss.write_index(self.index, tmp_path)
+            _fsync_file(tmp_path)
+            os.replace(tmp_path, self.index_path)
+            self.metadata.save()
+            if self.journal is not None:
+                self.journal.reset()
             print(f"[{self.db_name}] 保存成功，当前数据量: {len(self.metadata)}")
+            return True
         except Exception as e:
             print(f"[{self.db_name}] 保存失败: {e}")
+            return False
 
     def get_vector_by_name(self, name: str):
         """
         根据专家姓名获取其 embedding 向量
         改进：严格匹配元数据中的 title 字段，避免被 text 中的公共专利内容误导
+        通过标题查找表定位，不再逐条扫描元数据
         """
-        found_idx = -1
-        found_text = ""
-        
-        for i, meta in enumerate(self.metadata):
-            orig = meta.get("original_data", {})
-            # 从 original_data 的不同可能层级获取 title
-            actual_title = orig.get("title") or orig.get("data", {}).get("title")
-            
-            # 使用严格相等比对
-            if actual_title and str(actual_title).strip() == name.strip():
-                found_idx = i
-                found_text = meta.get("text", "")
-                break
+        found_idx = self.get_row_by_title(name)
+        found_text = self.metadata[found_idx].get("text", "") if found_idx != -1 else ""
         
         if found_idx == -1:
             print(f"未找到名为 '{name}' 的严格匹配记录。")
             return None, None
 
         try:
-            vector = self.index.reconstruct(found_idx)
+            vector = self.get_vectors([found_idx])[0]
             return vector, found_text
         except Exception as e:
             print(f"无法重建向量: {e}")
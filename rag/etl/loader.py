@@ -1,92 +1,155 @@
-<<<<<<< Updated upstream
+"""
+实体 JSON 文件的流式并行加载
+
+向量库构建（rag/build_kb.py）与知识图谱构建（knowledge_graph/kg_build）共用：
+- 文件按批分发到进程池解析，多核同时工作；安装了 orjson 时用它解析，否则退回标准库 json
+- 同时在途的批次数有上限（workers * 2），内存占用与文件总数无关
+- 按文件名顺序产出规范化的 (id, text, record)：id 为去掉 .json 的文件名，
+  record 为解析后的字典（非 JSON 内容记为 {"raw_content": 原文}），
+  text 由调用方传入的 text_fn(record, entity_type) 生成（如 embedding 文本块），不需要时为 None
+- record_fn(record, entity_type) 在工作进程中把记录裁剪为调用方需要的字段（如图谱构建只取 ID、名称、组织、专利），
+  只回传紧凑记录，减少进程间传输
+- 传入 cache_path（见 parsed_cache.py）时，未变化的文件直接从已解析语料缓存读取，向量库与图谱构建共用
+"""
+
 import os
-import json
-import glob
-from config import config
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .parsed_cache import file_stat, shared_cache
+
+try:
+    import orjson
+
+    def _loads(content: bytes):
+        return orjson.loads(content)
+except ImportError:
+    import json
+
+    def _loads(content: bytes):
+        return json.loads(content)
+
+_BOM = b"\xef\xbb\xbf"
+
+
+def source_id(file_name: str) -> str:
+    """文件名 -> 实体 id（即入库标题）"""
+    return os.path.basename(file_name).replace(".json", "").strip()
+
+
+def list_files(folder_path: str) -> list:
+    """文件夹下全部 .json 文件名（排序，保证产出顺序稳定）"""
+    if not os.path.isdir(folder_path):
+        return []
+    return sorted(f for f in os.listdir(folder_path) if f.endswith(".json"))
+
+
+def read_record(file_path: str):
+    """读取并解析单个文件为字典；空文件返回 None"""
+    with open(file_path, "rb") as f:
+        content = f.read().strip()
+    if content.startswith(_BOM):
+        content = content[len(_BOM):]
+    if not content:
+        return None
+    try:
+        record = _loads(content)
+    except ValueError:
+        # 不是标准 JSON，视作纯文本
+        record = {"raw_content": content.decode("utf-8", errors="replace")}
+    return record
+
 
-def load_json_files(entity_type: str):
+def parse_file(file_path: str, text_fn=None, entity_type: str = None):
     """
-    生成器：遍历指定实体类型的文件夹，yield处理后的文本和原始数据
+    解析单个文件
+
+    Returns:
+        (id, text, record)；空文件返回 None
     """
-    # 拼接外部数据路径: processed_downloaded_pages_json/expert
-    folder_path = os.path.join(config.RAW_DATA_ROOT, entity_type)
-    
-    if not os.path.exists(folder_path):
-        print(f"Error: 文件夹不存在 - {folder_path}")
-        return
+    record = read_record(file_path)
+    if record is None:
+        return None
+    text = text_fn(record, entity_type) if text_fn else None
+    return source_id(file_path), text, record
 
-    file_pattern = os.path.join(folder_path, "*.json") # 假设是json后缀，如果是txt但内容是json也行
-    files = glob.glob(file_pattern)
-    
-    print(f"Found {len(files)} files in {folder_path}")
 
-    for file_path in files:
+def _parse_batch(folder_path: str, file_names: list, text_fn, entity_type: str,
+                 record_fn=None, cache_path: str = None) -> list:
+    """进程池任务：解析一批文件，单个文件失败只跳过该文件"""
+    stats = {}
+    for file_name in file_names:
+        file_path = os.path.join(os.path.abspath(folder_path), file_name)
+        try:
+            stats[file_path] = file_stat(file_path)
+        except OSError as e:
+            print(f"Skipping file {file_path}: {e}")
+    cache = shared_cache(cache_path) if cache_path else None
+    cached = cache.get_many(stats) if cache else {}
+
+    batch = []
+    fresh = []
+    for file_path, stat in stats.items():
+        record = cached.get(file_path)
+        if record is None:
+            try:
+                record = read_record(file_path)
+            except Exception as e:
+                print(f"Skipping file {file_path}: {e}")
+                continue
+            if record is None:
+                continue
+            fresh.append((file_path, stat, record))
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:
-                    continue
-                
-                # 尝试解析JSON
-                try:
-                    data = json.loads(content)
-                    
-                    # === 核心逻辑：如何将JSON转为Embedding文本 ===
-                    # 方案：将JSON转回字符串，确保包含所有字段
-                    # 你也可以在这里做定制，比如只提取 "name" 和 "skills" 组合成字符串
-                    text_to_embed = json.dumps(data, ensure_ascii=False, indent=0)
-                    
-                    yield file_path, text_to_embed, data
-                    
-                except json.JSONDecodeError:
-                    # 如果不是标准JSON，视作纯文本处理
-                    yield file_path, content, {"raw_content": content}
-                    
+            text = text_fn(record, entity_type) if text_fn else None
+            item = record_fn(record, entity_type) if record_fn else record
         except Exception as e:
-=======
-import os
-import json
-import glob
-from config import config
-
-def load_json_files(entity_type: str):
-    """
-    生成器：遍历指定实体类型的文件夹，yield处理后的文本和原始数据
-    """
-    # 拼接外部数据路径: processed_downloaded_pages_json/expert
-    folder_path = os.path.join(config.RAW_DATA_ROOT, entity_type)
-    
-    if not os.path.exists(folder_path):
-        print(f"Error: 文件夹不存在 - {folder_path}")
-        return
-
-    file_pattern = os.path.join(folder_path, "*.json") # 假设是json后缀，如果是txt但内容是json也行
-    files = glob.glob(file_pattern)
-    
-    print(f"Found {len(files)} files in {folder_path}")
-
-    for file_path in files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:
-                    continue
-                
-                # 尝试解析JSON
-                try:
-                    data = json.loads(content)
-                    
-                    # === 核心逻辑：如何将JSON转为Embedding文本 ===
-                    # 方案：将JSON转回字符串，确保包含所有字段
-                    # 你也可以在这里做定制，比如只提取 "name" 和 "skills" 组合成字符串
-                    text_to_embed = json.dumps(data, ensure_ascii=False, indent=0)
-                    
-                    yield file_path, text_to_embed, data
-                    
-                except json.JSONDecodeError:
-                    # 如果不是标准JSON，视作纯文本处理
-                    yield file_path, content, {"raw_content": content}
-                    
-        except Exception as e:
->>>>>>> Stashed changes
-            print(f"Skipping file {file_path}: {e}")
\ No newline at end of file
+            print(f"Skipping file {file_path}: {e}")
+            continue
+        batch.append((source_id(file_path), text, item))
+    if cache:
+        cache.put_many(fresh)
+    return batch
+
+
+def iter_batches(folder_path: str, file_names: list = None, text_fn=None, entity_type: str = None,
+                 batch_size: int = 64, workers: int = None, record_fn=None, cache_path: str = None):
+    """
+    按批产出 [(id, text, record), ...]
+
+    Args:
+        folder_path: 实体文件夹
+        file_names: 只加载这些文件（默认文件夹下全部 .json）
+        text_fn: 在工作进程中执行的文本构建函数（须为模块级函数，可被 pickle），None 表示不生成文本
+        entity_type: 传给 text_fn 的实体类型
+        batch_size: 每个进程池任务解析的文件数
+        workers: 进程数，默认 CPU 核数；<= 1 或文件较少时在当前进程内解析
+        record_fn: 在工作进程中裁剪记录的函数（须为模块级函数），产出其返回值代替完整记录
+        cache_path: 已解析语料缓存文件（parsed_cache.parsed_cache_path()），None 表示不使用缓存
+    """
+    if file_names is None:
+        file_names = list_files(folder_path)
+    tasks = [file_names[i:i + batch_size] for i in range(0, len(file_names), batch_size)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        for names in tasks:
+            yield _parse_batch(folder_path, names, text_fn, entity_type, record_fn, cache_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for names in tasks:
+            pending.append(executor.submit(_parse_batch, folder_path, names, text_fn, entity_type,
+                                           record_fn, cache_path))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_records(folder_path: str, file_names: list = None, text_fn=None, entity_type: str = None,
+                 batch_size: int = 64, workers: int = None, record_fn=None, cache_path: str = None):
+    """逐条产出 (id, text, record)，参数同 iter_batches"""
+    for batch in iter_batches(folder_path, file_names, text_fn, entity_type, batch_size, workers,
+                              record_fn, cache_path):
+        yield from batch
@@ -0,0 +1,103 @@
+"""
+已解析语料的二进制缓存
+
+向量库构建与知识图谱构建读取同一批 JSON 文件。开启缓存（rag/config.py 与 knowledge_graph/kg_build/config.py
+中的 PARSED_CACHE_ENABLED，两边指向同一个 PARSED_CACHE_PATH）后，loader 把每个文件解析后的字典以 pickle 存入 SQLite（键为文件绝对路径，附带 mtime/大小），
+另一方再读取未变化的文件时直接反序列化，不再重复解析 JSON：
+- WAL 模式，解析进程池中的各进程各自打开连接，按批读写
+- 文件的 mtime 或大小变化即视为未命中，重新解析后覆盖
+- 缓存只是加速手段：读写遇到数据库被锁/繁忙等错误时打印警告，按未命中处理或放弃本批写入，构建照常进行
+"""
+
+import os
+import pickle
+import sqlite3
+
+
+def parsed_cache_path(enabled: bool, path: str = "rag/data/parsed_cache.sqlite"):
+    """开启缓存时返回缓存文件的绝对路径（相对路径相对于项目根目录），否则返回 None"""
+    if not enabled:
+        return None
+    path = str(path)
+    if not os.path.isabs(path):
+        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+        path = os.path.join(project_root, path)
+    return path
+
+
+def file_stat(path: str):
+    """(mtime_ns, size)，用于判断缓存是否仍然有效"""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ParsedCache:
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS parsed (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                record BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def get_many(self, stats: dict) -> dict:
+        """
+        Args:
+            stats: 文件绝对路径 -> (mtime_ns, size)
+
+        Returns:
+            命中且未过期的 路径 -> 解析后的记录
+        """
+        found = {}
+        paths = list(stats)
+        # SQLite 单条语句的参数个数有限，分段查询
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            try:
+                rows = self.conn.execute(
+                    f"SELECT path, mtime_ns, size, record FROM parsed WHERE path IN ({placeholders})", chunk
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                print(f"[ParsedCache] 读取失败，按未命中处理 {len(chunk)} 个文件: {e}")
+                continue
+            for path, mtime_ns, size, blob in rows:
+                if stats[path] == (mtime_ns, size):
+                    found[path] = pickle.loads(blob)
+        return found
+
+    def put_many(self, items):
+        """items: [(路径, (mtime_ns, size), 记录)]，一个事务写入；写入失败时回滚并放弃本批（尽力而为）"""
+        rows = [(path, stat[0], stat[1], pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+                for path, stat, record in items]
+        if not rows:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO parsed (path, mtime_ns, size, record) VALUES (?, ?, ?, ?)", rows
+                )
+        except sqlite3.OperationalError as e:
+            # with 块已回滚本批；下次读取这些文件时重新解析
+            print(f"[ParsedCache] 写入失败，跳过缓存 {len(rows)} 条: {e}")
+
+
+_caches = {}
+
+
+def shared_cache(path: str) -> ParsedCache:
+    """同一进程内每个缓存文件只打开一个连接（按进程号区分，fork 出的工作进程不复用父进程的连接）"""
+    key = (os.getpid(), path)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches[key] = ParsedCache(path)
+    return cache
@@ -0,0 +1,277 @@
+"""
+向量索引评估工具
+
+recall：以精确检索（Flat）为基准，评估不同 ANN 索引类型/检索参数下的 recall@k 与查询延迟，
+用于在延迟与召回率之间选择工作点。向量库以只读方式打开，评估不会改动库文件；
+只使用未删除的行，查询取自实体首行，结果与 VectorDB.search 一样按实体合并切块后比较。
+latency：对比堆内加载与内存映射加载的加载耗时、内存占用，以及冷/热页缓存下的查询延迟。
+dims：对比前缀截断（TRUNC）与 PCA 降维到不同维度后的 recall@k、延迟与索引大小，用于选择降维维度。
+
+用法（在项目根目录执行）：
+    python -m rag.index_tools recall --db expert --factory "HNSW32,Flat" "IVF256,Flat" "IVF256,PQ64" "SQ8" \
+        --nprobe 8 16 32 --ef 64 128 256 --k 5 --rerank 4
+    python -m rag.index_tools latency --db expert --queries 50
+    python -m rag.index_tools dims --db expert --dims 256 512 1024 2048 --method truncate pca
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from config.config import RAG_CONFIG as config
+from rag.core.index_factory import build_index, apply_search_params, is_exact, rerank_exact
+from rag.core.vectordb import VectorDB, resolve_store_path
+
+
+def live_entity_vectors(db):
+    """
+    未删除的行及其向量
+
+    Returns:
+        (向量矩阵, 各位置所属实体首行)：位置 i 对应第 i 个未删除的行（含切块实体的块行）
+    """
+    rows = np.array(db.metadata.live_rows(), dtype="int64")
+    if not len(rows):
+        return np.zeros((0, db.dimension), dtype="float32"), rows
+    vectors = np.ascontiguousarray(db.get_vectors(rows), dtype="float32")
+    parents = np.array([db.metadata.parent(int(r)) for r in rows], dtype="int64")
+    return vectors, parents
+
+
+def sample_queries(vectors: np.ndarray, parents: np.ndarray, n_queries: int, seed: int = 0):
+    """从实体首行的向量中抽样作为查询，返回 (查询矩阵, 对应实体首行)"""
+    # 同一实体的行连续排列，每个实体取第一行
+    heads = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(heads, size=min(n_queries, len(heads)), replace=False)
+    return vectors[picked], parents[picked]
+
+
+def exact_neighbors(vectors: np.ndarray, parents: np.ndarray, queries: np.ndarray, query_entities: np.ndarray,
+                    k: int, fetch: int):
+    """精确 top-k 实体（剔除查询自身），作为召回率基准"""
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    _, positions = flat.search(queries, fetch)
+    return pool_entities(positions, parents, query_entities, k)
+
+
+def pool_entities(positions: np.ndarray, parents: np.ndarray, query_entities: np.ndarray, k: int):
+    """检索到的位置 -> 实体首行，按得分顺序去重（同 VectorDB.search 合并切块），去掉查询自身后截取前 k 个"""
+    result = np.full((len(positions), k), -1, dtype="int64")
+    for i, (hits, self_entity) in enumerate(zip(positions, query_entities)):
+        entities = []
+        for position in hits:
+            if position == -1:
+                continue
+            entity = parents[position]
+            if entity != self_entity and entity not in entities:
+                entities.append(entity)
+                if len(entities) == k:
+                    break
+        result[i, :len(entities)] = entities
+    return result
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = 0
+    total = 0
+    for f, t in zip(found, truth):
+        t = set(t[t != -1].tolist())
+        hits += len(t.intersection(f.tolist()))
+        total += len(t)
+    return hits / total if total else 1.0
+
+
+def timed_search(index, queries: np.ndarray, k: int, rerank_factor: int = 1, vectors: np.ndarray = None):
+    """
+    逐条查询（与线上单项目检索一致），返回 (结果行号, 平均毫秒/查询)；
+    rerank_factor > 1 时先取 k * rerank_factor 个候选再用全精度向量精确重排
+    """
+    rows = np.empty((len(queries), k), dtype="int64")
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        query = queries[i:i + 1]
+        if rerank_factor > 1:
+            _, cand = index.search(query, k * rerank_factor)
+            rows[i] = rerank_exact(query, cand, lambda r: vectors[r], k)[1][0]
+        else:
+            rows[i] = index.search(query, k)[1][0]
+    elapsed = time.perf_counter() - start
+    return rows, elapsed / max(len(queries), 1) * 1000
+
+
+def search_param_grid(description: str, nprobes, efs):
+    """根据索引类型给出需要扫描的检索参数组合"""
+    if "IVF" in description:
+        return [{"nprobe": v} for v in nprobes]
+    if "HNSW" in description:
+        return [{"efSearch": v} for v in efs]
+    return [{}]
+
+
+def index_bytes(index) -> int:
+    return faiss.serialize_index(index).nbytes
+
+
+def report_recall(db_name: str, factories, k: int, n_queries: int, nprobes, efs, rerank_factor: int = 1):
+    db = VectorDB(db_name=db_name, read_only=True)
+    vectors, parents = live_entity_vectors(db)
+    n_entities = len(np.unique(parents))
+    if n_entities <= k:
+        print(f"[{db_name}] 实体数不足 ({n_entities})，无法评估")
+        return
+    if db.full_vectors is None and not is_exact(db.index):
+        print(f"  [Warning] 当前索引不是 Flat，基准向量为近似重建值")
+
+    # 切块的实体可能有多个块同时命中，与 VectorDB.search 一样多取若干倍候选再按实体合并
+    fetch = (k + 1) * (config.get('CHUNK_SEARCH_FACTOR', 4) if db.metadata.chunked else 1)
+    fetch = min(fetch, len(vectors))
+    queries, query_entities = sample_queries(vectors, parents, n_queries)
+    truth = exact_neighbors(vectors, parents, queries, query_entities, k, fetch)
+
+    baseline = build_index(vectors, db.dimension, "Flat")
+    _, base_ms = timed_search(baseline, queries, fetch)
+
+    print(f"\n[{db_name}] 实体数 {n_entities}（向量 {len(vectors)}），查询 {len(queries)} 条，recall@{k}（基准：Flat）")
+    print(f"{'索引类型':<20}{'检索参数':<18}{'recall':>8}{'ms/查询':>10}{'构建秒':>9}{'大小MB':>9}")
+    print(f"{'Flat':<20}{'-':<18}{1.0:>8.4f}{base_ms:>10.3f}{0:>9.1f}{index_bytes(baseline) / 1024 ** 2:>9.1f}")
+
+    for description in factories:
+        start = time.perf_counter()
+        index = build_index(vectors, db.dimension, description,
+                            build_params=config.get('INDEX_BUILD_PARAMS', {}))
+        build_s = time.perf_counter() - start
+        size_mb = index_bytes(index) / 1024 ** 2
+        for params in search_param_grid(description, nprobes, efs):
+            apply_search_params(index, params)
+            param_str = ",".join(f"{n}={v}" for n, v in params.items()) or "-"
+            factors = [1, rerank_factor] if rerank_factor > 1 else [1]
+            for factor in factors:
+                positions, ms = timed_search(index, queries, fetch, factor, vectors)
+                recall = recall_at_k(pool_entities(positions, parents, query_entities, k), truth)
+                label = description if factor == 1 else f"{description}+重排x{factor}"
+                print(f"{label:<20}{param_str:<18}{recall:>8.4f}{ms:>10.3f}{build_s:>9.1f}{size_mb:>9.1f}")
+
+
+def dimension_factories(dimension: int, dims, methods, base: str = "Flat"):
+    """降维候选的索引描述串，如 "TRUNC512,Flat" / "PCA512,Flat"（不超过原始维度）"""
+    prefixes = {"truncate": "TRUNC", "pca": "PCA"}
+    return [f"{prefixes[m]}{d},{base}" for m in methods for d in sorted(dims) if d < dimension]
+
+
+def evict_page_cache(path: str):
+    """用 posix_fadvise 把文件移出页缓存以模拟冷启动（无需 root，仅对未被修改的页生效）"""
+    if not os.path.exists(path) or not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB），仅 Linux 可用"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def query_latency(db, queries: np.ndarray, k: int):
+    """返回 (首条查询毫秒, 平均毫秒/查询)"""
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        db.search(q, k)
+        times.append((time.perf_counter() - start) * 1000)
+    return times[0], sum(times) / len(times)
+
+
+def report_latency(db_name: str, n_queries: int, k: int):
+    base_path = resolve_store_path()
+    files = [os.path.join(base_path, f"{db_name}.index"), os.path.join(base_path, f"{db_name}_vectors.npy")]
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((n_queries, config['EMBEDDING_DIMENSION'])).astype("float32")
+
+    print(f"\n[{db_name}] 冷/热查询延迟对比（{n_queries} 条查询，top-{k}）")
+    print(f"{'加载方式':<10}{'加载秒':>8}{'RSS增量MB':>11}{'冷-首条ms':>11}{'冷-平均ms':>11}{'预热秒':>8}{'热-平均ms':>11}")
+    for mmap in (True, False):
+        for path in files:
+            evict_page_cache(path)
+        gc.collect()
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        db = VectorDB(db_name=db_name, read_only=True, mmap=mmap, warmup=False)
+        load_s = time.perf_counter() - start
+        rss_delta = rss_mb() - rss_before
+        cold_first, cold_avg = query_latency(db, queries, k)
+
+        for path in files:
+            evict_page_cache(path)
+        start = time.perf_counter()
+        db.warmup()
+        warmup_s = time.perf_counter() - start
+        _, warm_avg = query_latency(db, queries, k)
+
+        label = "mmap" if mmap else "堆内"
+        print(f"{label:<10}{load_s:>8.2f}{rss_delta:>11.1f}{cold_first:>11.2f}{cold_avg:>11.2f}{warmup_s:>8.2f}{warm_avg:>11.2f}")
+        del db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引评估工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    recall = sub.add_parser("recall", help="评估 ANN 索引相对 Flat 基准的 recall@k 与延迟")
+    recall.add_argument("--db", default="expert")
+    recall.add_argument("--factory", nargs="+", default=["HNSW32,Flat", "IVF256,Flat", "IVF256,PQ64", "SQfp16", "SQ8"])
+    recall.add_argument("--k", type=int, default=5)
+    recall.add_argument("--queries", type=int, default=200)
+    recall.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    recall.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256])
+    recall.add_argument("--rerank", type=int, default=config.get('RERANK_FACTOR', 4),
+                        help="额外评估精确重排（候选倍数），1 表示不评估")
+
+    latency = sub.add_parser("latency", help="对比堆内/内存映射加载及冷/热查询延迟")
+    latency.add_argument("--db", default="expert")
+    latency.add_argument("--k", type=int, default=5)
+    latency.add_argument("--queries", type=int, default=50)
+
+    dims = sub.add_parser("dims", help="评估降维（前缀截断 / PCA）后各维度的 recall@k、延迟与索引大小")
+    dims.add_argument("--db", default="expert")
+    dims.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024, 2048])
+    dims.add_argument("--method", nargs="+", choices=["truncate", "pca"], default=["truncate", "pca"])
+    dims.add_argument("--base", default="Flat", help="降维后使用的索引类型")
+    dims.add_argument("--k", type=int, default=5)
+    dims.add_argument("--queries", type=int, default=200)
+    dims.add_argument("--rerank", type=int, default=config.get('RERANK_FACTOR', 4),
+                      help="额外评估精确重排（候选倍数），1 表示不评估")
+
+    args = parser.parse_args()
+    if args.command == "dims":
+        factories = dimension_factories(config['EMBEDDING_DIMENSION'], args.dims, args.method, args.base)
+        report_recall(args.db, factories, args.k, args.queries, [16], [128], args.rerank)
+    elif args.command == "latency":
+        report_latency(args.db, args.queries, args.k)
+    elif args.command == "recall":
+        report_recall(args.db, args.factory, args.k, args.queries, args.nprobe, args.ef, args.rerank)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+项目 × 专家相似度离线预计算
+
+对 data/projects 下的全部项目批量向量化，与专家库全部向量做分块矩阵乘（精确内积），
+取每个项目的 top-K 专家写入紧凑的 npz 表（PROJECT_CONFIG['data_path']['expert_candidates']）。
+utils.data_loader.load_expert_candidates 从该表读取；批量运行时内容未变化的项目不再在线向量化与检索。
+
+用法（在项目根目录执行）：
+    python -m rag.precompute_candidates --k 20 --block 4096
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from config.config import PROJECT_CONFIG
+from rag.core.llm_client import get_embeddings
+from rag.core.vectordb import VectorDB
+from utils.data_loader import (load_projects, project_text, project_digest, save_candidate_table, expert_candidate_filter,
+                               expert_store_fingerprint)
+
+
+def pool_by_parent(sims: np.ndarray, rows: np.ndarray, metadata):
+    """把块行归并到所属实体首行，每个实体取各块得分的最大值"""
+    parents = np.array([metadata.parent(r) for r in rows], dtype="int64")
+    owners, inverse = np.unique(parents, return_inverse=True)
+    pooled = np.full((len(sims), len(owners)), -np.inf, dtype="float32")
+    np.maximum.at(pooled, (slice(None), inverse), sims)
+    return pooled, owners
+
+
+def blocked_top_k(queries: np.ndarray, db: VectorDB, k: int, block_size: int = 4096, filters=None):
+    """
+    查询矩阵与专家库全部未删除向量分块相乘，逐块合并出每个查询的精确 top-k；
+    每次只读入 block_size 条专家向量，内存占用与专家总数无关。
+    切块的专家先在块内按专家取最大得分，结果行号均为专家首行；
+    filters 为过滤表达式（见 VectorDB.filter_mask），只在满足条件的专家中计算
+
+    Returns:
+        (scores, rows)：形状均为 (查询数, k)，按相似度降序，空位行号为 -1
+    """
+    if filters is not None:
+        live_rows = np.flatnonzero(db.filter_mask(filters)).astype("int64")
+    else:
+        live_rows = np.array(db.metadata.live_rows(), dtype="int64")
+    n_queries = len(queries)
+    best_scores = np.zeros((n_queries, 0), dtype="float32")
+    best_rows = np.zeros((n_queries, 0), dtype="int64")
+    start = 0
+    while start < len(live_rows):
+        end = start + block_size
+        # 同一专家的块行连续存放，分块边界不切开同一专家
+        while db.metadata.chunked and end < len(live_rows) and db.metadata.is_chunk(live_rows[end]):
+            end += 1
+        block_rows = live_rows[start:end]
+        start = end
+        sims = queries @ db.get_vectors(block_rows).T
+        if db.metadata.chunked:
+            sims, block_rows = pool_by_parent(sims, block_rows, db.metadata)
+        scores = np.concatenate([best_scores, sims], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(block_rows, sims.shape)], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        best_scores, best_rows = scores, rows
+
+    order = np.argsort(-best_scores, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    # 专家数少于 k 时补齐空位
+    pad = k - best_scores.shape[1]
+    if pad > 0:
+        best_scores = np.pad(best_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        best_rows = np.pad(best_rows, ((0, 0), (0, pad)), constant_values=-1)
+    return best_scores.astype("float32"), best_rows
+
+
+def precompute(k: int, block_size: int):
+    projects_dir = os.path.join(project_root, PROJECT_CONFIG['data_path']['projects'])
+    output_path = os.path.join(project_root, PROJECT_CONFIG['data_path'].get('expert_candidates', './data/expert_candidates.npz'))
+    projects = load_projects(projects_dir)
+    if not projects:
+        print(f"未找到项目文件: {projects_dir}")
+        return
+
+    start = time.perf_counter()
+    vectors = get_embeddings([project_text(p) for p in projects])
+    valid = [i for i, v in enumerate(vectors) if v]
+    if len(valid) < len(projects):
+        print(f"  [Warning] {len(projects) - len(valid)} 个项目向量化失败，未写入候选表")
+    if not valid:
+        return
+    queries = np.array([vectors[i] for i in valid], dtype="float32")
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    embed_s = time.perf_counter() - start
+
+    # 指纹取自打开专家库之前，检索期间若有构建写入，下次运行会判定为过期
+    fingerprint = expert_store_fingerprint("expert")
+    db = VectorDB(db_name="expert", read_only=True)
+    start = time.perf_counter()
+    scores, rows = blocked_top_k(queries, db, k, block_size, expert_candidate_filter(PROJECT_CONFIG, project_root))
+    search_s = time.perf_counter() - start
+
+    names = [[(db.metadata.title(r) or "") if r != -1 else "" for r in row] for row in rows]
+    project_ids = [projects[i].get('标题') or f"项目{i + 1}" for i in valid]
+    digests = [project_digest(projects[i]) for i in valid]
+    save_candidate_table(output_path, project_ids, digests, rows, scores, names, fingerprint)
+    print(f"已写入 {len(valid)} 个项目的 top-{k} 候选专家: {output_path}")
+    print(f"向量化 {embed_s:.1f}s，相似度计算 {search_s:.2f}s（专家 {db.live_count()} 条，分块 {block_size}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线预计算项目候选专家")
+    parser.add_argument("--k", type=int, default=max(20, PROJECT_CONFIG.get('cascade_candidates') or 0),
+                        help="每个项目保存的候选专家数（开启级联粗排时不少于 cascade_candidates）")
+    parser.add_argument("--block", type=int, default=4096, help="每次参与矩阵乘的专家向量条数")
+    args = parser.parse_args()
+    precompute(args.k, args.block)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 以项目根目录为导入起点（与 python -m agents.main 等入口一致）
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,44 @@
+import numpy as np
+
+import utils.candidate_ranker as candidate_ranker
+from rag.core.metadata_store import record_data
+from utils.candidate_ranker import CandidateRanker
+
+
+class _FakeLexical:
+    def score_rows(self, query, rows):
+        return np.zeros(len(rows), dtype="float32")
+
+
+class _FakeDB:
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+
+def _ranker(monkeypatch, tmp_path, metadata):
+    monkeypatch.setattr(candidate_ranker, "load_lexical_index", lambda db: _FakeLexical())
+    monkeypatch.setattr(candidate_ranker, "resolve_store_path", lambda: str(tmp_path))
+    return CandidateRanker(_FakeDB(metadata))
+
+
+def test_record_data_tolerates_null_levels():
+    assert record_data({'original_data': None}) == {}
+    assert record_data({'original_data': {'data': None}}) == {}
+    assert record_data({}) == {}
+    assert record_data({'original_data': {'data': {'title': 'a'}}}) == {'title': 'a'}
+
+
+def test_rank_with_null_fields(monkeypatch, tmp_path):
+    metadata = [
+        {'original_data': {'data': {'orgs': None, 'summary': None, 'invent_patents': None}}},
+        {'original_data': None},
+        {'original_data': {'data': {'orgs': ['西安某研究所'], 'summary': '位于陕西西安',
+                                    'invent_patents': {'total': 3}}}},
+    ]
+    ranker = _ranker(monkeypatch, tmp_path, metadata)
+    candidates = [{'id': str(i), 'name': f'e{i}', 'score': 0.5} for i in range(3)]
+
+    ranked = ranker.rank({'地区': '陕西省 西安市'}, candidates)
+
+    assert [c['name'] for c in ranked][0] == 'e2'
+    assert sorted(c['name'] for c in ranked) == ['e0', 'e1', 'e2']
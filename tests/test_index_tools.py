@@ -0,0 +1,23 @@
+import numpy as np
+
+from rag.index_tools import pool_entities, sample_queries
+
+
+def test_pool_entities_merges_chunks_and_drops_self():
+    # 位置 0-2 为实体 10 的首行与块行，位置 3、4 为实体 13、14
+    parents = np.array([10, 10, 10, 13, 14])
+    positions = np.array([[1, 0, 2, 4, -1, 3]])
+
+    pooled = pool_entities(positions, parents, np.array([14]), k=2)
+
+    assert pooled.tolist() == [[10, 13]]
+
+
+def test_sample_queries_uses_entity_heads():
+    parents = np.array([10, 10, 10, 13, 14])
+    vectors = np.arange(5, dtype="float32").reshape(-1, 1)
+
+    queries, entities = sample_queries(vectors, parents, n_queries=10)
+
+    assert sorted(entities.tolist()) == [10, 13, 14]
+    assert sorted(queries[:, 0].tolist()) == [0.0, 3.0, 4.0]
@@ -0,0 +1,30 @@
+import json
+
+from knowledge_graph.kg_build.keyword_index import ExpertKeywordIndex
+
+
+def _write(folder, name, keywords):
+    record = {'data': {'ai_fields': {'专家简介': {'综合分析': {'technical_keywords': keywords}}}}}
+    with open(folder / f"{name}.json", "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+
+
+def test_common_keeps_target_keyword_order(tmp_path):
+    # 先载入 B，使词表编号顺序与 A 的关键词顺序不同
+    _write(tmp_path, "B", ["激光", "涡轮", "叶片", "铸造"])
+    index = ExpertKeywordIndex(tmp_path, refresh_interval=0)
+    index.refresh(force=True)
+    _write(tmp_path, "A", ["铸造", "叶片", "增材制造", "涡轮", "叶片"])
+    index.refresh(force=True)
+
+    my_ids = index.ids("A")
+    assert [index.terms[i] for i in my_ids] == ["铸造", "叶片", "增材制造", "涡轮"]
+    assert index.common(my_ids, "B") == ["铸造", "叶片", "涡轮"]
+    assert index.common(my_ids, "unknown") == []
+
+
+def test_null_keyword_levels_are_empty(tmp_path):
+    with open(tmp_path / "C.json", "w", encoding="utf-8") as f:
+        json.dump({'data': {'ai_fields': None}}, f)
+    index = ExpertKeywordIndex(tmp_path, refresh_interval=0)
+    assert len(index.ids("C")) == 0
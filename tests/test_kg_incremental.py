@@ -0,0 +1,142 @@
+import json
+import os
+import random
+import sys
+
+# build_graph 以 kg_build 目录为导入起点（from kg_utils import ...）；追加在末尾，避免其 config.py 遮蔽项目的 config 包
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'knowledge_graph', 'kg_build')))
+
+import build_graph  # noqa: E402
+from kg_utils import DataExtractor  # noqa: E402
+
+RELS = ("COLLABORATED_WITH", "IS_COLLEAGUE_OF")
+
+
+class _Result:
+    def consume(self):
+        pass
+
+
+class _FakeGraph:
+    """只模拟派生边：记录 {关系: {frozenset(两端 ID): weight}}"""
+
+    def __init__(self):
+        self.edges = {rel: {} for rel in RELS}
+        self.queries = {build_graph.DELETE_NODES.format(label="Expert"): ("delete_expert", None)}
+        for rel in RELS:
+            self.queries[build_graph.DELETE_DERIVED_EDGES.format(rel=rel)] = ("delete_derived", rel)
+            self.queries[build_graph.DERIVED_EDGES.format(rel=rel)] = ("merge_derived", rel)
+
+    def _drop(self, rels, ids):
+        ids = set(ids)
+        for rel in rels:
+            self.edges[rel] = {pair: w for pair, w in self.edges[rel].items() if not pair & ids}
+
+    def run(self, query, rows=None):
+        if rows is None:
+            if "DETACH DELETE n" in query:
+                self.edges = {rel: {} for rel in RELS}
+            return _Result()
+        op, rel = self.queries.get(query, (None, None))
+        if op == "delete_expert":
+            self._drop(RELS, rows)
+        elif op == "delete_derived":
+            self._drop([rel], rows)
+        elif op == "merge_derived":
+            for row in rows:
+                self.edges[rel][frozenset((row['a'], row['b']))] = row['weight']
+        return _Result()
+
+
+class _Session:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **kwargs):
+        return self.graph.run(query, kwargs.get('rows'))
+
+    def execute_write(self, work):
+        return work(self)
+
+
+class _Driver:
+    def __init__(self):
+        self.graph = _FakeGraph()
+
+    def session(self):
+        return _Session(self.graph)
+
+    def close(self):
+        pass
+
+
+def _builder(root, manifest_name):
+    builder = build_graph.KnowledgeGraphBuilder.__new__(build_graph.KnowledgeGraphBuilder)
+    builder.driver = _Driver()
+    builder.extractor = DataExtractor(root / "expert", root / "organization", root / "patent", workers=1)
+    builder.batch_size = 7
+    builder.workers = 1
+    builder.manifest_path = str(root / manifest_name)
+    return builder
+
+
+def _write_corpus(root, corpus):
+    for folder in ("expert", "organization", "patent"):
+        os.makedirs(root / folder, exist_ok=True)
+        for name in os.listdir(root / folder):
+            os.remove(root / folder / name)
+    for oid, title in corpus['orgs'].items():
+        with open(root / "organization" / f"{oid}.json", "w", encoding="utf-8") as f:
+            json.dump({'data': {'id': oid, 'title': title}}, f, ensure_ascii=False)
+    for eid, (orgs, patents) in corpus['experts'].items():
+        data = {'id': eid, 'title': eid, 'orgs': orgs,
+                'invent_patents': {'patent_list': [{'id': p, 'title': p} for p in patents]}}
+        with open(root / "expert" / f"{eid}.json", "w", encoding="utf-8") as f:
+            json.dump({'data': data}, f, ensure_ascii=False)
+
+
+def _mutate(corpus, rng, step):
+    orgs = dict(corpus['orgs'])
+    experts = {eid: (list(o), list(p)) for eid, (o, p) in corpus['experts'].items()}
+    # 改名一个组织、删除一位专家、新增一位专家，并调整几位专家的组织与专利（使分组跨过超级节点阈值）
+    oid = rng.choice(sorted(orgs))
+    orgs[oid] = f"{oid}-r{step}"
+    experts.pop(rng.choice(sorted(experts)))
+    experts[f"n{step}"] = ([orgs[rng.choice(sorted(orgs))]], [f"p{rng.randrange(6)}"])
+    for eid in rng.sample(sorted(experts), 4):
+        experts[eid] = (rng.sample(sorted(orgs.values()), rng.randint(0, 2)),
+                        [f"p{i}" for i in rng.sample(range(6), rng.randint(0, 2))])
+    return {'orgs': orgs, 'experts': experts}
+
+
+def test_incremental_sync_matches_full_build(monkeypatch, tmp_path):
+    monkeypatch.setattr(build_graph, "DERIVED_MAX_GROUP", 4)
+    monkeypatch.setattr(build_graph, "DERIVED_DEGREE_CAP", 2)
+    rng = random.Random(7)
+    orgs = {f"o{i}": f"O{i}" for i in range(4)}
+    corpus = {'orgs': orgs, 'experts': {
+        f"e{i}": (rng.sample(sorted(orgs.values()), rng.randint(1, 2)),
+                  [f"p{j}" for j in rng.sample(range(6), rng.randint(0, 2))])
+        for i in range(14)}}
+
+    incremental_root = tmp_path / "incremental"
+    _write_corpus(incremental_root, corpus)
+    incremental = _builder(incremental_root, "manifest.json")
+    incremental.build()
+
+    for step in range(6):
+        corpus = _mutate(corpus, rng, step)
+        _write_corpus(incremental_root, corpus)
+        incremental.build()
+
+        full_root = tmp_path / f"full{step}"
+        _write_corpus(full_root, corpus)
+        full = _builder(full_root, "manifest.json")
+        full.build(full=True)
+        assert incremental.driver.graph.edges == full.driver.graph.edges, f"第 {step} 次增量同步与全量构建不一致"
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+
+import pytest
+
+from rag.core.metadata_store import MetadataStore
+
+
+def _record(name):
+    return {'text': name, 'original_data': {'data': {'id': name, 'title': name}}, 'source': name}
+
+
+def test_read_only_open_does_not_write(tmp_path):
+    path = str(tmp_path / "expert_meta.sqlite")
+    store = MetadataStore(path)
+    store.append(_record("a"))
+    store.save()
+    del store
+
+    os.chmod(path, 0o444)
+    try:
+        reader = MetadataStore(path, read_only=True)
+        assert reader.title(0) == "a"
+        assert reader[0]['original_data']['data']['id'] == "a"
+        with pytest.raises(RuntimeError):
+            reader.save()
+    finally:
+        os.chmod(path, 0o644)
+
+
+def test_read_only_missing_file_is_empty_and_not_created(tmp_path):
+    path = str(tmp_path / "missing_meta.sqlite")
+    assert len(MetadataStore(path, read_only=True)) == 0
+    assert not os.path.exists(path)
+
+
+def test_read_only_rejects_old_schema(tmp_path):
+    path = str(tmp_path / "old_meta.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE records (row INTEGER PRIMARY KEY, entity_id TEXT, title TEXT, text TEXT, "
+                 "original_data TEXT)")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(RuntimeError, match="表结构过旧"):
+        MetadataStore(path, read_only=True)
+    # 读写打开时照常补齐
+    assert len(MetadataStore(path)) == 0
+    assert len(MetadataStore(path, read_only=True)) == 0
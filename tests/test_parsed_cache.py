@@ -0,0 +1,19 @@
+import sqlite3
+
+from rag.etl.parsed_cache import ParsedCache
+
+
+def test_put_many_is_best_effort_when_locked(tmp_path):
+    path = str(tmp_path / "parsed.sqlite")
+    cache = ParsedCache(path)
+    cache.conn.close()
+    cache.conn = sqlite3.connect(path, timeout=0.05)
+    other = sqlite3.connect(path)
+    other.execute("BEGIN EXCLUSIVE")
+
+    cache.put_many([("/data/a.json", (1, 2), {'data': {'id': 'a'}})])  # 不抛出
+    assert cache.get_many({"/data/a.json": (1, 2)}) == {}
+
+    other.rollback()
+    cache.put_many([("/data/a.json", (1, 2), {'data': {'id': 'a'}})])
+    assert cache.get_many({"/data/a.json": (1, 2)}) == {"/data/a.json": {'data': {'id': 'a'}}}
@@ -0,0 +1,29 @@
+import rag.core.vectordb as vectordb
+from rag.core.metadata_store import MetadataStore, store_generation
+from utils.data_loader import expert_store_fingerprint
+
+
+def _record(name):
+    return {'text': name, 'original_data': {'data': {'id': name, 'title': name}}, 'source': name}
+
+
+def test_fingerprint_follows_committed_saves_only(monkeypatch, tmp_path):
+    monkeypatch.setattr(vectordb, "resolve_store_path", lambda: str(tmp_path))
+    assert expert_store_fingerprint() == ""
+
+    store = MetadataStore(str(tmp_path / "expert_meta.sqlite"))
+    store.append(_record("a"))
+    store.save()
+    saved = expert_store_fingerprint()
+    assert store_generation(str(tmp_path / "expert_meta.sqlite"))[0] == 1
+
+    # 只读打开与检索（包括 WAL 文件的创建/检查点）不改变指纹
+    reader = MetadataStore(str(tmp_path / "expert_meta.sqlite"))
+    assert reader.title(0) == "a"
+    assert expert_store_fingerprint() == saved
+
+    # 未提交的改动不计入，保存后指纹变化
+    store.append(_record("b"))
+    assert expert_store_fingerprint() == saved
+    store.save()
+    assert expert_store_fingerprint() != saved
@@ -1,17 +1,25 @@
 """
 混合检索工具
 
-融合知识图谱和语义向量的混合检索工具，用于在数据库中初步筛选候选资源
+融合词法（BM25 倒排索引）和语义向量的混合检索工具，用于在专家库中初步筛选候选专家。
+专家库句柄取自 RAGTool.vector_db（注册表重新加载或库在首次调用之后才构建时自动换用新库），
+库变化时随之重建检索器（倒排索引一并重新载入）
 """
 
+import threading
+
+import json5
 from qwen_agent.tools.base import BaseTool, register_tool
 
+from rag.core.hybrid_search import HybridSearcher
+from tools.rag_tool import RAGTool
+
 
 @register_tool('hybrid_retrieval')
 class HybridRetrieval(BaseTool):
-    """混合检索工具（知识图谱+语义向量）"""
+    """混合检索工具（BM25 词法 + 语义向量）"""
     
-    description = '融合知识图谱和语义向量的混合检索工具，用于在数据库中初步筛选候选资源（专家、专利、组织等）'
+    description = '融合关键词（BM25）和语义向量的混合检索工具，用于在专家库中初步筛选候选专家'
     
     parameters = [{
         'name': 'query',
@@ -21,14 +29,38 @@ class HybridRetrieval(BaseTool):
     }, {
         'name': 'top_k',
         'type': 'integer',
-        'description': '返回前k个结果',
+        'description': '返回前k个结果（默认 20，最多 100）',
         'required': False
     }]
-    
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # TODO: 初始化知识图谱和语义向量检索组件
-        
+
+    DEFAULT_TOP_K = 20
+    MAX_TOP_K = 100
+
+    # 各实例共享同一个检索器（专家向量库与倒排索引只加载一次）
+    _searcher = None
+    _searcher_lock = threading.Lock()
+
+    @classmethod
+    def searcher(cls):
+        """共享的检索器；专家库尚未构建时返回 None（不缓存），专家库换成新实例时重建"""
+        db = RAGTool.vector_db("expert")
+        with cls._searcher_lock:
+            if cls._searcher is not None and cls._searcher.db is not db:
+                cls._searcher.close()
+                cls._searcher = None
+            if cls._searcher is None and db is not None:
+                cls._searcher = HybridSearcher(db)
+            return cls._searcher
+
+    @classmethod
+    def parse_top_k(cls, value) -> int:
+        """模型给出的 top_k 可能是字符串或非法值：转为整数并限制在 [1, MAX_TOP_K]，无法解析时取默认值"""
+        try:
+            top_k = int(value)
+        except (TypeError, ValueError):
+            return cls.DEFAULT_TOP_K
+        return min(max(top_k, 1), cls.MAX_TOP_K)
+
     def call(self, params: str, **kwargs) -> str:
         """
         执行混合检索
@@ -39,17 +71,19 @@ class HybridRetrieval(BaseTool):
         Returns:
             JSON格式的检索结果
         """
-        # TODO: 实现知识图谱检索（先留空）
-        # TODO: 实现语义向量检索
-        # TODO: 融合两种检索结果
-        import json5
         params_dict = json5.loads(params)
-        query = params_dict.get('query', '')
-        top_k = params_dict.get('top_k', 20)
-        
-        # 占位实现
+        query = str(params_dict.get('query', '') or '').strip()
+        top_k = self.parse_top_k(params_dict.get('top_k', self.DEFAULT_TOP_K))
+        if not query:
+            return json5.dumps({'results': [], 'message': '查询为空'}, ensure_ascii=False)
+        searcher = self.searcher()
+        if searcher is None:
+            return json5.dumps({'results': [], 'message': '专家向量库尚未构建'}, ensure_ascii=False)
+
+        # 词法通道（技术关键词、标签、专利标题）与向量通道并行检索，倒数排名融合
+        results = searcher.search(query, top_k)
         return json5.dumps({
-            'results': [],
-            'message': '混合检索功能'
+            'results': results,
+            'message': f'混合检索（BM25 + 向量，RRF 融合）返回 {len(results)} 条'
         }, ensure_ascii=False)
 
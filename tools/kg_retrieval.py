@@ -12,6 +12,8 @@ import json5
 from neo4j import GraphDatabase
 from qwen_agent.tools.base import BaseTool, register_tool
 
+from knowledge_graph.kg_build.keyword_index import shared_keyword_index
+
 # 添加 knowledge_graph/kg_build 目录到路径，以便导入 config
 current_dir = Path(__file__).parent
 kg_build_dir = current_dir.parent / "knowledge_graph" / "kg_build"
@@ -77,17 +79,8 @@ class KGRetrieval(BaseTool):
             return []
     
     def _get_keywords_from_json(self, name):
-        """从 JSON 文件中提取专家的技术关键词"""
-        file_path = Path(EXPERT_DIR) / f"{name}.json"
-        if not file_path.exists():
-            return set()
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                raw_data = json.load(f)
-            keywords = raw_data.get('data', {}).get('ai_fields', {}).get('专家简介', {}).get('综合分析', {}).get('technical_keywords', [])
-            return set(keywords) if isinstance(keywords, list) else set()
-        except Exception:
-            return set()
+        """专家的技术关键词（取自预加载的关键词索引，文件变化时按 mtime 自动刷新）"""
+        return shared_keyword_index(EXPERT_DIR).keywords(name)
     
     def find_path(self, start_name, end_name, max_length=10):
         """路径查询（强制通过组织/专利中转）"""
@@ -165,9 +158,10 @@ class KGRetrieval(BaseTool):
         }
     
     def recommend_similar_experts(self, name, top_n=5):
-        """混合检索：基于本地JSON技术栈在社交圈内推荐相似专家"""
-        my_stack = self._get_keywords_from_json(name)
-        if not my_stack:
+        """混合检索：基于本地JSON技术栈在社交圈内推荐相似专家（关键词在内存索引中按整数编号求交）"""
+        keyword_index = shared_keyword_index(EXPERT_DIR)
+        my_stack = keyword_index.ids(name)
+        if not len(my_stack):
             return {'found': False, 'recommendations': [], 'message': f'无法从本地提取专家 [{name}] 的技术关键词'}
         
         cypher = """
@@ -184,8 +178,7 @@ class KGRetrieval(BaseTool):
                 f_name = f.get('name', '')
                 if not f_name:
                     continue
-                f_stack = self._get_keywords_from_json(f_name)
-                common = my_stack.intersection(f_stack)
+                common = keyword_index.common(my_stack, f_name)
                 if common:
                     rel_map = {"IS_COLLEAGUE_OF": "同事", "COLLABORATED_WITH": "合作伙伴"}
                     rel_types = f.get('rel_types', [])
@@ -194,7 +187,7 @@ class KGRetrieval(BaseTool):
                         "id": str(f.get('id', '')),
                         "rel_types": rel_types,
                         "rel_labels": [rel_map.get(r, r) for r in rel_types],
-                        "common_keywords": list(common),
+                        "common_keywords": common,
                         "score": len(common)
                     })
             except:
@@ -2,97 +2,269 @@
 RAG 检索工具
 
 用于检索专家数据，包括专利、所属企业或组织等信息
+
+- 向量库取自进程内注册表（rag/core/registry.py），各工具实例与 RecommendationManager 共享同一份索引；
+  注册表 reload 后（版本号变化）自动换用新实例，库尚未构建时不缓存，构建完成后即可使用
+- 查询文本 -> 向量、(库, 查询, top_k) -> 结果列表各有一个进程内 LRU 缓存，
+  讨论中反复出现的查询不再请求 embedding 接口、也不再检索
+- RecommendationManager 的候选召回同样经由本工具（retrieve_by_vectors），不再直接访问专家库索引
+- 专家智能体在讨论中调用本工具需在 PROJECT_CONFIG['expert_tools'] 中显式开启（默认不开启）
 """
 
-from qwen_agent.tools.base import BaseTool, register_tool
+import os
+import threading
+from collections import OrderedDict
+
 import json5
+import numpy as np
+from qwen_agent.tools.base import BaseTool, register_tool
+
+from config.config import RAG_CONFIG
+from rag.core.metadata_store import record_data
+from rag.core.registry import acquire_vector_db, registry, release_vector_db
+from rag.core.vectordb import resolve_store_path
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存；maxsize 为 0 时不缓存"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
 
 
 @register_tool('rag_retrieval')
 class RAGTool(BaseTool):
     """RAG 检索工具"""
-    
+
     description = '检索专家数据，包括专利信息、所属企业或组织等信息'
-    
+
     parameters = [{
         'name': 'expert_id',
         'type': 'string',
-        'description': '专家ID',
+        'description': '专家ID（也可以是专家姓名）',
         'required': True
     }, {
         'name': 'query',
         'type': 'string',
-        'description': '检索查询（可选，用于语义检索）',
+        'description': '检索查询（可选，用于语义检索相关专利和组织）',
         'required': False
     }]
-    
+
+    # 缓存与向量库在各实例间共享（每个专家智能体都会创建一个工具实例）
+    _embedding_cache = LRUCache(RAG_CONFIG.get('QUERY_EMBEDDING_CACHE_SIZE', 1024))
+    _result_cache = LRUCache(RAG_CONFIG.get('QUERY_RESULT_CACHE_SIZE', 1024))
+    _dbs = {}  # 库名 -> (注册表版本号, 实例)
+    _dbs_lock = threading.Lock()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # TODO: 初始化 RAG 检索组件（向量数据库、文档加载器等）
-        
+        self.top_k = RAG_CONFIG.get('RAG_TOOL_TOP_K', 5)
+
+    @classmethod
+    def vector_db(cls, db_name: str):
+        """共享的只读向量库；该库尚未构建时返回 None（不缓存，下次调用重新检查）"""
+        generation = registry.generation(db_name)
+        with cls._dbs_lock:
+            cached = cls._dbs.get(db_name)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+            if cached is not None:
+                # 注册表已重新加载该库：归还旧实例，改用新实例
+                del cls._dbs[db_name]
+                release_vector_db(cached[1])
+            if not os.path.exists(os.path.join(resolve_store_path(), f"{db_name}.index")):
+                return None
+            db = acquire_vector_db(db_name)
+            cls._dbs[db_name] = (generation, db)
+            return db
+
+    @classmethod
+    def embed_query(cls, query_text: str):
+        """查询文本 -> 向量（带缓存）；向量化失败返回 None 且不缓存"""
+        query_text = query_text.strip()
+        vector = cls._embedding_cache.get(query_text)
+        if vector is not None:
+            return vector
+        from rag.core.llm_client import get_embeddings
+        vectors = get_embeddings([query_text])
+        if not vectors or not vectors[0]:
+            return None
+        vector = np.array(vectors[0], dtype="float32")
+        cls._embedding_cache.put(query_text, vector)
+        return vector
+
     def call(self, params: str, **kwargs) -> str:
         """
         执行 RAG 检索
-        
+
         Args:
             params: JSON格式的参数，包含expert_id和query
-            
+
         Returns:
             JSON格式的专家数据
         """
         params_dict = json5.loads(params)
-        expert_id = params_dict.get('expert_id', '')
-        query = params_dict.get('query', '')
-        
-        # TODO: 实现 RAG 检索逻辑
-        # 1. 根据 expert_id 检索专家基本信息
-        # 2. 检索专家的专利信息
-        # 3. 检索专家所属的企业或组织信息
-        # 4. 如果提供了 query，进行语义检索
-        
-        # 占位实现
+        expert_id = str(params_dict.get('expert_id', '')).strip()
+        query = str(params_dict.get('query', '') or '').strip()
+
+        expert_db = self.vector_db("expert")
+        if expert_db is None:
+            return json5.dumps({'expert_id': expert_id, 'data': {}, 'message': '专家向量库尚未构建'},
+                               ensure_ascii=False)
+        row = self._expert_row(expert_db, expert_id)
+        if row == -1:
+            return json5.dumps({'expert_id': expert_id, 'data': {}, 'message': f'未找到专家：{expert_id}'},
+                               ensure_ascii=False)
+
+        # 1. 专家基本信息
+        data = record_data(expert_db.metadata[row])
+        orgs = [o for o in data.get('orgs') or [] if isinstance(o, str)]
+        patents = data.get('invent_patents') or {}
+        if not isinstance(patents, dict):
+            patents = {}
+        result = {
+            'name': expert_db.metadata.title(row),
+            'summary': data.get('summary') or '',
+            'tags': data.get('tags') or [],
+            # 2. 专家的专利信息
+            'patents': [p.get('title', '') for p in (patents.get('patent_list') or []) if isinstance(p, dict)],
+            # 3. 专家所属的企业或组织信息
+            'organizations': [self._organization_info(o) for o in orgs],
+        }
+        # 4. 提供了 query 时，语义检索相关专利与组织
+        if query:
+            result['related_patents'] = self._search("patent", query, self.top_k)
+            result['related_organizations'] = self._search("organization", query, self.top_k)
+
         return json5.dumps({
             'expert_id': expert_id,
-            'data': {},
-            'message': 'RAG 检索功能待实现'
+            'data': result,
+            'message': 'RAG 检索完成'
         }, ensure_ascii=False)
-    
+
+    @staticmethod
+    def _expert_row(expert_db, expert_id: str) -> int:
+        """专家ID（实体ID、行号或姓名）-> 行号，不存在返回 -1"""
+        row = expert_db.get_row_by_id(expert_id)
+        if row == -1:
+            row = expert_db.get_row_by_title(expert_id)
+        if row == -1 and expert_id.isdigit() and int(expert_id) < len(expert_db.metadata):
+            row = int(expert_id)
+        if row != -1 and expert_db.metadata.is_deleted(row):
+            return -1
+        return row
+
+    def _organization_info(self, org_name: str) -> dict:
+        db = self.vector_db("organization")
+        row = db.get_row_by_title(org_name) if db is not None else -1
+        if row == -1 or db.metadata.is_deleted(row):
+            return {'name': org_name}
+        data = record_data(db.metadata[row])
+        return {'name': org_name, 'summary': data.get('summary') or '', 'tags': data.get('tags') or []}
+
+    def _search(self, db_name: str, query_text: str, top_k: int) -> list:
+        db = self.vector_db(db_name)
+        if db is None:
+            return []
+        # 键中带上实例 id：向量库重新加载后旧结果自然失效
+        key = (db_name, id(db), query_text.strip(), top_k)
+        results = self._result_cache.get(key)
+        if results is not None:
+            return [dict(r) for r in results]
+        vector = self.embed_query(query_text)
+        if vector is None:
+            print(f"[{db_name}] 查询向量化失败：{query_text[:30]}")
+            return []
+        results = self._hits(db, vector, top_k)
+        self._result_cache.put(key, results)
+        return [dict(r) for r in results]
+
+    @staticmethod
+    def _hits(db, query_vector, top_k: int, filters=None) -> list:
+        """检索并整理结果；query_vector 为单条向量时返回一个列表，为查询矩阵时返回每条查询的列表"""
+        scores, rows = db.search(query_vector, top_k, filters=filters)
+        hits = [[{
+            'name': db.metadata.title(int(row)),
+            'id': db.metadata.entity_id(int(row)) or str(int(row)),
+            'row': int(row),
+            'score': round(float(score), 6),
+        } for score, row in zip(query_scores, query_rows) if row != -1]
+            for query_scores, query_rows in zip(scores, rows)]
+        return hits if np.ndim(query_vector) > 1 else hits[0]
+
     def retrieve_by_vector(self, query_vector, top_k):
         """
         根据项目向量检索专家
-        
+
         Args:
             query_vector: 项目的向量表示（列表）
             top_k: 需要召回的专家数量
-            
+
         Returns:
             expert_list: 专家列表，每个专家包含 name 和 id 字段
-                格式：[{'name': '专家姓名', 'id': '专家ID'}, ...]
+                格式：[{'name': '专家姓名', 'id': '专家ID', 'score': 相似度}, ...]
+        """
+        expert_db = self.vector_db("expert")
+        if expert_db is None:
+            return []
+        return self._hits(expert_db, query_vector, top_k)
+
+    def retrieve_by_vectors(self, query_vectors, top_k, filters=None):
+        """
+        批量检索专家：整个查询矩阵一次检索
+
+        Args:
+            query_vectors: 查询向量矩阵（每行一个项目）
+            filters: 属性过滤表达式（见 VectorDB.filter_mask）
+
+        Returns:
+            每条查询的专家列表，格式同 retrieve_by_vector，另含 'row'（专家库行号）
         """
-        # TODO: 实现基于向量的检索逻辑
-        # 1. 使用 query_vector 在向量数据库中进行相似度检索
-        # 2. 返回 top_k 个最相似的专家
-        
-        # 占位实现
-        return []
-    
+        if not len(query_vectors):
+            return []
+        expert_db = self.vector_db("expert")
+        if expert_db is None:
+            return [[] for _ in query_vectors]
+        return self._hits(expert_db, np.asarray(query_vectors, dtype="float32").reshape(len(query_vectors), -1),
+                          top_k, filters)
+
     def retrieve_by_query(self, query_text, top_k):
         """
         根据查询文本检索专家
-        
+
         Args:
             query_text: 查询文本
             top_k: 需要召回的专家数量
-            
+
         Returns:
             expert_list: 专家列表，每个专家包含 name 和 id 字段
-                格式：[{'name': '专家姓名', 'id': '专家ID'}, ...]
+                格式：[{'name': '专家姓名', 'id': '专家ID', 'score': 相似度}, ...]
         """
-        # TODO: 实现基于文本的检索逻辑
-        # 1. 对 query_text 进行向量化
-        # 2. 使用向量在向量数据库中进行相似度检索
-        # 3. 返回 top_k 个最相似的专家
-        
-        # 占位实现
-        return []
-
+        if not query_text or not query_text.strip():
+            return []
+        return self._search("expert", query_text, top_k)
@@ -0,0 +1,137 @@
+"""
+候选专家级联粗排
+
+每个进入讨论的候选专家都要经过主持人/项目/专家多轮对话（数十次 LLM 调用）。
+先多召回一批候选（PROJECT_CONFIG['cascade_candidates']），用只需 CPU 的信号重排，
+只把前 K 个送进 create_agent_pairs，同样的 LLM 预算花在更合适的候选上：
+- similarity：向量召回的相似度
+- keywords：项目技术难题/技术目标与专家技术关键词、标签、专利标题的 BM25 得分（复用专家库倒排索引）
+- region：项目地区与专家所属组织所在地是否一致（省级命中计一半，市/区级命中计满分）
+- patents：专家发明专利数量（取对数）
+各信号在本批候选内归一化到 [0, 1] 后按 PROJECT_CONFIG['cascade_weights'] 加权求和
+"""
+
+import os
+import re
+import threading
+import weakref
+
+import numpy as np
+
+from rag.core.lexical_index import load_lexical_index
+from rag.core.metadata_store import MetadataStore, record_data
+from rag.core.vectordb import resolve_store_path
+
+DEFAULT_WEIGHTS = {'similarity': 1.0, 'keywords': 1.0, 'region': 0.3, 'patents': 0.2}
+DEFAULT_PROJECT_FIELDS = ['需解决的主要技术难题', '期望实现的主要技术目标']
+
+_REGION_SUFFIX = re.compile(r"(特别行政区|自治区|自治州|省|市|区|县|盟|州)$")
+
+
+def region_names(region: str) -> list:
+    """"陕西省 西安市 雁塔区" -> ['陕西', '西安', '雁塔']（由大到小，去掉行政区划后缀）"""
+    names = []
+    for part in str(region or "").split():
+        name = _REGION_SUFFIX.sub("", part.strip())
+        if len(name) >= 2:
+            names.append(name)
+    return names
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    """批内 min-max 归一化；全部相同时该信号不起作用"""
+    low, high = float(values.min()), float(values.max())
+    if high - low < 1e-12:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+class CandidateRanker:
+    """
+    Args:
+        expert_db: 专家 VectorDB（通常为注册表共享的只读实例）
+        weights: 各信号权重，缺省取 DEFAULT_WEIGHTS
+        project_fields: 参与关键词匹配的项目字段
+    """
+
+    def __init__(self, expert_db, weights: dict = None, project_fields: list = None):
+        self.db = expert_db
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.project_fields = project_fields or DEFAULT_PROJECT_FIELDS
+        self.lexical = load_lexical_index(expert_db)
+        self._org_store = None
+        self._org_rows = None
+        self._org_lock = threading.Lock()
+
+    def _org_text(self, org_name: str) -> str:
+        """组织名称 -> 组织库中的名称与简介（用于判断所在地）；组织库不存在时只用名称"""
+        with self._org_lock:
+            if self._org_rows is None:
+                path = os.path.join(resolve_store_path(), "organization_meta.sqlite")
+                self._org_rows = {}
+                if os.path.exists(path):
+                    self._org_store = MetadataStore(path, read_only=True)
+                    for row in self._org_store.live_rows():
+                        self._org_rows.setdefault(self._org_store.title(row), row)
+        row = self._org_rows.get(org_name)
+        if row is None:
+            return org_name
+        data = record_data(self._org_store[row])
+        return f"{org_name} {data.get('summary') or ''}"
+
+    def _region_score(self, names: list, data: dict) -> float:
+        if not names:
+            return 0.0
+        orgs = [o for o in data.get('orgs') or [] if isinstance(o, str)]
+        text = " ".join([str(data.get('summary') or '')] + [self._org_text(o) for o in orgs])
+        if any(name in text for name in names[1:]):
+            return 1.0
+        return 0.5 if names[0] in text else 0.0
+
+    @staticmethod
+    def _patent_count(data: dict) -> int:
+        patents = data.get('invent_patents') or {}
+        if not isinstance(patents, dict):
+            return 0
+        return patents.get('total') or len(patents.get('patent_list') or [])
+
+    def rank(self, project_data: dict, candidates: list) -> list:
+        """
+        Args:
+            candidates: [{'id': 专家行号, 'name': ..., 'score': 相似度(可选)}]
+
+        Returns:
+            按粗排得分降序的候选列表（每项增加 'cascade_score'）
+        """
+        if len(candidates) <= 1:
+            return list(candidates)
+        rows = [int(c['id']) for c in candidates]
+        records = [record_data(self.db.metadata[row]) for row in rows]
+        query = "\n".join(str(project_data.get(field, '')) for field in self.project_fields)
+        names = region_names(project_data.get('地区', ''))
+
+        signals = {
+            'similarity': np.array([c.get('score', 0.0) for c in candidates], dtype="float32"),
+            'keywords': self.lexical.score_rows(query, rows),
+            'region': np.array([self._region_score(names, data) for data in records], dtype="float32"),
+            'patents': np.log1p(np.array([self._patent_count(data) for data in records], dtype="float32")),
+        }
+        total = np.zeros(len(candidates), dtype="float32")
+        for name, values in signals.items():
+            total += self.weights.get(name, 0.0) * _normalize(values)
+
+        order = np.argsort(-total, kind="stable")
+        return [dict(candidates[i], cascade_score=round(float(total[i]), 4)) for i in order]
+
+
+_rankers = weakref.WeakKeyDictionary()
+_rankers_lock = threading.Lock()
+
+
+def shared_ranker(expert_db, weights: dict = None, project_fields: list = None) -> CandidateRanker:
+    """同一个专家库实例共享一个粗排器（倒排索引、组织库只加载一次）"""
+    with _rankers_lock:
+        ranker = _rankers.get(expert_db)
+        if ranker is None:
+            ranker = _rankers[expert_db] = CandidateRanker(expert_db, weights, project_fields)
+        return ranker
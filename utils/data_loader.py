@@ -1,13 +1,23 @@
 """
 数据加载工具
 
-用于从本地加载项目需求和专家数据
+用于从本地加载项目需求和专家数据；
+候选专家从离线预计算表读取（由 `python -m rag.precompute_candidates` 生成）
 """
 
+import hashlib
 import json
 import os
+import threading
 from typing import Dict, List
 
+import json5
+import numpy as np
+
+_table_cache = {}
+_table_lock = threading.Lock()
+_profile_cache = {}
+
 
 def load_project_requirements(data_path: str) -> List[Dict]:
     """
@@ -23,11 +33,157 @@ def load_project_requirements(data_path: str) -> List[Dict]:
     return projects
 
 
-def load_expert_candidates(project_id: str, data_path: str, top_k: int = 20) -> List[Dict]:
+def load_projects(projects_dir: str) -> List[Dict]:
+    """加载目录下的全部项目 JSON 文件（按文件名排序）"""
+    projects = []
+    if not os.path.isdir(projects_dir):
+        return projects
+    for filename in sorted(os.listdir(projects_dir)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(projects_dir, filename), 'r', encoding='utf-8') as f:
+                projects.append(json.load(f))
+        except Exception as e:
+            print(f"加载文件 {filename} 时出错: {e}")
+    return projects
+
+
+def expert_profile_names(experts_dir: str) -> frozenset:
+    """
+    data/experts 下有画像文件的专家姓名集合（按目录修改时间缓存），
+    用作召回的过滤条件，保证候选专家都能被 create_agent_pairs 加载
+    """
+    try:
+        mtime = os.stat(experts_dir).st_mtime_ns
+    except OSError:
+        return frozenset()
+    with _table_lock:
+        cached = _profile_cache.get(experts_dir)
+        if cached is None or cached[0] != mtime:
+            names = frozenset(f[:-len('.json')] for f in os.listdir(experts_dir) if f.endswith('.json'))
+            cached = _profile_cache[experts_dir] = (mtime, names)
+        return cached[1]
+
+
+def expert_candidate_filter(project_config: dict, root: str, filters: dict = None):
+    """
+    召回候选专家的过滤表达式（在线召回与离线预计算共用）：
+    project_config['candidate_filter'] 与传入条件合并；require_expert_profile 开启时
+    再限定为 data/experts 下有画像文件的专家。没有任何条件时返回 None
+    """
+    merged = dict(project_config.get('candidate_filter') or {})
+    merged.update(filters or {})
+    if project_config.get('require_expert_profile', True):
+        experts_dir = project_config['data_path']['experts']
+        if not os.path.isabs(experts_dir):
+            experts_dir = os.path.join(root, experts_dir)
+        if os.path.isdir(experts_dir):
+            merged['title'] = expert_profile_names(experts_dir)
+    return merged or None
+
+
+def project_text(project_data) -> str:
+    """项目数据 -> 用于 Embedding 的文本（在线召回与离线预计算共用）"""
+    if not isinstance(project_data, str):
+        return json5.dumps(project_data, ensure_ascii=False)
+    return project_data
+
+
+def project_digest(project_data) -> str:
+    """项目内容哈希，用于判断预计算结果是否过期"""
+    return hashlib.sha1(project_text(project_data).encode('utf-8')).hexdigest()
+
+
+def expert_store_fingerprint(db_name: str = "expert") -> str:
     """
-    加载某个项目的候选专家数据
+    专家向量库的指纹：元数据库中已提交的 (版本号, 总行数, 已删除行数)。
+    每次构建/增量更新保存（全精度向量与索引先于元数据写入，元数据是提交点）版本号都会递增，
+    预计算表中的行号与姓名随即视为过期；只打开、检索库不会改变指纹
+    """
+    from rag.core.metadata_store import store_generation
+    from rag.core.vectordb import resolve_store_path
+    state = store_generation(os.path.join(resolve_store_path(), f"{db_name}_meta.sqlite"))
+    if state is None:
+        return ""
+    return hashlib.sha1(":".join(str(v) for v in state).encode('utf-8')).hexdigest()
+
+
+def save_candidate_table(data_path: str, project_ids, digests, rows, scores, names, store_fingerprint: str = ""):
+    """
+    写入候选专家表（npz，先写临时文件再原子替换）
+
+    Args:
+        project_ids / digests: 长度为 P 的项目标识与内容哈希
+        rows / scores / names: (P, K) 的专家行号、相似度、专家姓名，空位行号为 -1
+        store_fingerprint: 预计算时专家向量库的指纹（expert_store_fingerprint）
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(data_path)), exist_ok=True)
+    tmp_path = data_path + '.tmp.npz'
+    np.savez_compressed(
+        tmp_path,
+        project_ids=np.array(project_ids, dtype=str),
+        digests=np.array(digests, dtype=str),
+        rows=np.asarray(rows, dtype='int64'),
+        scores=np.asarray(scores, dtype='float32'),
+        names=np.array(names, dtype=str),
+        store_fingerprint=np.array(store_fingerprint)
+    )
+    os.replace(tmp_path, data_path)
+
+
+def _load_candidate_table(data_path: str):
+    """读取候选专家表，按文件修改时间缓存"""
+    if not os.path.exists(data_path):
+        return None
+    mtime = os.path.getmtime(data_path)
+    with _table_lock:
+        cached = _table_cache.get(data_path)
+        if cached is None or cached[0] != mtime:
+            with np.load(data_path) as npz:
+                table = {name: npz[name] for name in npz.files}
+            table['index'] = {pid: i for i, pid in enumerate(table['project_ids'].tolist())}
+            cached = (mtime, table)
+            _table_cache[data_path] = cached
+    return cached[1]
+
+
+def candidate_table_is_current(data_path: str, store_fingerprint: str) -> bool:
+    """候选专家表存在且预计算时的专家库指纹与当前一致（旧版表没有指纹，视为过期）"""
+    table = _load_candidate_table(data_path)
+    if table is None or 'store_fingerprint' not in table:
+        return False
+    return str(table['store_fingerprint']) == store_fingerprint
+
+
+def load_expert_candidates(project_id: str, data_path: str, top_k: int = 20, digest: str = None,
+                           store_fingerprint: str = None) -> List[Dict]:
+    """
+    加载某个项目的候选专家数据（离线预计算表）
+
+    Args:
+        project_id: 项目标识（项目标题）
+        data_path: 候选专家表路径
+        top_k: 返回的候选数，不超过预计算时的 K
+        digest: 当前项目内容哈希；与预计算时不一致视为过期，返回空列表
+        store_fingerprint: 当前专家库指纹；与预计算时不一致（专家库已重建/更新）视为整表过期，返回空列表
+
+    Returns:
+        [{'id': 专家行号, 'name': 专家姓名, 'score': 相似度}, ...]，表中没有该项目时为空列表
     """
     experts = []
-    
+    table = _load_candidate_table(data_path)
+    if table is None:
+        return experts
+    if store_fingerprint is not None and not candidate_table_is_current(data_path, store_fingerprint):
+        return experts
+    i = table['index'].get(project_id)
+    if i is None or (digest is not None and table['digests'][i] != digest):
+        return experts
+
+    for row, score, name in zip(table['rows'][i][:top_k], table['scores'][i][:top_k], table['names'][i][:top_k]):
+        if row == -1:
+            continue
+        experts.append({'id': str(row), 'name': str(name) or "未知专家", 'score': float(score)})
     return experts
 